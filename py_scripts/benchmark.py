@@ -0,0 +1,476 @@
+#%%
+"""
+Reproducible benchmarks for the detection hot paths.
+
+Frames are synthetic but CCSS-like: sky band, textured water, shore band
+with lights, small boats by day and bright boat lights by night. Boat
+layouts come from the checked-in label files (label_pack.py), so box sizes
+and positions follow the real data. Any labeled images on disk are used
+as-is. Everything is seeded, so reruns on the same machine get the same
+inputs.
+
+Micro benchmarks (per call, at each frame scale in SCALES):
+- grey_detect.is_grey_image, also at each RESIZE_MAX in GREY_RESIZE_MAX
+- day_night.determine_segment, with 0 / N lux readings
+- detect_lights.find_spherical_blobs
+- gaussian_parallel.process_single_image (decode, blob_log, render, write)
+- detectors.apply_custom_nms, on NMS_BOX_COUNTS clustered boxes
+- app.detect_image / predict_boxes at each IMG_SIZES (only if the YOLO app
+  and its weights load)
+Macro benchmark: process_single_image over MACRO_FRAMES frames with joblib at
+each CORE_COUNTS (capped at os.cpu_count()), as in gaussian_parallel.py.
+
+Results go to BENCH_DIR/<time>_<commit>.json with the git commit, machine
+and library versions. Set COMPARE_WITH to an earlier results file to print
+slowdowns beyond REGRESSION_TOLERANCE, or call compare_results(old, new).
+"""
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import cv2
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+# ----------------------------
+# Configuration
+# ----------------------------
+BENCH_DIR = "./benchmarks/"
+COMPARE_WITH = None  # path to an earlier results JSON
+REGRESSION_TOLERANCE = 0.10  # flag medians more than 10% slower
+
+BASE_HEIGHT, BASE_WIDTH = 1080, 1920  # CCSS frame size
+SCALES = (0.25, 0.5, 1.0)
+N_FRAMES = 6  # synthetic frames per scale (half day, half night)
+REPEAT = 5  # timed calls per benchmark (cycling through the frames)
+WARMUP = 1
+SEED = 42
+
+GREY_RESIZE_MAX = (256, 512, 1024)
+LUX_READINGS = (0, 1000)
+NMS_BOX_COUNTS = (50, 200, 1000)
+IMG_SIZES = (640, 1280, 1920)  # YOLO imgsz for predict_boxes
+MACRO_FRAMES = 16
+CORE_COUNTS = (1, 2, 4, 8)
+
+LABEL_DATASETS = ["../data/labeled_dataset_3", "../data/2 train"]
+APP_DIR = "../yolo_model"
+CAMERA = "AXISQ6074EPTZACCC8EACA584"
+
+
+# ----------------------------
+# Synthetic frames
+# ----------------------------
+def _smooth_noise(rng, height, width, sigma):
+    noise = rng.normal(0, 1, (height, width)).astype(np.float32)
+    return cv2.GaussianBlur(noise, (0, 0), sigma)
+
+
+def synthetic_frame(height, width, boxes_xywh=None, night=False, seed=SEED):
+    """
+    One BGR uint8 CCSS-like frame and its boat boxes [[x1, y1, x2, y2], ...].
+
+    boxes_xywh: normalised (k, 4) boat boxes (e.g. from a label file); random
+    boats in the water band when None.
+    """
+    rng = np.random.default_rng(seed)
+    scale = height / BASE_HEIGHT
+    sky_end, shore_start = int(height * 0.2), int(height * 0.8)
+
+    # Water: base colour, large-scale swell, fine chop and horizontal ripples
+    water = np.float32([30, 28, 24]) if night else np.float32([120, 105, 85])
+    texture = (_smooth_noise(rng, height, width, 8 * scale + 1) * 6 +
+               _smooth_noise(rng, height, width, 1.5) * (2 if night else 5))
+    ripples = np.sin(np.arange(height, dtype=np.float32)[:, None] * 0.35 / max(scale, 0.1)) * 3
+    img = water + (texture + ripples)[..., None]
+
+    # Sky gradient on top, darker shoreline at the bottom
+    sky = np.linspace(60 if night else 230, 35 if night else 180, sky_end, dtype=np.float32)
+    img[:sky_end] = sky[:, None, None]
+    img[shore_start:] = (np.float32([20, 22, 18]) if night else np.float32([50, 70, 60])) + \
+        _smooth_noise(rng, height - shore_start, width, 3)[..., None] * 10
+
+    if boxes_xywh is None:
+        n = int(rng.integers(3, 15))
+        sizes = rng.uniform(10, 20, (n, 2)) * scale
+        centres = np.column_stack([rng.uniform(0.05, 0.95, n) * width,
+                                   rng.uniform(sky_end, shore_start, n)])
+    else:
+        xywh = np.asarray(boxes_xywh, dtype=np.float32).reshape(-1, 4)
+        centres = xywh[:, :2] * [width, height]
+        sizes = np.maximum(xywh[:, 2:] * [width, height], 2)
+
+    boxes = []
+    for (cx, cy), (w, h) in zip(centres, sizes):
+        if night:
+            # Boat light: saturated core with a soft glow
+            cv2.circle(img, (int(cx), int(cy)), max(1, int(min(w, h) / 4)), (255, 255, 255), -1)
+            glow = np.zeros(img.shape[:2], np.float32)
+            cv2.circle(glow, (int(cx), int(cy)), max(2, int(min(w, h) / 2)), 120, -1)
+            img += cv2.GaussianBlur(glow, (0, 0), max(1.0, min(w, h) / 3))[..., None]
+        else:
+            # Hull, a darker cabin and a short wake
+            cv2.ellipse(img, (int(cx), int(cy)), (max(1, int(w / 2)), max(1, int(h / 3))), 0, 0, 360,
+                        (235, 235, 240), -1)
+            cv2.rectangle(img, (int(cx - w / 6), int(cy - h / 2)), (int(cx + w / 6), int(cy - h / 6)),
+                          (70, 70, 80), -1)
+            cv2.line(img, (int(cx + w / 2), int(cy + h / 4)), (int(cx + 1.5 * w), int(cy + h / 3)),
+                     (200, 200, 200), max(1, int(h / 6)))
+        boxes.append([float(cx - w / 2), float(cy - h / 2), float(cx + w / 2), float(cy + h / 2)])
+
+    if night:
+        # Shore lights: bright distractors outside the water band
+        for x in rng.uniform(0, width, int(20 * scale) + 5):
+            y = rng.uniform(shore_start, height)
+            cv2.circle(img, (int(x), int(y)), max(1, int(3 * scale)), (180, 220, 255), -1)
+
+    return np.clip(img, 0, 255).astype(np.uint8), boxes
+
+
+def frame_name(index, night):
+    """CCSS-style file name; night frames from 01:00, day frames from 13:00 local (UTC-7)."""
+    base = datetime(2023, 9, 1, 8 if night else 20, tzinfo=timezone.utc) + timedelta(minutes=5 * index)
+    return f"{CAMERA}_{base.strftime('%Y%m%dT%H%M%S')}.000Z.jpg"
+
+
+def label_layouts(n, datasets=LABEL_DATASETS):
+    """Up to n non-empty normalised box layouts from the checked-in label files."""
+    from label_pack import load_label_pack
+
+    layouts = []
+    for dataset_dir in datasets:
+        if not os.path.isdir(dataset_dir):
+            continue
+        pack = load_label_pack(dataset_dir)
+        for i in np.flatnonzero(pack.counts() > 0):
+            layouts.append(pack.xywh(int(i)))
+            if len(layouts) >= n:
+                return layouts
+    return layouts
+
+
+def labeled_images(n, datasets=LABEL_DATASETS):
+    """Up to n real labeled images found next to the label files (none are checked in)."""
+    from evaluate_detectors import find_image_for_label
+    from label_pack import list_label_files
+
+    images = []
+    for dataset_dir in datasets:
+        if not os.path.isdir(dataset_dir):
+            continue
+        for label_path in list_label_files(dataset_dir):
+            image_path = find_image_for_label(label_path)
+            if image_path is not None:
+                images.append(str(image_path))
+                if len(images) >= n:
+                    return images
+    return images
+
+
+def write_frames(out_dir, n_frames, scale, layouts=()):
+    """Write n_frames synthetic JPEGs (alternating day / night) and return their names."""
+    height, width = int(BASE_HEIGHT * scale), int(BASE_WIDTH * scale)
+    names = []
+    for i in range(n_frames):
+        night = i % 2 == 1
+        layout = layouts[i % len(layouts)] if layouts else None
+        img, _ = synthetic_frame(height, width, layout, night=night, seed=SEED + i)
+        name = frame_name(i, night)
+        cv2.imwrite(os.path.join(out_dir, name), img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        names.append(name)
+    return names
+
+
+def clustered_boxes(n, seed=SEED):
+    """n detector-style boxes, four per boat on average, so NMS has work to do."""
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform([0, 200], [BASE_WIDTH, 900], (max(1, n // 4), 2))
+    boxes = []
+    for i in range(n):
+        cx, cy = centres[i % len(centres)] + rng.normal(0, 3, 2)
+        w, h = rng.uniform(10, 25, 2)
+        boxes.append({'xyxy': [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], 'conf': float(rng.uniform(0.2, 1))})
+    return boxes
+
+
+# ----------------------------
+# Timing
+# ----------------------------
+def time_calls(fn, repeat=REPEAT, warmup=WARMUP):
+    """Per-call durations (s) of fn(i) for i in range(repeat), after warmup calls."""
+    for i in range(warmup):
+        fn(i)
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def record(results, name, params, durations, items=1):
+    """Append one result (ms statistics and items per second) and print it."""
+    d = np.asarray(durations) * 1000
+    result = {
+        'name': name,
+        'params': params,
+        'calls': len(d),
+        'items_per_call': items,
+        'min_ms': round(float(d.min()), 3),
+        'median_ms': round(float(np.median(d)), 3),
+        'mean_ms': round(float(d.mean()), 3),
+        'p90_ms': round(float(np.percentile(d, 90)), 3),
+        'items_per_s': round(items / (float(np.median(d)) / 1000), 2) if d.any() else None,
+    }
+    results.append(result)
+    print(f"⏱  {result_key(result):<60} median {result['median_ms']:>10.2f} ms  "
+          f"({result['items_per_s']} items/s)")
+    return result
+
+
+def result_key(result):
+    params = ", ".join(f"{k}={v}" for k, v in sorted(result['params'].items()))
+    return f"{result['name']}[{params}]"
+
+
+@contextmanager
+def patched(module, **values):
+    """Temporarily set module globals (config constants read at call time)."""
+    old = {k: getattr(module, k) for k in values}
+    for k, v in values.items():
+        setattr(module, k, v)
+    try:
+        yield module
+    finally:
+        for k, v in old.items():
+            setattr(module, k, v)
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+def bench_grey(results, frame_dir, names, scale):
+    from grey_detect import is_grey_image
+
+    for resize_max in GREY_RESIZE_MAX:
+        durations = time_calls(lambda i: is_grey_image(os.path.join(frame_dir, names[i % len(names)]),
+                                                       resize_max=resize_max))
+        record(results, "is_grey_image", {'scale': scale, 'resize_max': resize_max}, durations)
+
+
+def bench_segment(results, n_calls=200):
+    from day_night import LOCATION, LUX_THRESHOLD, determine_segment
+
+    times = [datetime(2023, 9, 1, tzinfo=timezone.utc) + timedelta(minutes=7 * i) for i in range(n_calls)]
+    for n_readings in LUX_READINGS:
+        lux_data = {times[0] + timedelta(minutes=3 * i): float(i % 200) for i in range(n_readings)}
+        durations = time_calls(lambda i: [determine_segment(dt, LOCATION, lux_data, LUX_THRESHOLD) for dt in times])
+        record(results, "determine_segment", {'lux_readings': n_readings}, durations, items=n_calls)
+
+
+def bench_spherical_blobs(results, frame_dir, names, scale):
+    import detect_lights
+
+    with patched(detect_lights, USE_STATIC_MASK=False):
+        durations = time_calls(lambda i: detect_lights.find_spherical_blobs(
+            os.path.join(frame_dir, names[i % len(names)])))
+    record(results, "find_spherical_blobs", {'scale': scale}, durations)
+
+
+def _gaussian_settings(frame_dir, output_dir):
+    """gaussian_parallel globals for benchmark paths and no cache / mask (no store_dir = no frame store)."""
+    return {'IMAGE_DIR': frame_dir, 'OUTPUT_IMG_DIR': output_dir, 'USE_STATIC_MASK': False,
+            'USE_CACHE': False, 'cache': None}
+
+
+def _process_in_worker(frame_dir, output_dir, name):
+    """Runs in a joblib worker, which imports gaussian_parallel with its own defaults."""
+    import gaussian_parallel
+
+    with patched(gaussian_parallel, **_gaussian_settings(frame_dir, output_dir)):
+        result = gaussian_parallel.process_single_image(name)
+    if result['detected_image'] is None:
+        raise RuntimeError(result['boat_coordinates'])
+    return result['boat_count']
+
+
+def bench_process_single(results, frame_dir, names, scale, output_dir):
+    import gaussian_parallel
+
+    with patched(gaussian_parallel, **_gaussian_settings(frame_dir, output_dir)):
+        durations = time_calls(lambda i: gaussian_parallel.process_single_image(names[i % len(names)]))
+    record(results, "process_single_image", {'scale': scale}, durations)
+
+
+def bench_nms(results):
+    from detectors import apply_custom_nms
+
+    for n in NMS_BOX_COUNTS:
+        boxes = clustered_boxes(n)
+        durations = time_calls(lambda i: apply_custom_nms(boxes))
+        record(results, "apply_custom_nms", {'boxes': n}, durations, items=n)
+
+
+def load_app(app_dir=APP_DIR):
+    """Import yolo_model/app.py (model + weights) or return None if it can't load here."""
+    cwd = os.getcwd()
+    try:
+        os.chdir(app_dir)
+        sys.path.insert(0, os.getcwd())
+        return importlib.import_module("app")
+    except Exception as e:  # torch / yolov5 / weights missing
+        print(f"⚠️  Skipping YOLO benchmarks, app could not load: {type(e).__name__}: {e}")
+        return None
+    finally:
+        os.chdir(cwd)
+
+
+def bench_yolo(results, app, frame_dir, names, scale, cache_dir):
+    from detection_cache import DetectionCache
+
+    frames = [cv2.cvtColor(cv2.imread(os.path.join(frame_dir, name)), cv2.COLOR_BGR2RGB) for name in names]
+    for img_size in IMG_SIZES:
+        with patched(app, IMG_SIZE=img_size):
+            durations = time_calls(lambda i: app.predict_boxes(frames[i % len(frames)]))
+        record(results, "predict_boxes", {'scale': scale, 'imgsz': img_size}, durations)
+
+    # End to end with an empty throwaway cache, so every call is a miss
+    with patched(app, detection_cache=DetectionCache(cache_dir)):
+        durations = time_calls(lambda i: app.detect_image(frames[i % len(frames)].copy()), warmup=0)
+    record(results, "detect_image", {'scale': scale, 'imgsz': app.IMG_SIZE}, durations)
+
+
+def bench_cores(results, frame_dir, names, output_dir):
+    """process_single_image throughput over MACRO_FRAMES frames per joblib worker count."""
+    frames = [names[i % len(names)] for i in range(MACRO_FRAMES)]
+    max_cores = os.cpu_count() or 1
+    for n_jobs in CORE_COUNTS:
+        if n_jobs > max_cores:
+            print(f"⚠️  Skipping n_jobs={n_jobs}: only {max_cores} CPUs")
+            continue
+        with Parallel(n_jobs=n_jobs, prefer="processes") as parallel:
+            parallel(delayed(_process_in_worker)(frame_dir, output_dir, name) for name in frames[:n_jobs])  # warm up
+            start = time.perf_counter()
+            parallel(delayed(_process_in_worker)(frame_dir, output_dir, name) for name in frames)
+            elapsed = time.perf_counter() - start
+        record(results, "process_single_image_parallel", {'n_jobs': n_jobs, 'frames': len(frames)},
+               [elapsed], items=len(frames))
+
+
+# ----------------------------
+# Results
+# ----------------------------
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import skimage
+
+    return {
+        'commit': _git("rev-parse", "--short", "HEAD"),
+        'dirty': bool(_git("status", "--porcelain", "--untracked-files=no")),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'skimage': skimage.__version__,
+        'config': {'base_size': [BASE_HEIGHT, BASE_WIDTH], 'scales': list(SCALES), 'n_frames': N_FRAMES,
+                   'repeat': REPEAT, 'warmup': WARMUP, 'seed': SEED},
+    }
+
+
+def save_results(results, env, bench_dir=BENCH_DIR):
+    os.makedirs(bench_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(bench_dir, f"{stamp}_{env['commit'] or 'nogit'}.json")
+    with open(path, 'w') as f:
+        json.dump({'environment': env, 'results': results}, f, indent=2)
+    return path
+
+
+def compare_results(baseline_path, current_path, tolerance=REGRESSION_TOLERANCE):
+    """Median ratios current / baseline per benchmark; prints the regressions."""
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    with open(current_path) as f:
+        current = {result_key(r): r for r in json.load(f)['results']}
+
+    rows = []
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key]['median_ms'], current[key]['median_ms']
+        rows.append({'benchmark': key, 'baseline_ms': old, 'current_ms': new,
+                     'ratio': round(new / old, 3) if old else None})
+    df = pd.DataFrame(rows, columns=['benchmark', 'baseline_ms', 'current_ms', 'ratio'])
+
+    slower = df[df['ratio'] > 1 + tolerance]
+    if slower.empty:
+        print(f"✅ No benchmark more than {tolerance:.0%} slower than {baseline_path}")
+    else:
+        print(f"⚠️  {len(slower)} benchmarks more than {tolerance:.0%} slower than {baseline_path}:")
+        print(slower.to_string(index=False))
+    return df
+
+
+def main():
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="boat_bench_")
+    try:
+        layouts = label_layouts(N_FRAMES)
+        real = labeled_images(N_FRAMES)
+        print(f"🧪 {len(layouts)} label layouts, {len(real)} labeled images on disk, {os.cpu_count()} CPUs")
+
+        output_dir = os.path.join(work_dir, "output")
+        os.makedirs(output_dir)
+        app = load_app()
+
+        bench_segment(results)
+        bench_nms(results)
+
+        frame_sets = {}
+        for scale in SCALES:
+            frame_dir = os.path.join(work_dir, f"scale_{scale}")
+            os.makedirs(frame_dir)
+            names = write_frames(frame_dir, N_FRAMES, scale, layouts)
+            frame_sets[scale] = (frame_dir, names)
+
+            bench_grey(results, frame_dir, names, scale)
+            bench_spherical_blobs(results, frame_dir, names, scale)
+            bench_process_single(results, frame_dir, names, scale, output_dir)
+            if app is not None:
+                bench_yolo(results, app, frame_dir, names, scale, os.path.join(work_dir, "yolo_cache"))
+
+        if real:
+            real_dir = os.path.dirname(real[0])
+            real_names = [os.path.basename(p) for p in real if os.path.dirname(p) == real_dir]
+            bench_process_single(results, real_dir, real_names, 'labeled', output_dir)
+
+        frame_dir, names = frame_sets[max(SCALES)]
+        bench_cores(results, frame_dir, names, output_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    path = save_results(results, environment())
+    print(f"\n✅ {len(results)} benchmarks written to {path}")
+    if COMPARE_WITH:
+        compare_results(COMPARE_WITH, path)
+    return path
+
+
+if __name__ == "__main__":
+    main()
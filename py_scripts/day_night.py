@@ -160,19 +160,20 @@ def main():
 
 #%%
 
-IMAGE_DIR = "../images/CCSS/"
-image_dir = Path(IMAGE_DIR)
-print("Exists:", image_dir.exists())
-print("Files:", list(image_dir.glob("*")))
-
-image_files = list(image_dir.glob("*.jpg")) + list(image_dir.glob("*.JPG")) + \
-              list(image_dir.glob("*.jpeg")) + list(image_dir.glob("*.JPEG")) + \
-              list(image_dir.glob("*.png")) + list(image_dir.glob("*.PNG"))
-
-for image_path in image_files:
-    print("Checking:", image_path.name)
-    dt = parse_timestamp_from_filename(image_path.name)
-    if not dt:
-        print("Could not parse timestamp:", image_path.name)
-        continue
+if __name__ == "__main__":
+    IMAGE_DIR = "../images/CCSS/"
+    image_dir = Path(IMAGE_DIR)
+    print("Exists:", image_dir.exists())
+    print("Files:", list(image_dir.glob("*")))
+
+    image_files = list(image_dir.glob("*.jpg")) + list(image_dir.glob("*.JPG")) + \
+                  list(image_dir.glob("*.jpeg")) + list(image_dir.glob("*.JPEG")) + \
+                  list(image_dir.glob("*.png")) + list(image_dir.glob("*.PNG"))
+
+    for image_path in image_files:
+        print("Checking:", image_path.name)
+        dt = parse_timestamp_from_filename(image_path.name)
+        if not dt:
+            print("Could not parse timestamp:", image_path.name)
+            continue
 # %%
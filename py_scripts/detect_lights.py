@@ -3,6 +3,9 @@ import cv2
 import os
 from tqdm import tqdm
 import pandas as pd
+from static_mask import load_camera_mask
+from frame_store import open_store, store_dir_for
+from stage_timer import TIMER, stage
 
 # Parameters
 MIN_AREA = 5
@@ -10,20 +13,33 @@ MAX_AREA = 500
 THRESHOLD = 150
 OUTPUT_BLOBS_CSV = "./grey_images_blobs_spherical.csv"
 IMAGE_DIR = "../images/CCSS/"
+USE_STATIC_MASK = True  # use ./masks/<camera>.png from static_mask.py when present
+USE_FRAME_STORE = True  # read frames from the uncropped 'cv2' store built by frame_store.py
+# Thresholds the whole frame in cv2 grey, so it has its own store
+FRAME_STORE_DIR = store_dir_for(0.0, 0.0, gray_mode='cv2')
 
-# Load CSV
-df = pd.read_csv("./image_segmentation_grey.csv")
-# Assuming you have a 'grey' column; adjust if needed
-grey_images = df[df["grey"]]["image"].tolist()
+store = open_store(FRAME_STORE_DIR, 0.0, 0.0, gray_mode='cv2') if USE_FRAME_STORE else None
 
 # Function to find roughly circular blobs
 def find_spherical_blobs(img_path, threshold=THRESHOLD, min_area=MIN_AREA, max_area=MAX_AREA, circularity_thresh=0.7):
-    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    name = os.path.basename(img_path)
+    with stage("decode"):
+        if store is not None and name in store:
+            img = store.roi(name)  # read-only view; cv2.threshold writes to a new array
+        else:
+            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
     if img is None:
         return []
 
-    _, binary = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Only look at water: off-water pixels are zeroed so they never pass the threshold
+    mask = load_camera_mask(img_path) if USE_STATIC_MASK else None
+    if mask is not None:
+        with stage("crop"):
+            img, _, _ = mask.crop(img, fill=0)
+
+    with stage("detect"):
+        _, binary = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     blobs = []
     for cnt in contours:
@@ -41,19 +57,30 @@ def find_spherical_blobs(img_path, threshold=THRESHOLD, min_area=MIN_AREA, max_a
             blobs.append(cnt)
     return blobs
 
-# Process all grey images
-blob_counts = []
-
-for img_name in tqdm(grey_images):
-    img_path = os.path.join(IMAGE_DIR, img_name)
-    blobs = find_spherical_blobs(img_path)
-    blob_counts.append(len(blobs))
-
-# Save results
-df_blobs = pd.DataFrame({
-    "image": grey_images,
-    "blob_count": blob_counts
-})
-df_blobs.to_csv(OUTPUT_BLOBS_CSV, index=False)
-print(f"Saved blob counts to {OUTPUT_BLOBS_CSV}")
-# %%
\ No newline at end of file
+
+if __name__ == "__main__":
+    # Load CSV
+    with stage("list"):
+        df = pd.read_csv("./image_segmentation_grey.csv")
+        # Assuming you have a 'grey' column; adjust if needed
+        grey_images = df[df["grey"]]["image"].tolist()
+
+    # Process all grey images
+    blob_counts = []
+
+    for img_name in tqdm(grey_images):
+        img_path = os.path.join(IMAGE_DIR, img_name)
+        blobs = find_spherical_blobs(img_path)
+        blob_counts.append(len(blobs))
+
+    # Save results
+    with stage("write"):
+        df_blobs = pd.DataFrame({
+            "image": grey_images,
+            "blob_count": blob_counts
+        })
+        df_blobs.to_csv(OUTPUT_BLOBS_CSV, index=False)
+    print(f"Saved blob counts to {OUTPUT_BLOBS_CSV}")
+    print(TIMER.table())
+    print(f"⏱  Stage timings: {TIMER.dump_json()}")
+# %%
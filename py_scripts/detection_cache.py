@@ -0,0 +1,184 @@
+#%%
+"""
+On-disk detection result cache keyed by content, not by filename.
+
+key = hash(image content) + hash(model weights or detector name) + hash(params)
+
+Re-running detection on an unchanged image with the same model and
+parameters returns the stored result instead of running inference. Entries
+are small JSON files under CACHE_DIR; when the cache grows past max_bytes
+the least recently used entries (oldest mtime, refreshed on every hit) are
+deleted. Writes are atomic (tmp file + os.replace), so several processes
+(joblib workers) or threads (Gradio) can share one cache directory.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+# ----------------------------
+# Defaults
+# ----------------------------
+CACHE_DIR = "./.detection_cache"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HASH_CHUNK = 1 << 20
+
+_weights_digests = {}
+
+
+# ----------------------------
+# Hashing
+# ----------------------------
+def hash_bytes(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_file(path):
+    """Digest of a file's bytes (the encoded image, or a weights file)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_array(arr):
+    """Digest of a decoded image array, including its shape and dtype."""
+    arr = np.ascontiguousarray(arr)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{arr.shape}{arr.dtype}".encode())
+    h.update(memoryview(arr).cast('B'))
+    return h.hexdigest()
+
+
+def hash_weights(path):
+    """hash_file for model weights, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo_key not in _weights_digests:
+        _weights_digests[memo_key] = hash_file(path)
+    return _weights_digests[memo_key]
+
+
+def hash_params(params):
+    return hash_bytes(json.dumps(params, sort_keys=True, default=str).encode())
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+class DetectionCache:
+    """Size-bounded LRU cache of JSON-serialisable detection results on disk."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._approx_bytes = sum(size for _, _, size in self._scan())
+
+    def __getstate__(self):
+        # Locks don't pickle; joblib workers get their own
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_digest, model_digest, params=None):
+        return hash_bytes(f"{image_digest}|{model_digest}|{hash_params(params or {})}".encode())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value).encode()
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, or compute(), store and return it."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _scan(self):
+        """Yield (path, mtime, size) for every entry."""
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, st.st_mtime, st.st_size
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is at 90% of max_bytes."""
+        entries = sorted(self._scan(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._approx_bytes = total
+
+    def clear(self):
+        for path, _, _ in list(self._scan()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._approx_bytes = 0
+
+
+def cached_detector(detect, cache, model_digest, params=None):
+    """
+    Wrap a detectors.py style detect(img) -> boxes with the cache.
+
+    The image is keyed by hash_array, so this works for any decoded frame.
+    """
+    def detect_cached(img):
+        key = cache.make_key(hash_array(img), model_digest, params)
+        return cache.get_or_compute(key, lambda: detect(img))
+    return detect_cached
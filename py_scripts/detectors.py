@@ -0,0 +1,273 @@
+#%%
+"""
+Shared detector backends for the boat counting scripts.
+
+Every backend takes a decoded image (BGR uint8 as returned by cv2.imread,
+or an already-grey 2D array) and returns a list of box dicts in full-image
+pixel coordinates, the same layout detect_boats_yolo uses in the notebook:
+
+    {'xyxy': [x1, y1, x2, y2], 'conf': float}
+
+The LoG and contour backends have no real confidence; LoG boxes get 1.0 and
+contour boxes get their circularity.
+"""
+import math
+
+import cv2
+import numpy as np
+from skimage import color
+from skimage.feature import blob_log
+
+from stage_timer import stage
+
+# ----------------------------
+# Defaults (match gaussian_parallel.py / grey_detect.py / the notebook)
+# ----------------------------
+MIN_SIGMA = 2
+MAX_SIGMA = 10
+NUM_SIGMA = 5
+LOG_THRESHOLD = 0.3
+TOP_PERCENT = 0.20
+BOTTOM_PERCENT = 0.20
+
+LIGHT_THRESHOLD = 150
+MIN_AREA = 5
+MAX_AREA = 500
+CIRCULARITY_THRESH = 0.7
+
+YOLO_WEIGHTS = "yolo11m.pt"
+YOLO_BOAT_CLASS = 8  # boat class in COCO
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def to_gray_float(img):
+    """Return a float grey image in [0, 1], the same as skimage's rgb2gray."""
+    if img.ndim == 2:
+        return img.astype(np.float32) / 255.0 if img.dtype == np.uint8 else img
+    return color.rgb2gray(img[..., ::-1])
+
+
+def to_gray_uint8(img):
+    """Return a uint8 grey image, the same as cv2.imread(..., IMREAD_GRAYSCALE)."""
+    if img.ndim == 2:
+        return img if img.dtype == np.uint8 else np.clip(img * 255, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def crop_rows(height, top_percent, bottom_percent):
+    """Return (top_cut, bottom_cut) row indices for a fractional top/bottom crop."""
+    top_cut = int(height * top_percent)
+    bottom_cut = int(height * (1 - bottom_percent))
+    return top_cut, bottom_cut
+
+
+def crop_roi(gray_img, top_percent, bottom_percent, mask=None):
+    """
+    Return (roi, (x0, y0)) to run a detector on.
+
+    With a static_mask.StaticMask this is the mask's tight bounding box with
+    non-water pixels flattened; otherwise the fixed top/bottom crop.
+    """
+    if mask is not None:
+        roi, _, offset = mask.crop(gray_img)
+        return roi, offset
+    top_cut, bottom_cut = crop_rows(gray_img.shape[0], top_percent, bottom_percent)
+    return gray_img[top_cut:bottom_cut, :], (0, top_cut)
+
+
+def filter_to_mask(boxes, mask, height, width):
+    """Drop boxes whose centre is off-water (no-op without a mask)."""
+    if mask is None:
+        return boxes
+    return [box for box in boxes if mask.contains(box, height, width)]
+
+
+def calculate_iou(box1, box2):
+    """Calculate Intersection over Union for two boxes"""
+    x1_1, y1_1, x2_1, y2_1 = box1['xyxy']
+    x1_2, y1_2, x2_2, y2_2 = box2['xyxy']
+
+    x1_i = max(x1_1, x1_2)
+    y1_i = max(y1_1, y1_2)
+    x2_i = min(x2_1, x2_2)
+    y2_i = min(y2_1, y2_2)
+
+    if x2_i < x1_i or y2_i < y1_i:
+        return 0.0
+
+    intersection = (x2_i - x1_i) * (y2_i - y1_i)
+    area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
+    area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
+    union = area1 + area2 - intersection
+
+    return intersection / union if union > 0 else 0.0
+
+
+def apply_custom_nms(boxes, iou_threshold=0.4):
+    """
+    Greedy NMS, highest confidence first (same as the notebook).
+
+    Returns:
+        tuple: (kept_boxes, suppressed_boxes)
+    """
+    if len(boxes) == 0:
+        return [], []
+
+    boxes_sorted = sorted(boxes, key=lambda x: x['conf'], reverse=True)
+    keep = []
+    suppressed = []
+
+    while len(boxes_sorted) > 0:
+        current = boxes_sorted.pop(0)
+        keep.append(current)
+
+        remaining = []
+        for box in boxes_sorted:
+            if calculate_iou(current, box) < iou_threshold:
+                remaining.append(box)
+            else:
+                suppressed.append(box)
+        boxes_sorted = remaining
+
+    return keep, suppressed
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+def detect_log_blobs(img, min_sigma=MIN_SIGMA, max_sigma=MAX_SIGMA, num_sigma=NUM_SIGMA,
+                     threshold=LOG_THRESHOLD, top_percent=TOP_PERCENT, bottom_percent=BOTTOM_PERCENT, mask=None):
+    """LoG blob detection on the cropped grey ROI (gaussian_parallel.py)."""
+    with stage("color"):
+        gray_img = to_gray_float(img)
+    with stage("crop"):
+        gray, (x0, y0) = crop_roi(gray_img, top_percent, bottom_percent, mask)
+
+    with stage("detect"):
+        blobs = blob_log(gray, min_sigma=min_sigma, max_sigma=max_sigma,
+                         num_sigma=num_sigma, threshold=threshold)
+
+    boxes = []
+    for y, x, sigma in blobs:
+        r = sigma * 1.5  # same radius the scripts draw
+        x += x0
+        y += y0
+        boxes.append({'xyxy': [float(x - r), float(y - r), float(x + r), float(y + r)], 'conf': 1.0})
+    return filter_to_mask(boxes, mask, *gray_img.shape[:2])
+
+
+def detect_contour_lights(img, threshold=LIGHT_THRESHOLD, min_area=MIN_AREA, max_area=MAX_AREA,
+                          circularity_thresh=CIRCULARITY_THRESH, top_percent=0.0, bottom_percent=0.0, mask=None):
+    """Bright, roughly circular contours (detect_lights.py find_spherical_blobs)."""
+    with stage("color"):
+        gray_img = to_gray_uint8(img)
+    with stage("crop"):
+        gray, (x0, y0) = crop_roi(gray_img, top_percent, bottom_percent, mask)
+
+    with stage("detect"):
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for cnt in contours:
+        area = cv2.contourArea(cnt)
+        if area < min_area or area > max_area:
+            continue
+
+        perimeter = cv2.arcLength(cnt, True)
+        if perimeter == 0:
+            continue
+
+        circularity = 4 * math.pi * (area / (perimeter ** 2))
+        if circularity >= circularity_thresh:
+            x, y, w, h = cv2.boundingRect(cnt)
+            x += x0
+            y += y0
+            boxes.append({'xyxy': [float(x), float(y), float(x + w), float(y + h)],
+                          'conf': float(min(circularity, 1.0))})
+    return filter_to_mask(boxes, mask, *gray_img.shape[:2])
+
+
+def load_yolo_batch_backend(weights=YOLO_WEIGHTS, confidence_threshold=0.10, iou_threshold=0.3, imgsz=1920,
+                            exclude_top_percent=25, exclude_bottom_percent=25, boat_class=YOLO_BOAT_CLASS,
+                            mask=None):
+    """
+    Load an ultralytics YOLO model once and return a detect_batch(imgs)
+    callable that runs one forward pass over a list of images and applies
+    the notebook's zone filter and custom NMS to each.
+
+    With a static_mask.StaticMask the model only sees the mask's bounding
+    box (unflattened, so the network keeps its context) and boxes off-water
+    are dropped instead of applying the percentage zones.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+
+    def detect_batch(imgs):
+        imgs = [cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img for img in imgs]
+        offsets = [(0, 0)] * len(imgs)
+        shapes = [img.shape[:2] for img in imgs]
+        if mask is not None:
+            bboxes = [mask.for_shape(*shape)[1] for shape in shapes]
+            imgs = [img[y0:y1, x0:x1] for img, (x0, y0, x1, y1) in zip(imgs, bboxes)]
+            offsets = [(x0, y0) for x0, y0, _, _ in bboxes]
+
+        with stage("detect"):
+            results = model(imgs, conf=confidence_threshold, iou=0.9, imgsz=imgsz,
+                            max_det=300, agnostic_nms=False, verbose=False)
+
+        batch_boxes = []
+        for (height, width), (x0, y0), result in zip(shapes, offsets, results):
+            top_threshold = height * (exclude_top_percent / 100)
+            bottom_threshold = height * (1 - exclude_bottom_percent / 100)
+
+            raw_boxes = []
+            for box in result.boxes:
+                if int(box.cls[0]) != boat_class:
+                    continue
+                x1, y1, x2, y2 = [float(v) for v in box.xyxy[0].cpu().numpy()]
+                x1, y1, x2, y2 = x1 + x0, y1 + y0, x2 + x0, y2 + y0
+                if mask is None and ((y1 + y2) / 2 < top_threshold or y2 > bottom_threshold):
+                    continue
+                raw_boxes.append({'xyxy': [x1, y1, x2, y2], 'conf': float(box.conf[0])})
+
+            raw_boxes = filter_to_mask(raw_boxes, mask, height, width)
+            with stage("nms"):
+                final_boxes, _ = apply_custom_nms(raw_boxes, iou_threshold)
+            batch_boxes.append(final_boxes)
+        return batch_boxes
+
+    return detect_batch
+
+
+def load_yolo_backend(**params):
+    """Single-image wrapper around load_yolo_batch_backend: returns detect(img)."""
+    detect_batch = load_yolo_batch_backend(**params)
+    return lambda img: detect_batch([img])[0]
+
+
+BACKENDS = {
+    'log': detect_log_blobs,
+    'contours': detect_contour_lights,
+    'yolo': load_yolo_backend,
+}
+
+
+def get_backend(name, **params):
+    """
+    Return a detect(img) callable for a backend name.
+
+    params override the backend defaults (e.g. threshold=0.2 for 'log').
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {sorted(BACKENDS)}")
+    if name == 'yolo':
+        return load_yolo_backend(**params)
+
+    fn = BACKENDS[name]
+    if not params:
+        return fn
+    return lambda img: fn(img, **params)
@@ -0,0 +1,273 @@
+#%%
+"""
+Score detector backends against the Roboflow YOLO-format label sets.
+
+For every dataset in DATASETS and every backend in BACKENDS this reports,
+side by side:
+- count MAE and exact-count accuracy (same definitions as compute_MAE.py)
+- precision / recall at IOU_MATCH and AP@IOU_MATCH (mAP, single class)
+- images/s for decode + detect
+
+Images are looked up next to the labels (<split>/images/<stem>.jpg, the
+Roboflow export layout). If that is missing the original CCSS frame is
+tried in IMAGE_DIR. Label files without an image are counted as skipped.
+Ground truth comes from label_pack.py (one cached array per dataset).
+"""
+import os
+import re
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from detectors import get_backend
+from label_pack import list_label_files, load_label_pack
+from static_mask import load_mask
+from stage_timer import TIMER, stage
+
+# ----------------------------
+# Configuration
+# ----------------------------
+DATASETS = [
+    "../data/labeled_dataset_1",
+    "../data/labeled_dataset_2",
+    "../data/labeled_dataset_3",
+    "../data/2 train",
+]
+IMAGE_DIR = "../images/CCSS/"
+OUTPUT_CSV = "./detector_eval.csv"
+IOU_MATCH = 0.5
+MAX_IMAGES = None  # limit per dataset for quick runs
+STATIC_MASK = None  # e.g. "./masks/AXISQ6074EPTZACCC8EACA584.png" from static_mask.py
+
+# backend name -> parameter overrides (see detectors.py)
+BACKENDS = {
+    'log': {},
+    'contours': {},
+    # 'yolo': {'weights': 'yolo11m.pt', 'imgsz': 1920},
+}
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+# Roboflow renames AXIS..._20230901T011501.000Z.jpg -> AXIS..._20230901T011501_000Z_jpg.rf.<hash>,
+# with a _<n> copy suffix before _jpg when the same frame was uploaded more than once
+ROBOFLOW_STEM_PATTERN = r'^(.*_\d{8}T\d{6})_(\d{3}Z)(?:_\d+)?_jpg\.rf\.[0-9a-f]+$'
+
+
+# ----------------------------
+# Dataset helpers
+# ----------------------------
+def find_label_files(dataset_dir):
+    """Return all YOLO label files of a dataset (<split>/labels/ or labels/<split>/)."""
+    return list_label_files(dataset_dir)
+
+
+def find_image_for_label(label_path, image_dir=IMAGE_DIR):
+    """Return the image path for a label file, or None if it isn't available."""
+    # Same layout with 'labels' swapped for 'images' (<split>/images/ or images/<split>/)
+    parts = list(label_path.parent.parts)
+    last_labels = len(parts) - 1 - parts[::-1].index("labels") if "labels" in parts else None
+    if last_labels is not None:
+        parts[last_labels] = "images"
+    images_dir = Path(*parts)
+    for ext in IMAGE_EXTS:
+        candidate = images_dir / f"{label_path.stem}{ext}"
+        if candidate.exists():
+            return candidate
+
+    match = re.match(ROBOFLOW_STEM_PATTERN, label_path.stem)
+    if match and image_dir:
+        candidate = Path(image_dir) / f"{match.group(1)}.{match.group(2)}.jpg"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def read_yolo_boxes(label_path, img_width, img_height, pack=None):
+    """
+    Read a YOLO label file as an (N, 4) xyxy pixel array, from a
+    label_pack.LabelPack when one is given and contains the file.
+    """
+    if pack is not None and label_path in pack:
+        return pack.xyxy(label_path, img_width, img_height)
+    rows = []
+    with open(label_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 5:
+                rows.append([float(v) for v in parts[1:5]])
+    if not rows:
+        return np.zeros((0, 4), dtype=np.float32)
+
+    xywh = np.asarray(rows, dtype=np.float32) * [img_width, img_height, img_width, img_height]
+    xyxy = np.empty_like(xywh)
+    xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    return xyxy
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def box_iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def match_detections(pred_boxes, pred_scores, gt_boxes, iou_match=IOU_MATCH):
+    """
+    Greedy match of predictions (highest score first) to ground truth.
+
+    Returns a bool array, True where the prediction is a true positive.
+    """
+    order = np.argsort(-pred_scores, kind="stable")
+    ious = box_iou_matrix(pred_boxes[order], gt_boxes)
+    taken = np.zeros(len(gt_boxes), dtype=bool)
+    tp = np.zeros(len(pred_boxes), dtype=bool)
+    for rank, idx in enumerate(order):
+        if not len(gt_boxes):
+            break
+        candidates = np.where(~taken, ious[rank], -1.0)
+        best = int(candidates.argmax())
+        if candidates[best] >= iou_match:
+            taken[best] = True
+            tp[idx] = True
+    return tp
+
+
+def average_precision(scores, tp, n_gt):
+    """All-point interpolated AP (VOC2010+/COCO style) for one class."""
+    if n_gt == 0:
+        return float('nan')
+    if len(scores) == 0:
+        return 0.0
+    order = np.argsort(-scores, kind="stable")
+    tp_sorted = tp[order]
+    tp_cum = np.cumsum(tp_sorted)
+    fp_cum = np.cumsum(~tp_sorted)
+    recall = tp_cum / n_gt
+    precision = tp_cum / np.maximum(tp_cum + fp_cum, 1)
+
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    changes = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[changes + 1] - mrec[changes]) * mpre[changes + 1]))
+
+
+# ----------------------------
+# Evaluation loop
+# ----------------------------
+def evaluate_backend(detect, samples, iou_match=IOU_MATCH, desc="Evaluating", pack=None):
+    """Run one detector over (label_path, image_path) samples and return a metrics dict."""
+    count_errors = []
+    all_scores, all_tp = [], []
+    n_gt_total = 0
+    elapsed = 0.0
+
+    for label_path, image_path in tqdm(samples, desc=desc, ncols=80):
+        start = time.perf_counter()
+        with stage("decode"):
+            img = cv2.imread(str(image_path))
+        if img is None:
+            continue
+        boxes = detect(img)
+        elapsed += time.perf_counter() - start
+
+        height, width = img.shape[:2]
+        gt = read_yolo_boxes(label_path, width, height, pack)
+        pred = np.asarray([b['xyxy'] for b in boxes], dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray([b['conf'] for b in boxes], dtype=np.float32)
+
+        count_errors.append(len(pred) - len(gt))
+        all_scores.append(scores)
+        all_tp.append(match_detections(pred, scores, gt, iou_match))
+        n_gt_total += len(gt)
+
+    if not count_errors:
+        return None
+
+    errors = np.asarray(count_errors)
+    scores = np.concatenate(all_scores)
+    tp = np.concatenate(all_tp)
+    n_tp = int(tp.sum())
+    return {
+        'images': len(errors),
+        'gt_boats': n_gt_total,
+        'pred_boats': len(scores),
+        'count_mae': float(np.abs(errors).mean()),
+        'exact_count_acc': float((errors == 0).mean()),
+        'overcount': int((errors > 0).sum()),
+        'undercount': int((errors < 0).sum()),
+        'precision': n_tp / len(scores) if len(scores) else float('nan'),
+        'recall': n_tp / n_gt_total if n_gt_total else float('nan'),
+        f'mAP@{iou_match}': average_precision(scores, tp, n_gt_total),
+        'images_per_s': len(errors) / elapsed if elapsed > 0 else float('nan'),
+    }
+
+
+def collect_samples(dataset_dir, image_dir=IMAGE_DIR, max_images=MAX_IMAGES):
+    """Return ([(label_path, image_path), ...], n_skipped) for a dataset."""
+    samples, skipped = [], 0
+    for label_path in find_label_files(dataset_dir):
+        image_path = find_image_for_label(label_path, image_dir)
+        if image_path is None:
+            skipped += 1
+            continue
+        samples.append((label_path, image_path))
+    if max_images is not None:
+        samples = samples[:max_images]
+    return samples, skipped
+
+
+def main():
+    mask = load_mask(STATIC_MASK) if STATIC_MASK else None
+
+    rows = []
+    for dataset_dir in DATASETS:
+        with stage("list"):
+            samples, skipped = collect_samples(dataset_dir)
+        print(f"\n📂 {dataset_dir}: {len(samples)} labelled images ({skipped} without image, skipped)")
+        if not samples:
+            continue
+        pack = load_label_pack(dataset_dir)
+
+        for name, params in BACKENDS.items():
+            detect = get_backend(name, **params, **({'mask': mask} if mask is not None else {}))
+            metrics = evaluate_backend(detect, samples, desc=f"{name:>8}", pack=pack)
+            if metrics is None:
+                continue
+            rows.append({'dataset': os.path.basename(os.path.normpath(dataset_dir)),
+                         'backend': name, **metrics})
+
+    if not rows:
+        print("No labelled images with matching image files found.")
+        return
+
+    results = pd.DataFrame(rows)
+    with stage("write"):
+        results.to_csv(OUTPUT_CSV, index=False)
+
+    print("\n" + "=" * 60)
+    with pd.option_context('display.width', 160, 'display.float_format', '{:.3f}'.format):
+        print(results.to_string(index=False))
+    print("=" * 60)
+    print(f"✅ Saved evaluation to {OUTPUT_CSV}")
+    print(TIMER.table())
+    print(f"⏱  Stage timings: {TIMER.dump_json()}")
+
+
+if __name__ == "__main__":
+    main()
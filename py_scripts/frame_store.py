@@ -0,0 +1,303 @@
+#%%
+"""
+Memory-mapped store of pre-decoded grey frames for repeated experiments.
+
+Build once: every image in the working set (the grey frames from
+SEGMENT_CSV by default) is decoded, converted to grey, cropped to the
+TOP_PERCENT / BOTTOM_PERCENT ROI, optionally rescaled by SCALE, and written
+back to back into a single flat uint8 file. Afterwards the scripts read
+frames as numpy views into that file. There is no JPEG decode and no copy,
+and joblib/multiprocessing workers that open the same store share its pages
+through the OS page cache instead of each holding their own decoded copy.
+
+Each configuration gets its own folder under STORE_ROOT (store_dir_for()),
+so the scripts that need different crops / grey modes each find theirs:
+    gaussian_parallel.py, log_sweep.py   20% / 20% crop, 'skimage' grey
+    laplacian_gaussian.py                25% / 20% crop, 'skimage' grey
+    detect_lights.py                     whole frame, 'cv2' grey
+main() builds every entry of STORE_CONFIGS.
+
+Layout of a store folder:
+    frames.u8   all ROIs, row-major, concatenated
+    index.csv   image, timestamp, offset, height, width, y0, src_height, src_width
+    meta.json   build parameters (checked by open_store before reuse)
+
+GRAY_MODE picks the grey conversion: 'skimage' (rgb2gray, Rec.709 weights,
+what the LoG scripts use) or 'cv2' (IMREAD_GRAYSCALE, BT.601, what
+detect_lights.py thresholds). Values are rounded to uint8, i.e. within
+1/510 of rgb2gray's float output.
+"""
+import json
+import os
+import re
+from datetime import datetime
+
+import cv2
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from PIL import Image
+from skimage import color
+from tqdm import tqdm
+
+# ----------------------------
+# Configuration
+# ----------------------------
+IMAGE_DIR = "../images/CCSS/"
+SEGMENT_CSV = "./image_segmentation_grey.csv"  # working set = rows with grey == True
+STORE_ROOT = "./frame_store/"  # one sub-folder per crop / scale / grey mode
+TOP_PERCENT = 0.20
+BOTTOM_PERCENT = 0.20
+SCALE = 1.0  # e.g. 0.5 for quick sweeps
+GRAY_MODE = 'skimage'  # 'skimage' or 'cv2'
+STORE_CONFIGS = [  # (top_percent, bottom_percent, gray_mode) built by main()
+    (0.20, 0.20, 'skimage'),  # gaussian_parallel.py, log_sweep.py
+    (0.25, 0.20, 'skimage'),  # laplacian_gaussian.py
+    (0.0, 0.0, 'cv2'),  # detect_lights.py
+]
+N_JOBS = 4
+CHUNK_SIZE = 256  # frames per worker task while building
+
+DATA_FILE = "frames.u8"
+INDEX_FILE = "index.csv"
+META_FILE = "meta.json"
+TIMESTAMP_PATTERN = r'_(\d{8}T\d{6}\.\d{3}Z)'
+
+_opened_stores = {}
+
+
+def store_dir_for(top_percent=TOP_PERCENT, bottom_percent=BOTTOM_PERCENT, scale=1.0, gray_mode=GRAY_MODE,
+                  store_root=STORE_ROOT):
+    """Folder of the store built with these settings, e.g. ./frame_store/top0.2_bottom0.2_scale1_skimage"""
+    return os.path.join(store_root, f"top{top_percent:g}_bottom{bottom_percent:g}_scale{scale:g}_{gray_mode}")
+
+
+def parse_timestamp(filename):
+    """AXIS..._20230901T210530.000Z.jpg -> '2023-09-01 21:05:30' (None if unparseable)"""
+    match = re.search(TIMESTAMP_PATTERN, filename)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%Y%m%dT%H%M%S.%fZ').strftime('%Y-%m-%d %H:%M:%S')
+
+
+def roi_geometry(src_height, src_width, top_percent, bottom_percent, scale):
+    """Return (y0, roi_height, out_height, out_width) for a source frame size."""
+    top_cut = int(src_height * top_percent)
+    bottom_cut = int(src_height * (1 - bottom_percent))
+    roi_height = bottom_cut - top_cut
+    return top_cut, roi_height, max(1, round(roi_height * scale)), max(1, round(src_width * scale))
+
+
+def decode_roi(img_path, top_percent=TOP_PERCENT, bottom_percent=BOTTOM_PERCENT, scale=SCALE, gray_mode=GRAY_MODE):
+    """Decode one frame to its uint8 grey ROI at scale (None if unreadable)."""
+    if gray_mode == 'cv2':
+        gray = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return None
+    else:
+        img = cv2.imread(img_path)
+        if img is None:
+            return None
+        gray = np.round(color.rgb2gray(img[..., ::-1]) * 255).astype(np.uint8)
+
+    y0, roi_height, out_height, out_width = roi_geometry(*gray.shape, top_percent, bottom_percent, scale)
+    roi = gray[y0:y0 + roi_height]
+    if scale != 1.0:
+        roi = cv2.resize(roi, (out_width, out_height), interpolation=cv2.INTER_AREA)
+    return roi
+
+
+# ----------------------------
+# Build
+# ----------------------------
+def _write_chunk(data_path, total_bytes, rows, image_dir, top_percent, bottom_percent, scale, gray_mode):
+    """Decode a chunk of index rows into the shared data file; returns the names that failed."""
+    data = np.memmap(data_path, dtype=np.uint8, mode='r+', shape=(total_bytes,))
+    failed = []
+    for image, offset, height, width in rows:
+        roi = decode_roi(os.path.join(image_dir, image), top_percent, bottom_percent, scale, gray_mode)
+        if roi is None or roi.shape != (height, width):
+            failed.append(image)
+            continue
+        data[offset:offset + height * width] = roi.ravel()
+    data.flush()
+    del data
+    return failed
+
+
+def build_store(image_names, image_dir=IMAGE_DIR, store_dir=None, top_percent=TOP_PERCENT,
+                bottom_percent=BOTTOM_PERCENT, scale=SCALE, gray_mode=GRAY_MODE, n_jobs=N_JOBS):
+    """Decode image_names into a new store at store_dir (default store_dir_for the settings) and return it opened."""
+    store_dir = store_dir or store_dir_for(top_percent, bottom_percent, scale, gray_mode)
+    os.makedirs(store_dir, exist_ok=True)
+
+    # Pass 1: sizes from the JPEG headers only, to lay out the file
+    rows, offset = [], 0
+    for image in tqdm(image_names, desc="Reading headers", ncols=80):
+        try:
+            with Image.open(os.path.join(image_dir, image)) as im:
+                src_width, src_height = im.size
+        except (OSError, ValueError):
+            continue
+        y0, _, height, width = roi_geometry(src_height, src_width, top_percent, bottom_percent, scale)
+        rows.append({'image': image, 'timestamp': parse_timestamp(image), 'offset': offset,
+                     'height': height, 'width': width, 'y0': y0,
+                     'src_height': src_height, 'src_width': src_width})
+        offset += height * width
+    total_bytes = max(offset, 1)
+
+    data_path = os.path.join(store_dir, DATA_FILE)
+    np.memmap(data_path, dtype=np.uint8, mode='w+', shape=(total_bytes,)).flush()
+
+    # Pass 2: decode in parallel, each worker writing its own slices of the file
+    tasks = [(r['image'], r['offset'], r['height'], r['width']) for r in rows]
+    chunks = [tasks[i:i + CHUNK_SIZE] for i in range(0, len(tasks), CHUNK_SIZE)]
+    results = Parallel(n_jobs=n_jobs, prefer="processes")(
+        delayed(_write_chunk)(data_path, total_bytes, chunk, image_dir, top_percent, bottom_percent, scale, gray_mode)
+        for chunk in tqdm(chunks, desc="Decoding", ncols=80)
+    )
+    failed = {name for chunk_failed in results for name in chunk_failed}
+
+    index = pd.DataFrame(rows, columns=['image', 'timestamp', 'offset', 'height', 'width', 'y0',
+                                        'src_height', 'src_width'])
+    index = index[~index['image'].isin(failed)]
+    index.to_csv(os.path.join(store_dir, INDEX_FILE), index=False)
+
+    meta = {'image_dir': os.path.abspath(image_dir), 'top_percent': top_percent, 'bottom_percent': bottom_percent,
+            'scale': scale, 'gray_mode': gray_mode, 'frames': len(index), 'bytes': total_bytes,
+            'built': datetime.now().isoformat(timespec='seconds')}
+    with open(os.path.join(store_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    skipped = len(image_names) - len(index)
+    print(f"✅ Stored {len(index)} frames ({total_bytes / 1e9:.2f} GB) in {store_dir}"
+          + (f", {skipped} unreadable skipped" if skipped else ""))
+    return FrameStore(store_dir)
+
+
+# ----------------------------
+# Read
+# ----------------------------
+class FrameStore:
+    """Read-only, zero-copy access to a built store. Safe to pass to worker processes."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.index = pd.read_csv(os.path.join(store_dir, INDEX_FILE))
+        self._offsets = self.index['offset'].to_numpy(np.int64)
+        self._shapes = self.index[['height', 'width']].to_numpy(np.int64)
+        self._y0 = self.index['y0'].to_numpy(np.int64)
+        self._positions = {name: i for i, name in enumerate(self.index['image'])}
+        self._open()
+
+    def _open(self):
+        self._data = np.memmap(os.path.join(self.store_dir, DATA_FILE), dtype=np.uint8, mode='r',
+                               shape=(self.meta['bytes'],))
+
+    def __getstate__(self):
+        # Send only the path; each worker maps the same file and shares its pages
+        state = self.__dict__.copy()
+        del state['_data']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, image):
+        return image in self._positions
+
+    @property
+    def scale(self):
+        return self.meta['scale']
+
+    def position(self, image):
+        return self._positions[image]
+
+    def roi(self, key):
+        """uint8 (H, W) read-only view of a frame's ROI, by filename or position."""
+        i = self._positions[key] if isinstance(key, str) else key
+        height, width = self._shapes[i]
+        start = self._offsets[i]
+        return self._data[start:start + height * width].reshape(height, width)
+
+    def roi_float(self, key):
+        """
+        float32 [0, 1] copy of a frame's ROI, for detectors that need floats
+        (blob_log). This is the one copy per frame the store can't avoid;
+        float32 keeps it at 4 bytes per pixel instead of the 8 of roi() / 255.0.
+        """
+        return np.multiply(self.roi(key), np.float32(1 / 255), dtype=np.float32)
+
+    def offset(self, key):
+        """(x0, y0) of the ROI in the source frame, in source pixels."""
+        i = self._positions[key] if isinstance(key, str) else key
+        return 0, int(self._y0[i])
+
+    def source_shape(self, key):
+        """(height, width) of the original frame."""
+        i = self._positions[key] if isinstance(key, str) else key
+        row = self.index.iloc[i]
+        return int(row['src_height']), int(row['src_width'])
+
+    def to_source_xyxy(self, key, xyxy):
+        """Map an xyxy box from ROI pixels (at store scale) to source frame pixels."""
+        x0, y0 = self.offset(key)
+        x1, y1, x2, y2 = (v / self.scale for v in xyxy)
+        return [x1 + x0, y1 + y0, x2 + x0, y2 + y0]
+
+    def matches(self, top_percent, bottom_percent, scale=1.0, gray_mode=GRAY_MODE):
+        """True if the store was built with these ROI / scale / grey settings."""
+        return (self.meta['top_percent'] == top_percent and self.meta['bottom_percent'] == bottom_percent
+                and self.meta['scale'] == scale and self.meta['gray_mode'] == gray_mode)
+
+
+def open_store(store_dir=None, top_percent=TOP_PERCENT, bottom_percent=BOTTOM_PERCENT,
+               scale=1.0, gray_mode=GRAY_MODE):
+    """
+    FrameStore if one was built at store_dir (default store_dir_for the
+    settings) with matching settings, else None. A store built with other
+    settings is reported, since the caller then falls back to decoding JPEGs.
+    """
+    store_dir = store_dir or store_dir_for(top_percent, bottom_percent, scale, gray_mode)
+    if not os.path.exists(os.path.join(store_dir, META_FILE)):
+        return None
+    store = FrameStore(store_dir)
+    if not store.matches(top_percent, bottom_percent, scale, gray_mode):
+        meta = store.meta
+        print(f"⚠️  Frame store {store_dir} was built with crop {meta['top_percent']}/{meta['bottom_percent']}, "
+              f"scale {meta['scale']}, {meta['gray_mode']} grey, not {top_percent}/{bottom_percent}, "
+              f"scale {scale}, {gray_mode} grey; decoding JPEGs instead")
+        return None
+    return store
+
+
+def worker_store(store_dir=None, top_percent=TOP_PERCENT, bottom_percent=BOTTOM_PERCENT, scale=1.0, gray_mode=GRAY_MODE):
+    """
+    open_store, opened once per process. Pass store_dir (not the store) to
+    joblib tasks and call this in the worker, so the index isn't pickled with
+    every task.
+    """
+    store_dir = store_dir or store_dir_for(top_percent, bottom_percent, scale, gray_mode)
+    key = (os.path.abspath(store_dir), top_percent, bottom_percent, scale, gray_mode)
+    if key not in _opened_stores:
+        _opened_stores[key] = open_store(store_dir, top_percent, bottom_percent, scale, gray_mode)
+    return _opened_stores[key]
+
+
+def main():
+    df = pd.read_csv(SEGMENT_CSV)
+    image_names = df[df["grey"]]["image"].tolist()
+    for top_percent, bottom_percent, gray_mode in STORE_CONFIGS:
+        print(f"🧩 Building frame store for {len(image_names)} images "
+              f"(ROI {top_percent:.0%}-{1 - bottom_percent:.0%}, scale {SCALE}, {gray_mode} grey)")
+        build_store(image_names, top_percent=top_percent, bottom_percent=bottom_percent, gray_mode=gray_mode)
+
+
+if __name__ == "__main__":
+    main()
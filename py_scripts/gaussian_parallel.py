@@ -12,6 +12,10 @@ from openpyxl.styles import Font
 from joblib import Parallel, delayed
 import random
 import gc
+from detection_cache import DetectionCache, hash_array, hash_file
+from static_mask import load_camera_mask
+from frame_store import store_dir_for, worker_store
+from stage_timer import TIMER, drain, profiled, stage
 
 # ----------------------------
 # Parameters
@@ -28,50 +32,99 @@ TOP_PERCENT = 0.20
 BOTTOM_PERCENT = 0.20
 BATCH_SIZE = 3000
 N_JOBS = 4  # number of parallel processes
+USE_CACHE = True  # reuse blob results for unchanged images + parameters
+CACHE_DIR = "./.detection_cache"
+USE_STATIC_MASK = True  # use ./masks/<camera>.png from static_mask.py when present
+USE_FRAME_STORE = True  # read pre-decoded ROIs from frame_store.py when built with the same crop
+FRAME_STORE_DIR = store_dir_for(TOP_PERCENT, BOTTOM_PERCENT)  # built by frame_store.py
 
-os.makedirs(OUTPUT_IMG_DIR, exist_ok=True)
+BLOB_PARAMS = {"min_sigma": MIN_SIGMA, "max_sigma": MAX_SIGMA, "num_sigma": NUM_SIGMA,
+               "threshold": THRESHOLD, "top_percent": TOP_PERCENT, "bottom_percent": BOTTOM_PERCENT}
+cache = None  # opened by open_cache() on first use, so importing this module creates no folders
 
-# ----------------------------
-# Load and sample image list
-# ----------------------------
-df = pd.read_csv(OUTPUT_CSV)
-grey_images = df[df["grey"]]["image"].tolist()
 
-random.seed(42)
-#grey_images = random.sample(grey_images_full, min(5000, len(grey_images_full)))
+def open_cache():
+    """The DetectionCache in CACHE_DIR, created on first use (None when USE_CACHE is off)."""
+    global cache
+    if cache is None and USE_CACHE:
+        cache = DetectionCache(CACHE_DIR)
+    return cache
 
 # ----------------------------
 # Image processing function
 # ----------------------------
-def process_single_image(img_name):
+def process_single_image(img_name, store_dir=None):
     try:
         img_path = os.path.join(IMAGE_DIR, img_name)
-        img = io.imread(img_path)
-        gray_img = color.rgb2gray(img)
-        height, width = gray_img.shape
-
-        # Crop region of interest
-        top_cut = int(height * TOP_PERCENT)
-        bottom_cut = int(height * (1 - BOTTOM_PERCENT))
-        gray = gray_img[top_cut:bottom_cut, :]
-
-        # Detect blobs (boats)
-        blobs = blob_log(gray, min_sigma=MIN_SIGMA, max_sigma=MAX_SIGMA,
-                         num_sigma=NUM_SIGMA, threshold=THRESHOLD)
-        num_boats = len(blobs)
-
-        # Save visualization
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.imshow(gray, cmap='gray')
-        for y, x, sigma in blobs:
-            c = plt.Circle((x, y), sigma * 1.5, color='red', linewidth=1.5, fill=False)
-            ax.add_patch(c)
-        ax.set_title(f"{img_name} — Boats: {num_boats}")
-        ax.axis('off')
-
         output_img_path = os.path.join(OUTPUT_IMG_DIR, f"{os.path.splitext(img_name)[0]}_detected.jpg")
-        plt.savefig(output_img_path, bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
+        # Opened once per worker process from its path, not pickled with every task
+        store = worker_store(store_dir, TOP_PERCENT, BOTTOM_PERCENT) if store_dir else None
+        cache = open_cache()
+
+        # Crop region of interest: learned water mask if built, else fixed bands
+        mask = load_camera_mask(img_name) if USE_STATIC_MASK else None
+        from_store = mask is None and store is not None and img_name in store
+
+        # Cached result for an unchanged image, looked up before anything is decoded
+        key = blobs = None
+        if cache is not None:
+            params = dict(BLOB_PARAMS, mask=mask.digest if mask is not None else None, frame_store=from_store)
+            with stage("hash"):
+                # Store frames are keyed on the stored ROI, so the JPEG isn't read at all
+                digest = hash_array(store.roi(img_name)) if from_store else hash_file(img_path)
+            key = cache.make_key(digest, "skimage.blob_log", params)
+            blobs = cache.get(key)
+
+        # A hit whose visualization is already on disk needs no decode and no render
+        if blobs is None or not os.path.exists(output_img_path):
+            roi_mask = None
+            if from_store:
+                # Same fixed-band ROI, already decoded (shared memory map, no JPEG decode)
+                with stage("decode"):
+                    gray = store.roi_float(img_name)
+            else:
+                with stage("decode"):
+                    img = io.imread(img_path)
+                with stage("color"):
+                    gray_img = color.rgb2gray(img)
+                height, width = gray_img.shape
+                with stage("crop"):
+                    if mask is not None:
+                        gray, roi_mask, _ = mask.crop(gray_img)
+                    else:
+                        top_cut = int(height * TOP_PERCENT)
+                        bottom_cut = int(height * (1 - BOTTOM_PERCENT))
+                        gray = gray_img[top_cut:bottom_cut, :]
+
+            # Detect blobs (boats)
+            if blobs is None:
+                with stage("detect"):
+                    blobs = blob_log(gray, min_sigma=MIN_SIGMA, max_sigma=MAX_SIGMA,
+                                     num_sigma=NUM_SIGMA, threshold=THRESHOLD)
+                if roi_mask is not None:
+                    blobs = [b for b in blobs if roi_mask[int(b[0]), int(b[1])]]
+                blobs = np.asarray(blobs).tolist()
+                if key is not None:
+                    cache.put(key, blobs)
+
+            blobs = np.asarray(blobs).reshape(-1, 3)
+
+            # Save visualization
+            with stage("render"):
+                fig, ax = plt.subplots(figsize=(6, 6))
+                ax.imshow(gray, cmap='gray')
+                for y, x, sigma in blobs:
+                    c = plt.Circle((x, y), sigma * 1.5, color='red', linewidth=1.5, fill=False)
+                    ax.add_patch(c)
+                ax.set_title(f"{img_name} — Boats: {len(blobs)}")
+                ax.axis('off')
+
+            with stage("write"):
+                plt.savefig(output_img_path, bbox_inches='tight', pad_inches=0)
+            plt.close(fig)
+        else:
+            blobs = np.asarray(blobs).reshape(-1, 3)
+        num_boats = len(blobs)
 
         blob_coords = "; ".join([f"({x:.1f}, {y:.1f})" for y, x, sigma in blobs])
 
@@ -79,7 +132,8 @@ def process_single_image(img_name):
             "image": img_name,
             "boat_count": num_boats,
             "detected_image": os.path.abspath(output_img_path),
-            "boat_coordinates": blob_coords
+            "boat_coordinates": blob_coords,
+            "_timings": drain(),
         }
 
     except Exception as e:
@@ -87,7 +141,8 @@ def process_single_image(img_name):
             "image": img_name,
             "boat_count": 0,
             "detected_image": None,
-            "boat_coordinates": f"Error: {e}"
+            "boat_coordinates": f"Error: {e}",
+            "_timings": drain(),
         }
 
 # ----------------------------
@@ -101,57 +156,80 @@ def append_to_excel(df_batch, filename):
             start_row = writer.sheets["Sheet1"].max_row
             df_batch.to_excel(writer, index=False, header=False, startrow=start_row)
 
-# ----------------------------
-# Main processing loop
-# ----------------------------
-pbar = tqdm(total=len(grey_images), desc="Processing images", ncols=80)
-
-for i in range(0, len(grey_images), BATCH_SIZE):
-    batch = grey_images[i:i + BATCH_SIZE]
-    print(f"\n🧩 Processing batch {i // BATCH_SIZE + 1} ({len(batch)} images)")
-
-    # Parallel image processing (separate processes = better memory cleanup)
-    batch_results = Parallel(n_jobs=N_JOBS, prefer="processes")(
-        delayed(process_single_image)(img_name) for img_name in batch
-    )
-
-    # Create DataFrame and append to Excel
-    batch_df = pd.DataFrame(batch_results)
-    append_to_excel(batch_df, OUTPUT_XLSX)
-
-    # Update progress bar
-    pbar.update(len(batch))
 
-    # Release memory between batches
-    del batch_results, batch_df
-    gc.collect()
-    plt.close('all')
-
-pbar.close()
-
-# ----------------------------
-# Add clickable hyperlinks
-# ----------------------------
-wb = load_workbook(OUTPUT_XLSX)
-ws = wb.active
-
-col_idx = None
-for i, cell in enumerate(ws[1], start=1):
-    if cell.value == "detected_image":
-        col_idx = i
-        break
-
-if col_idx is not None:
-    for row in range(2, ws.max_row + 1):
-        cell = ws.cell(row=row, column=col_idx)
-        img_path = cell.value
-        if img_path and os.path.exists(img_path):
-            cell.value = "View Image"
-            cell.hyperlink = img_path
-            cell.font = Font(color="0000FF", underline="single")
-
-wb.save(OUTPUT_XLSX)
-
-print(f"\n✅ Saved all boat detections to {OUTPUT_XLSX}")
-print(f"✅ Output images in: {OUTPUT_IMG_DIR}")
+if __name__ == "__main__":
+    # ----------------------------
+    # Load and sample image list
+    # ----------------------------
+    with stage("list"):
+        df = pd.read_csv(OUTPUT_CSV)
+        grey_images = df[df["grey"]]["image"].tolist()
+
+    random.seed(42)
+    os.makedirs(OUTPUT_IMG_DIR, exist_ok=True)
+    open_cache()  # before the tasks are pickled, so workers get the opened cache
+    #grey_images = random.sample(grey_images_full, min(5000, len(grey_images_full)))
+
+    # ----------------------------
+    # Main processing loop
+    # ----------------------------
+    pbar = tqdm(total=len(grey_images), desc="Processing images", ncols=80)
+
+    with profiled():  # set STAGE_PROFILE=gaussian_parallel.prof to cProfile the run
+        for i in range(0, len(grey_images), BATCH_SIZE):
+            batch = grey_images[i:i + BATCH_SIZE]
+            store_dir = FRAME_STORE_DIR if USE_FRAME_STORE else None
+            print(f"\n🧩 Processing batch {i // BATCH_SIZE + 1} ({len(batch)} images)")
+
+            # Parallel image processing (separate processes = better memory cleanup)
+            batch_results = Parallel(n_jobs=N_JOBS, prefer="processes")(
+                delayed(process_single_image)(img_name, store_dir) for img_name in batch
+            )
+
+            # Fold the workers' stage timings into this process's timer
+            for result in batch_results:
+                TIMER.merge(result.pop("_timings", None))
+
+            # Create DataFrame and append to Excel
+            with stage("write"):
+                batch_df = pd.DataFrame(batch_results)
+                append_to_excel(batch_df, OUTPUT_XLSX)
+
+            # Update progress bar
+            pbar.update(len(batch))
+
+            # Release memory between batches
+            del batch_results, batch_df
+            gc.collect()
+            plt.close('all')
+
+    pbar.close()
+
+    # ----------------------------
+    # Add clickable hyperlinks
+    # ----------------------------
+    wb = load_workbook(OUTPUT_XLSX)
+    ws = wb.active
+
+    col_idx = None
+    for i, cell in enumerate(ws[1], start=1):
+        if cell.value == "detected_image":
+            col_idx = i
+            break
+
+    if col_idx is not None:
+        for row in range(2, ws.max_row + 1):
+            cell = ws.cell(row=row, column=col_idx)
+            img_path = cell.value
+            if img_path and os.path.exists(img_path):
+                cell.value = "View Image"
+                cell.hyperlink = img_path
+                cell.font = Font(color="0000FF", underline="single")
+
+    wb.save(OUTPUT_XLSX)
+
+    print(f"\n✅ Saved all boat detections to {OUTPUT_XLSX}")
+    print(f"✅ Output images in: {OUTPUT_IMG_DIR}")
+    print(TIMER.table())
+    print(f"⏱  Stage timings: {TIMER.dump_json()}")
 #%%
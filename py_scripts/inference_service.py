@@ -0,0 +1,185 @@
+#%%
+"""
+Micro-batching inference service for one shared model.
+
+The notebook calls a single YOLO model from 8 ThreadPoolExecutor workers at
+once. Here the I/O threads only submit() frames; one inference thread owns
+the model, collects frames into batches of up to MAX_BATCH_SIZE (or whatever
+has arrived once MAX_LATENCY_MS has passed since the first frame of the
+batch), runs one forward pass, and resolves each caller's Future.
+
+I/O concurrency (MAX_WORKERS) and compute batching (MAX_BATCH_SIZE,
+MAX_LATENCY_MS, INTRA_OP_THREADS) are tuned independently.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from tqdm import tqdm
+
+# ----------------------------
+# Configuration
+# ----------------------------
+MAX_BATCH_SIZE = 8
+MAX_LATENCY_MS = 25  # longest a frame waits for the batch to fill
+MAX_QUEUE = 256  # submit() blocks once this many frames are waiting
+INTRA_OP_THREADS = None  # torch.set_num_threads for the inference thread, None = torch default
+MAX_WORKERS = 8  # I/O threads in main()
+BACKEND_PARAMS = {'weights': 'yolo11m.pt', 'imgsz': 1920}
+
+_STOP = object()
+
+
+class BatchInferenceService:
+    """
+    Run predict_batch(list_of_inputs) -> list_of_outputs on a single thread,
+    fed from any number of submitting threads.
+
+    Usage:
+        with BatchInferenceService(detect_batch) as service:
+            boxes = service.submit(img).result()
+    """
+
+    def __init__(self, predict_batch, max_batch_size=MAX_BATCH_SIZE,
+                 max_latency_ms=MAX_LATENCY_MS, max_queue=MAX_QUEUE):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._close_lock = threading.Lock()  # orders every submit() before or after close()'s _STOP
+        self.stats = {'batches': 0, 'items': 0, 'busy_s': 0.0}
+        self._thread = threading.Thread(target=self._run, name="inference", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue one input and return a Future for its output."""
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("BatchInferenceService is closed")
+            self._queue.put((item, future))
+        return future
+
+    def close(self):
+        """Finish the queued work and stop the inference thread."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def mean_batch_size(self):
+        return self.stats['items'] / self.stats['batches'] if self.stats['batches'] else 0.0
+
+    def _collect_batch(self, first):
+        """Gather up to max_batch_size requests or until the deadline passes."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        if INTRA_OP_THREADS:
+            import torch
+            torch.set_num_threads(INTRA_OP_THREADS)
+
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect_batch(first)
+
+            # Skip anything the caller already cancelled
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                outputs = self.predict_batch([item for item, _ in batch])
+                if len(outputs) != len(batch):
+                    raise RuntimeError(f"predict_batch returned {len(outputs)} results for {len(batch)} inputs")
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+            else:
+                for (_, fut), output in zip(batch, outputs):
+                    fut.set_result(output)
+            finally:
+                self.stats['busy_s'] += time.perf_counter() - start
+                self.stats['batches'] += 1
+                self.stats['items'] += len(batch)
+
+        # Fail anything left behind after close()
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not _STOP:
+                request[1].set_exception(RuntimeError("BatchInferenceService closed"))
+
+
+def main():
+    """Notebook-style run: I/O threads fetch from the object store, one model does the compute."""
+    from detectors import load_yolo_batch_backend
+    from s3_ingest import (BUCKET_NAME, CSV_OUTPUT, CSV_PATH, FOLDER_PREFIX, LOCAL_STORE_ROOT,
+                           SEGMENT, LocalObjectStore, fetch_image, load_file_list,
+                           make_s3_client, parse_timestamp_from_filename)
+
+    client = LocalObjectStore(LOCAL_STORE_ROOT) if LOCAL_STORE_ROOT else make_s3_client()
+    file_list = load_file_list(CSV_PATH)
+    detect_batch = load_yolo_batch_backend(**BACKEND_PARAMS)
+
+    def process_single_image(service, file_name):
+        img = fetch_image(client, BUCKET_NAME, f"{FOLDER_PREFIX}{file_name}")
+        boxes = service.submit(img).result()
+        return {
+            'filename': file_name,
+            'timestamp': parse_timestamp_from_filename(file_name),
+            'segment': SEGMENT,
+            'boat_count': len(boxes),
+        }
+
+    results, failed_files = [], []
+    with BatchInferenceService(detect_batch) as service, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(process_single_image, service, f): f for f in file_list}
+        for future in tqdm(as_completed(futures), total=len(file_list), desc="Processing images", unit="img"):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"\n✗ Failed {futures[future]}: {e}")
+                failed_files.append(futures[future])
+
+    pd.DataFrame(results).to_csv(CSV_OUTPUT, index=False)
+    print(f"📄 Output CSV: {CSV_OUTPUT}")
+    print(f"✓ Successful: {len(results)}  ✗ Failed: {len(failed_files)}")
+    print(f"📦 {service.stats['batches']} batches, mean size {service.mean_batch_size:.1f}, "
+          f"model busy {service.stats['busy_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
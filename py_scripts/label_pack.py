@@ -0,0 +1,189 @@
+#%%
+"""
+Packed, cached loader for the YOLO-format label sets under ../data/.
+
+Each dataset is hundreds to thousands of small .txt files. Parsing them one by one on
+every evaluation or plot is slow. Here they are parsed once into a single
+.npz under LABEL_CACHE_DIR holding:
+- labels   float32 (N, 6): image index, class, x_center, y_center, w, h (normalised)
+- offsets  int64 (n_files + 1): labels[offsets[i]:offsets[i + 1]] belong to file i
+- files    label paths relative to the dataset folder
+- signature  digest of every label file's (path, size, mtime)
+
+The pack is rebuilt automatically when the signature no longer matches,
+i.e. a label file was added, removed or edited. Checking costs one stat per
+file, not a parse. Empty label files stay in the pack with zero rows (an
+image with no boats).
+"""
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+# ----------------------------
+# Configuration
+# ----------------------------
+DATASETS = [
+    "../data/labeled_dataset_1",
+    "../data/labeled_dataset_2",
+    "../data/labeled_dataset_3",
+    "../data/2 train",
+]
+LABEL_CACHE_DIR = "./.label_cache"
+
+_loaded_packs = {}
+
+
+def list_label_files(dataset_dir):
+    """
+    All YOLO label files of a dataset, sorted: .txt files under a 'labels'
+    folder, either <split>/labels/ or labels/<split>/.
+    """
+    root = Path(dataset_dir)
+    return sorted(p for p in root.rglob("*.txt") if "labels" in p.relative_to(root).parts[:-1])
+
+
+def label_signature(dataset_dir, label_files):
+    """Digest of (relative path, size, mtime) for every label file."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in label_files:
+        st = path.stat()
+        h.update(f"{path.relative_to(dataset_dir).as_posix()}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def parse_label_files(label_files):
+    """Parse label files into (labels (N, 6) float32, offsets (n_files + 1,) int64)."""
+    values, offsets = [], [0]
+    for index, path in enumerate(label_files):
+        n = 0
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 5:
+                    values.append(index)
+                    values.extend(parts[:5])
+                    n += 1
+        offsets.append(offsets[-1] + n)
+    labels = np.asarray(values, dtype=np.float32).reshape(-1, 6)
+    return labels, np.asarray(offsets, dtype=np.int64)
+
+
+class LabelPack:
+    """All ground-truth boxes of one dataset, indexed by label file."""
+
+    def __init__(self, dataset_dir, files, labels, offsets, signature):
+        self.dataset_dir = Path(dataset_dir)
+        self.files = list(files)
+        self.labels = labels
+        self.offsets = offsets
+        self.signature = signature
+        self._positions = {name: i for i, name in enumerate(self.files)}
+
+    def __len__(self):
+        return len(self.files)
+
+    def position(self, label_path):
+        """Index of a label file (absolute, or relative to the dataset folder); None if not packed."""
+        path = Path(label_path)
+        if path.is_absolute() or path.exists():
+            try:
+                path = path.resolve().relative_to(self.dataset_dir.resolve())
+            except ValueError:
+                return None
+        return self._positions.get(path.as_posix())
+
+    def __contains__(self, label_path):
+        return self.position(label_path) is not None
+
+    def rows(self, key):
+        """(k, 6) view of the rows for a label file (path or index)."""
+        i = key if isinstance(key, (int, np.integer)) else self.position(key)
+        return self.labels[self.offsets[i]:self.offsets[i + 1]]
+
+    def xywh(self, key):
+        """(k, 4) normalised xywh for a label file."""
+        return self.rows(key)[:, 2:6]
+
+    def classes(self, key):
+        return self.rows(key)[:, 1].astype(np.int64)
+
+    def xyxy(self, key, img_width, img_height):
+        """(k, 4) xyxy pixel boxes, the same as evaluate_detectors.read_yolo_boxes."""
+        xywh = self.xywh(key) * np.float32([img_width, img_height, img_width, img_height])
+        xyxy = np.empty_like(xywh)
+        xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        return xyxy
+
+    def counts(self):
+        """Boxes per label file."""
+        return np.diff(self.offsets)
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, labels=self.labels, offsets=self.offsets,
+                 files=np.asarray(self.files, dtype=str), signature=np.asarray(self.signature),
+                 dataset_dir=np.asarray(str(self.dataset_dir)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(str(data['dataset_dir']), data['files'].tolist(), data['labels'],
+                       data['offsets'], str(data['signature']))
+
+
+def pack_path(dataset_dir, cache_dir=LABEL_CACHE_DIR):
+    """Cache file for a dataset folder."""
+    resolved = str(Path(dataset_dir).resolve())
+    digest = hashlib.blake2b(resolved.encode(), digest_size=8).hexdigest()
+    name = Path(resolved).name.replace(" ", "_")
+    return os.path.join(cache_dir, f"{name}_{digest}.npz")
+
+
+def load_label_pack(dataset_dir, cache_dir=LABEL_CACHE_DIR, verbose=False):
+    """
+    Return the LabelPack for dataset_dir, rebuilding the cache file if any
+    label file changed since it was written. Packs are also memoised per
+    process and revalidated on every call.
+    """
+    label_files = list_label_files(dataset_dir)
+    signature = label_signature(dataset_dir, label_files)
+    path = pack_path(dataset_dir, cache_dir)
+
+    pack = _loaded_packs.get(path)
+    if pack is None and os.path.exists(path):
+        try:
+            pack = LabelPack.load(path)
+        except (OSError, ValueError, KeyError):
+            pack = None
+    if pack is not None and pack.signature == signature:
+        _loaded_packs[path] = pack
+        return pack
+
+    labels, offsets = parse_label_files(label_files)
+    files = [p.relative_to(dataset_dir).as_posix() for p in label_files]
+    pack = LabelPack(Path(dataset_dir).resolve(), files, labels, offsets, signature)
+    os.makedirs(cache_dir, exist_ok=True)
+    pack.save(path)
+    _loaded_packs[path] = pack
+    if verbose:
+        print(f"📦 Packed {len(files)} label files ({len(labels)} boxes) from {dataset_dir} -> {path}")
+    return pack
+
+
+def main():
+    for dataset_dir in DATASETS:
+        if not os.path.isdir(dataset_dir):
+            print(f"⚠️  {dataset_dir} not found")
+            continue
+        pack = load_label_pack(dataset_dir, verbose=True)
+        counts = pack.counts()
+        print(f"✅ {dataset_dir}: {len(pack)} files, {len(pack.labels)} boxes, "
+              f"{int((counts == 0).sum())} empty, max {int(counts.max()) if len(counts) else 0} per image")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,9 @@ import numpy as np
 from tqdm import tqdm
 from openpyxl import load_workbook
 from openpyxl.styles import Font
+from static_mask import load_camera_mask
+from frame_store import open_store, store_dir_for
+from stage_timer import TIMER, stage
 
 # ----------------------------
 # Parameters
@@ -24,16 +27,21 @@ THRESHOLD = 0.3
 TOP_PERCENT = 0.25
 BOTTOM_PERCENT = 0.20
 BATCH_SIZE = 1000
+USE_STATIC_MASK = True  # use ./masks/<camera>.png from static_mask.py when present
+USE_FRAME_STORE = True  # read pre-decoded ROIs from frame_store.py when built with the same crop
+FRAME_STORE_DIR = store_dir_for(TOP_PERCENT, BOTTOM_PERCENT)  # built by frame_store.py
 
 # ----------------------------
 # Setup
 # ----------------------------
 os.makedirs(OUTPUT_IMG_DIR, exist_ok=True)
+store = open_store(FRAME_STORE_DIR, TOP_PERCENT, BOTTOM_PERCENT) if USE_FRAME_STORE else None
 
 # Load image list
-df = pd.read_csv(OUTPUT_CSV)
-# get the first 5000 images marked as grey
-grey_images = df[df["grey"]]["image"].tolist()[:5000]
+with stage("list"):
+    df = pd.read_csv(OUTPUT_CSV)
+    # get the first 5000 images marked as grey
+    grey_images = df[df["grey"]]["image"].tolist()[:5000]
 
 #%%
 all_results = []
@@ -52,33 +60,50 @@ for batch_idx in range(num_batches):
     
     for i, img_name in enumerate(tqdm(batch_images, desc="Processing images", ncols=80)):
         img_path = os.path.join(IMAGE_DIR, img_name)
-        
-        # Load and convert
-        img = io.imread(img_path)
-        gray_img = color.rgb2gray(img)
-        height, width = gray_img.shape
 
-        # Crop ROI
-        top_cut = int(height * TOP_PERCENT)
-        bottom_cut = int(height * (1 - BOTTOM_PERCENT))
-        gray = gray_img[top_cut:bottom_cut, :]
+        # Crop ROI: learned water mask if built, else fixed bands
+        mask = load_camera_mask(img_name) if USE_STATIC_MASK else None
+        if mask is None and store is not None and img_name in store:
+            # Same fixed-band ROI, already decoded (memory map, no JPEG decode)
+            with stage("decode"):
+                gray = store.roi_float(img_name)
+        else:
+            # Load and convert
+            with stage("decode"):
+                img = io.imread(img_path)
+            with stage("color"):
+                gray_img = color.rgb2gray(img)
+            height, width = gray_img.shape
+
+            with stage("crop"):
+                if mask is not None:
+                    gray, roi_mask, _ = mask.crop(gray_img)
+                else:
+                    top_cut = int(height * TOP_PERCENT)
+                    bottom_cut = int(height * (1 - BOTTOM_PERCENT))
+                    gray = gray_img[top_cut:bottom_cut, :]
 
         # Detect blobs (boats)
-        blobs = blob_log(gray, min_sigma=MIN_SIGMA, max_sigma=MAX_SIGMA,
-                         num_sigma=NUM_SIGMA, threshold=THRESHOLD)
+        with stage("detect"):
+            blobs = blob_log(gray, min_sigma=MIN_SIGMA, max_sigma=MAX_SIGMA,
+                             num_sigma=NUM_SIGMA, threshold=THRESHOLD)
+        if mask is not None:
+            blobs = [b for b in blobs if roi_mask[int(b[0]), int(b[1])]]
         num_boats = len(blobs)
 
         # Create and save visualization
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.imshow(gray, cmap='gray')
-        for y, x, sigma in blobs:
-            c = plt.Circle((x, y), sigma * 1.5, color='red', linewidth=1.5, fill=False)
-            ax.add_patch(c)
-        ax.set_title(f"{img_name} — Boats: {num_boats}")
-        ax.axis('off')
+        with stage("render"):
+            fig, ax = plt.subplots(figsize=(6, 6))
+            ax.imshow(gray, cmap='gray')
+            for y, x, sigma in blobs:
+                c = plt.Circle((x, y), sigma * 1.5, color='red', linewidth=1.5, fill=False)
+                ax.add_patch(c)
+            ax.set_title(f"{img_name} — Boats: {num_boats}")
+            ax.axis('off')
 
         output_img_path = os.path.join(OUTPUT_IMG_DIR, f"{os.path.splitext(img_name)[0]}_detected.jpg")
-        plt.savefig(output_img_path, bbox_inches='tight', pad_inches=0)
+        with stage("write"):
+            plt.savefig(output_img_path, bbox_inches='tight', pad_inches=0)
         plt.close(fig)
 
         # Store data
@@ -96,8 +121,9 @@ for batch_idx in range(num_batches):
 # ----------------------------
 # Save to Excel
 # ----------------------------
-boat_counts_df = pd.DataFrame(all_results)
-boat_counts_df.to_excel(OUTPUT_XLSX, index=False)
+with stage("write"):
+    boat_counts_df = pd.DataFrame(all_results)
+    boat_counts_df.to_excel(OUTPUT_XLSX, index=False)
 
 # ----------------------------
 # Add clickable hyperlinks
@@ -124,6 +150,8 @@ wb.save(OUTPUT_XLSX)
 
 print(f"\n✅ Saved boat detections to {OUTPUT_XLSX}")
 print(f"✅ Saved output images to {OUTPUT_IMG_DIR}")
+print(TIMER.table())
+print(f"⏱  Stage timings: {TIMER.dump_json()}")
 
 
 
@@ -0,0 +1,251 @@
+#%%
+"""
+Single-pass THRESHOLD / sigma sweep for the LoG blob detector.
+
+blob_log builds a scale-space cube (one Laplacian-of-Gaussian per sigma),
+finds local maxima above THRESHOLD, then prunes overlapping blobs. Rerunning
+laplacian_gaussian.py per setting redoes the decode and every Gaussian
+filter each time. Here each image is decoded once, each distinct sigma's LoG
+response is computed once and shared by every sigma range that uses it, and
+local maxima are found once per range at the lowest threshold. Higher
+thresholds are just a filter on those peaks, because a peak's value doesn't
+depend on the threshold. Results match blob_log for every setting.
+
+Each setting is scored against the labelled datasets (count MAE, exact-count
+accuracy, precision/recall), using the same helpers as evaluate_detectors.py.
+
+The ROI crop is swept too (CROPS): detectors.py / gaussian_parallel.py cut
+20% off the top, laplacian_gaussian.py 25%, and the best threshold depends on
+it. With a static mask the mask replaces the crop and CROPS is ignored.
+
+Memory: one float64 response (float32 for frame-store frames) per distinct
+sigma is kept per image, so a 4K frame with many distinct sigmas can take a
+few GB. Use MAX_IMAGES / fewer distinct sigmas or a static mask (smaller ROI)
+on small machines.
+"""
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+from scipy import ndimage as ndi
+from skimage.feature import peak_local_max
+from tqdm import tqdm
+
+try:
+    # blob_log's own (private) pruning step, so results match it exactly
+    from skimage.feature.blob import _prune_blobs
+except ImportError as exc:
+    raise ImportError("log_sweep.py needs the private skimage.feature.blob._prune_blobs "
+                      "(tested with scikit-image 0.19 - 0.26); install one of those versions") from exc
+
+from detectors import BOTTOM_PERCENT, TOP_PERCENT, crop_roi, to_gray_float
+from frame_store import open_store, store_dir_for
+from label_pack import load_label_pack
+from evaluate_detectors import DATASETS, IOU_MATCH, collect_samples, match_detections, read_yolo_boxes
+from stage_timer import TIMER, stage
+
+# ----------------------------
+# Configuration
+# ----------------------------
+SIGMA_RANGES = [  # (min_sigma, max_sigma, num_sigma) as passed to blob_log
+    (2, 10, 5),
+    (2, 10, 9),
+    (1, 8, 8),
+    (3, 12, 4),
+]
+THRESHOLDS = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5]
+CROPS = [  # (top_percent, bottom_percent) ROI crops
+    (TOP_PERCENT, BOTTOM_PERCENT),  # detectors.py, gaussian_parallel.py
+    (0.25, 0.20),  # laplacian_gaussian.py
+]
+OVERLAP = 0.5
+MAX_IMAGES = None  # per dataset
+STATIC_MASK = None  # e.g. "./masks/AXISQ6074EPTZACCC8EACA584.png"
+USE_FRAME_STORE = True  # take CCSS frames from the frame_store.py store built with each crop
+OUTPUT_CSV = "./log_sweep.csv"
+
+
+class LoGScaleSpace:
+    """Lazily computed, memoised -LoG(sigma) * sigma^2 responses of one grey image."""
+
+    def __init__(self, gray):
+        self.gray = gray
+        self._responses = {}
+
+    def response(self, sigma):
+        key = float(sigma)
+        if key not in self._responses:
+            self._responses[key] = -ndi.gaussian_laplace(self.gray, key) * key ** 2
+        return self._responses[key]
+
+    def cube(self, sigma_list):
+        return np.stack([self.response(s) for s in sigma_list], axis=-1)
+
+
+def sweep_image(gray, sigma_ranges=SIGMA_RANGES, thresholds=THRESHOLDS, overlap=OVERLAP):
+    """
+    Return {(min_sigma, max_sigma, num_sigma, threshold): blobs} for one grey
+    ROI; blobs are (y, x, sigma) rows exactly as blob_log would return.
+    """
+    space = LoGScaleSpace(gray)
+    lowest = min(thresholds)
+    results = {}
+
+    for min_sigma, max_sigma, num_sigma in sigma_ranges:
+        sigma_list = np.linspace(min_sigma, max_sigma, num_sigma)
+        cube = space.cube(sigma_list)
+        peaks = peak_local_max(cube, threshold_abs=lowest, exclude_border=False,
+                               footprint=np.ones((3, 3, 3)))
+
+        if peaks.size == 0:
+            for threshold in thresholds:
+                results[(min_sigma, max_sigma, num_sigma, threshold)] = np.empty((0, 3))
+            continue
+
+        values = cube[tuple(peaks.T)]
+        lm = np.hstack([peaks[:, :-1].astype(float), sigma_list[peaks[:, -1]][:, None]])
+        for threshold in thresholds:
+            keep = values > threshold
+            blobs = _prune_blobs(lm[keep], overlap, sigma_dim=1) if keep.any() else np.empty((0, 3))
+            results[(min_sigma, max_sigma, num_sigma, threshold)] = blobs
+
+    return results
+
+
+def blobs_to_xyxy(blobs, offset):
+    """(y, x, sigma) ROI blobs -> (N, 4) frame xyxy, same radius as detectors.detect_log_blobs."""
+    if len(blobs) == 0:
+        return np.zeros((0, 4), dtype=np.float32)
+    x0, y0 = offset
+    y = blobs[:, 0] + y0
+    x = blobs[:, 1] + x0
+    r = blobs[:, 2] * 1.5
+    return np.stack([x - r, y - r, x + r, y + r], axis=1).astype(np.float32)
+
+
+def sweep_crops(image_path, crops=CROPS, mask=None, sigma_ranges=SIGMA_RANGES, thresholds=THRESHOLDS,
+                overlap=OVERLAP, stores=()):
+    """
+    Return ({(top_percent, bottom_percent, *sweep_image setting): (blobs, offset)}, (height, width))
+    for one frame, or (None, None) if it can't be read. The frame is decoded at
+    most once; a crop one of stores (frame_store.FrameStore) was built with is
+    read from that store instead.
+    With a mask, crops is ignored and the crop key is (None, None).
+    """
+    if mask is not None:
+        crops = [(None, None)]
+    gray_img = None
+    results, shape = {}, None
+    for top_percent, bottom_percent in crops:
+        name = image_path.name
+        store = next((s for s in stores if s.matches(top_percent, bottom_percent)), None)
+        if mask is None and store is not None and name in store:
+            with stage("decode"):
+                gray, offset = store.roi_float(name), store.offset(name)
+            shape = store.source_shape(name)
+        else:
+            if gray_img is None:
+                with stage("decode"):
+                    img = cv2.imread(str(image_path))
+                if img is None:
+                    return None, None
+                with stage("color"):
+                    gray_img = to_gray_float(img)
+            with stage("crop"):
+                gray, offset = crop_roi(gray_img, top_percent, bottom_percent, mask)
+            shape = gray_img.shape[:2]
+        with stage("detect"):
+            per_setting = sweep_image(gray, sigma_ranges, thresholds, overlap)
+        for setting, blobs in per_setting.items():
+            results[(top_percent, bottom_percent) + setting] = (blobs, offset)
+    return results, shape
+
+
+def run_sweep(samples, mask=None, sigma_ranges=SIGMA_RANGES, thresholds=THRESHOLDS, overlap=OVERLAP, stores=(),
+              packs=(), crops=CROPS):
+    """
+    Sweep every crop and setting over (label_path, image_path) samples;
+    returns a per-setting DataFrame. Frames found in the store of stores
+    built with a crop are read from it instead of being decoded, and ground
+    truth from the label_pack.LabelPack in packs that holds the label file.
+    """
+    totals = {}
+    elapsed = 0.0
+
+    for label_path, image_path in tqdm(samples, desc="Sweeping", ncols=80):
+        start = time.perf_counter()
+        per_setting, shape = sweep_crops(image_path, crops, mask, sigma_ranges, thresholds, overlap, stores)
+        elapsed += time.perf_counter() - start
+        if per_setting is None:
+            continue
+        height, width = shape
+
+        pack = next((p for p in packs if label_path in p), None)
+        gt = read_yolo_boxes(label_path, width, height, pack)
+        for setting, (blobs, offset) in per_setting.items():
+            pred = blobs_to_xyxy(blobs, offset)
+            if mask is not None and len(pred):
+                pred = pred[[mask.contains({'xyxy': b}, height, width) for b in pred]]
+            tp = match_detections(pred, np.ones(len(pred), dtype=np.float32), gt, IOU_MATCH)
+
+            t = totals.setdefault(setting, {'images': 0, 'abs_err': 0, 'exact': 0, 'pred': 0, 'gt': 0, 'tp': 0})
+            t['images'] += 1
+            t['abs_err'] += abs(len(pred) - len(gt))
+            t['exact'] += int(len(pred) == len(gt))
+            t['pred'] += len(pred)
+            t['gt'] += len(gt)
+            t['tp'] += int(tp.sum())
+
+    rows = []
+    for (top_percent, bottom_percent, min_sigma, max_sigma, num_sigma, threshold), t in totals.items():
+        rows.append({
+            'top_percent': top_percent, 'bottom_percent': bottom_percent,
+            'min_sigma': min_sigma, 'max_sigma': max_sigma, 'num_sigma': num_sigma, 'threshold': threshold,
+            'images': t['images'],
+            'pred_boats': t['pred'],
+            'gt_boats': t['gt'],
+            'count_mae': t['abs_err'] / t['images'],
+            'exact_count_acc': t['exact'] / t['images'],
+            'precision': t['tp'] / t['pred'] if t['pred'] else float('nan'),
+            'recall': t['tp'] / t['gt'] if t['gt'] else float('nan'),
+        })
+    n_images = max((t['images'] for t in totals.values()), default=0)
+    if n_images:
+        print(f"⏱  {len(totals)} settings over {n_images} images in {elapsed:.1f}s "
+              f"({elapsed / n_images:.2f}s per image for all settings)")
+    return pd.DataFrame(rows)
+
+
+def main():
+    from static_mask import load_mask
+
+    mask = load_mask(STATIC_MASK) if STATIC_MASK else None
+    stores = [open_store(store_dir_for(*crop), *crop) for crop in CROPS] if USE_FRAME_STORE else []
+    stores = [s for s in stores if s is not None]
+    samples, packs = [], []
+    with stage("list"):
+        for dataset_dir in DATASETS:
+            dataset_samples, _ = collect_samples(dataset_dir, max_images=MAX_IMAGES)
+            samples.extend(dataset_samples)
+            if dataset_samples:
+                packs.append(load_label_pack(dataset_dir))
+    if not samples:
+        print("No labelled images with matching image files found.")
+        return
+
+    results = run_sweep(samples, mask, stores=stores, packs=packs).sort_values(['count_mae', 'exact_count_acc'], ascending=[True, False])
+    with stage("write"):
+        results.to_csv(OUTPUT_CSV, index=False)
+
+    print("\n" + "=" * 60)
+    with pd.option_context('display.width', 160, 'display.float_format', '{:.3f}'.format):
+        print(results.head(15).to_string(index=False))
+    print("=" * 60)
+    print(f"✅ Saved {len(results)} settings to {OUTPUT_CSV}")
+    print(TIMER.table())
+    print(f"⏱  Stage timings: {TIMER.dump_json()}")
+
+
+if __name__ == "__main__":
+    main()
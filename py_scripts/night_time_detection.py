@@ -3,6 +3,8 @@ import random
 import pandas as pd
 from PIL import Image
 import matplotlib.pyplot as plt
+from static_mask import load_camera_mask
+from stage_timer import TIMER, stage
 
 # ----------------------------
 # Configuration
@@ -10,7 +12,8 @@ import matplotlib.pyplot as plt
 IMAGE_DIR = "./images/CCSS/"
 CSV_FILE = "image_segmentation.csv"
 OUTPUT_DIR = "./cropped_night_images"
-TOP_CROP_RATIO = 0.2  # remove top 20%
+TOP_CROP_RATIO = 0.2  # remove top 20% (when no learned mask exists)
+USE_STATIC_MASK = True  # crop to the water mask bounding box from static_mask.py when present
 N_SAMPLES = 50
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -18,15 +21,16 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # ----------------------------
 # Load CSV and filter to night
 # ----------------------------
-df = pd.read_csv(CSV_FILE)
-night_df = df[df["segment"] == "night"]
+with stage("list"):
+    df = pd.read_csv(CSV_FILE)
+    night_df = df[df["segment"] == "night"]
 
-# Get all images
-all_images = [os.path.join(IMAGE_DIR, f) for f in os.listdir(IMAGE_DIR)
-              if f.lower().endswith(".jpg")]
+    # Get all images
+    all_images = [os.path.join(IMAGE_DIR, f) for f in os.listdir(IMAGE_DIR)
+                  if f.lower().endswith(".jpg")]
 
-# Keep only images that appear in the CSV night list
-night_images = [img for img in all_images if os.path.basename(img) in night_df["image"].values]
+    # Keep only images that appear in the CSV night list
+    night_images = [img for img in all_images if os.path.basename(img) in night_df["image"].values]
 
 # Randomly sample 50 images (or fewer if not enough)
 random.seed(42)
@@ -38,12 +42,21 @@ print(f"Selected {len(night_subset)} night images for cropping.")
 # Crop top portion of image
 # ----------------------------
 def crop_top(img_path, top_ratio=0.2, save_path=None):
-    img = Image.open(img_path)
+    with stage("decode"):
+        img = Image.open(img_path)
+        img.load()  # PIL decodes lazily; do it here so crop() isn't charged for it
     width, height = img.size
-    top = int(height * top_ratio)
-    cropped = img.crop((0, top, width, height))  # (left, upper, right, lower)
+    mask = load_camera_mask(img_path) if USE_STATIC_MASK else None
+    with stage("crop"):
+        if mask is not None:
+            _, box = mask.for_shape(height, width)  # (left, upper, right, lower)
+            cropped = img.crop(box)
+        else:
+            top = int(height * top_ratio)
+            cropped = img.crop((0, top, width, height))  # (left, upper, right, lower)
     if save_path:
-        cropped.save(save_path)
+        with stage("write"):
+            cropped.save(save_path)
     return cropped
 
 # ----------------------------
@@ -57,6 +70,8 @@ for img_path in night_subset:
     cropped_images[os.path.basename(img_path)] = cropped
 
 print(f"Cropped {len(cropped_images)} images saved to: {OUTPUT_DIR}")
+print(TIMER.table())
+print(f"⏱  Stage timings: {TIMER.dump_json()}")
 
 # ----------------------------
 # Display first cropped image
@@ -0,0 +1,303 @@
+#%%
+"""
+Bulk, resumable pseudo-label export for the unsupervised 70k run.
+
+In the notebook every worker thread writes its own label file from inside
+detect_boats_yolo, and COCO output means one growing in-memory list dumped
+as a single JSON at the end. Here workers only submit() their detections.
+A single writer thread drains the queue and, every BATCH_SIZE images (or
+FLUSH_INTERVAL seconds when idle):
+- writes the YOLO .txt / VOC .xml files of the batch in one pass,
+- appends one JSON line per image to a journal (journal-<shard>.jsonl),
+  then flushes and fsyncs it.
+
+The journal is the record of what is finished. On restart, images already
+in any journal are reported by is_done() and skipped, and label files of a
+batch that crashed before its journal write are simply rewritten. COCO is
+never held in memory: write_coco_json() streams annotations.json from the
+journals one line at a time (annotation ids follow the notebook,
+image_id * 1000 + idx). Several processes can export into the same folder
+as long as each uses its own shard name.
+
+File formats match export_yolo_format / export_coco_format /
+export_voc_format in YOLOv11_unsupervised_70k.ipynb.
+"""
+import glob
+import json
+import os
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from stage_timer import stage
+
+# ----------------------------
+# Configuration
+# ----------------------------
+OUTPUT_FOLDER = "./annotated_boats"
+FORMATS = ('yolo',)  # any of 'yolo', 'coco', 'voc'
+BATCH_SIZE = 256  # images per bulk write
+FLUSH_INTERVAL = 2.0  # seconds; flush a partial batch when no new work arrives
+MAX_QUEUE = 1024  # submit() blocks once this many images are waiting
+
+JOURNAL_PATTERN = "journal-*.jsonl"
+_STOP = object()
+
+
+# ----------------------------
+# Formats
+# ----------------------------
+def yolo_lines(boxes, width, height):
+    """YOLO format: class x_center y_center width height (normalized)"""
+    lines = []
+    for x1, y1, x2, y2, _ in boxes:
+        x_center = ((x1 + x2) / 2) / width
+        y_center = ((y1 + y2) / 2) / height
+        box_width = (x2 - x1) / width
+        box_height = (y2 - y1) / height
+        lines.append(f"0 {x_center:.6f} {y_center:.6f} {box_width:.6f} {box_height:.6f}\n")
+    return "".join(lines)
+
+
+def voc_tree(file_name, boxes, width, height):
+    """Pascal VOC annotation for one image"""
+    root = ET.Element('annotation')
+    ET.SubElement(root, 'filename').text = file_name
+
+    size = ET.SubElement(root, 'size')
+    ET.SubElement(size, 'width').text = str(width)
+    ET.SubElement(size, 'height').text = str(height)
+    ET.SubElement(size, 'depth').text = '3'
+
+    for x1, y1, x2, y2, _ in boxes:
+        obj = ET.SubElement(root, 'object')
+        ET.SubElement(obj, 'name').text = 'boat'
+
+        bndbox = ET.SubElement(obj, 'bndbox')
+        ET.SubElement(bndbox, 'xmin').text = str(int(x1))
+        ET.SubElement(bndbox, 'ymin').text = str(int(y1))
+        ET.SubElement(bndbox, 'xmax').text = str(int(x2))
+        ET.SubElement(bndbox, 'ymax').text = str(int(y2))
+    return ET.ElementTree(root)
+
+
+def coco_annotations(boxes, image_id):
+    """COCO annotations for one image, same ids and fields as the notebook"""
+    annotations = []
+    for idx, (x1, y1, x2, y2, conf) in enumerate(boxes):
+        annotations.append({
+            'id': image_id * 1000 + idx,
+            'image_id': image_id,
+            'category_id': 1,
+            'bbox': [float(x1), float(y1), float(x2 - x1), float(y2 - y1)],
+            'area': float((x2 - x1) * (y2 - y1)),
+            'iscrowd': 0,
+            'score': conf,
+        })
+    return annotations
+
+
+# ----------------------------
+# Journal
+# ----------------------------
+def read_journal(path):
+    """Yield records from a journal, ignoring a torn last line from a crash."""
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def repair_journal(path):
+    """Cut a torn last line (crash mid-write) so new records start on a fresh line."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def journal_paths(output_folder):
+    return sorted(glob.glob(os.path.join(output_folder, JOURNAL_PATTERN)))
+
+
+def write_coco_json(output_folder=OUTPUT_FOLDER, json_path=None):
+    """
+    Stream annotations.json from every journal in output_folder.
+
+    Memory use is one record plus the set of file names (for de-duplication
+    across shards). Image ids are assigned in journal order.
+    Returns (json_path, n_images, n_annotations).
+    """
+    json_path = json_path or os.path.join(output_folder, 'annotations.json')
+    tmp_path = f"{json_path}.tmp"
+    seen = set()
+    n_images = n_annotations = 0
+
+    with open(tmp_path, 'w') as out:
+        out.write('{"images": [')
+        for path in journal_paths(output_folder):
+            for record in read_journal(path):
+                if record['file_name'] in seen:
+                    continue
+                seen.add(record['file_name'])
+                image = {'id': n_images, 'file_name': record['file_name'],
+                         'width': record['width'], 'height': record['height']}
+                out.write((", " if n_images else "") + json.dumps(image))
+                n_images += 1
+
+        # Second pass for annotations so the file never needs both arrays in memory
+        out.write('], "annotations": [')
+        seen.clear()
+        image_id = 0
+        for path in journal_paths(output_folder):
+            for record in read_journal(path):
+                if record['file_name'] in seen:
+                    continue
+                seen.add(record['file_name'])
+                for annotation in coco_annotations(record['boxes'], image_id):
+                    out.write((", " if n_annotations else "") + json.dumps(annotation))
+                    n_annotations += 1
+                image_id += 1
+        out.write('], "categories": [{"id": 1, "name": "boat"}]}')
+
+    os.replace(tmp_path, json_path)
+    return json_path, n_images, n_annotations
+
+
+# ----------------------------
+# Exporter
+# ----------------------------
+class PseudoLabelExporter:
+    """
+    Collect detections from any number of threads and write them in bulk.
+
+    Usage:
+        with PseudoLabelExporter("./annotated_boats", formats=('yolo', 'coco')) as exporter:
+            for name in files:
+                if exporter.is_done(name):
+                    continue
+                ...
+                exporter.submit(name, width, height, boxes)
+    """
+
+    def __init__(self, output_folder=OUTPUT_FOLDER, formats=FORMATS, shard="0", batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        unknown = set(formats) - {'yolo', 'coco', 'voc'}
+        if unknown:
+            raise ValueError(f"Unknown export formats {sorted(unknown)}, expected 'yolo', 'coco' or 'voc'")
+        self.output_folder = Path(output_folder)
+        self.formats = tuple(formats)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.labels_folder = self.output_folder / 'labels'
+        self.labels_folder.mkdir(parents=True, exist_ok=True)
+
+        # Everything already journalled by any shard counts as done: file name -> boxes
+        self._done = {}
+        for path in journal_paths(self.output_folder):
+            self._done.update((record['file_name'], len(record['boxes'])) for record in read_journal(path))
+        self.resumed = len(self._done)
+
+        journal_path = self.output_folder / f"journal-{shard}.jsonl"
+        repair_journal(journal_path)
+        self._journal = open(journal_path, 'a')
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._closed = False
+        self.stats = {'images': 0, 'boxes': 0, 'batches': 0}
+        self._thread = threading.Thread(target=self._run, name="label-export", daemon=True)
+        self._thread.start()
+
+    def is_done(self, file_name):
+        """
+        True if file_name was exported by this or an earlier (resumed) run.
+        Like submit(), only the base name counts, so object keys work too.
+        """
+        return os.path.basename(file_name) in self._done
+
+    def boat_count(self, file_name):
+        """Number of boxes exported for a done file."""
+        return self._done[os.path.basename(file_name)]
+
+    def submit(self, file_name, width, height, boxes):
+        """Queue one image's detections ({'xyxy': [...], 'conf': ...} dicts) for export."""
+        if self._error is not None:
+            raise RuntimeError("pseudo-label writer failed") from self._error
+        if self._closed:
+            raise RuntimeError("PseudoLabelExporter is closed")
+        rows = [[*map(float, box['xyxy']), float(box['conf'])] for box in boxes]
+        self._queue.put({'file_name': os.path.basename(file_name), 'width': int(width),
+                         'height': int(height), 'boxes': rows})
+
+    def close(self):
+        """Write everything queued, stop the writer, and build annotations.json for COCO."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._journal.close()
+        if self._error is not None:
+            raise RuntimeError("pseudo-label writer failed") from self._error
+        if 'coco' in self.formats:
+            write_coco_json(self.output_folder)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write_safely(batch)
+                return
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= self.batch_size):
+                self._write_safely(batch)
+                batch = []
+
+    def _write_safely(self, batch):
+        if not batch or self._error is not None:
+            return
+        try:
+            self._write_batch(batch)
+        except Exception as e:
+            self._error = e
+
+    def _write_batch(self, batch):
+        """Label files first, then the journal, so a crash never journals a missing file."""
+        with stage("write"):
+            for record in batch:
+                stem = Path(record['file_name']).stem
+                if 'yolo' in self.formats:
+                    with open(self.labels_folder / f"{stem}.txt", 'w') as f:
+                        f.write(yolo_lines(record['boxes'], record['width'], record['height']))
+                if 'voc' in self.formats:
+                    voc_tree(record['file_name'], record['boxes'], record['width'], record['height']).write(
+                        self.labels_folder / f"{stem}.xml")
+
+            self._journal.write("".join(json.dumps(record) + "\n" for record in batch))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+        for record in batch:
+            self._done[record['file_name']] = len(record['boxes'])
+            self.stats['boxes'] += len(record['boxes'])
+        self.stats['images'] += len(batch)
+        self.stats['batches'] += 1
@@ -0,0 +1,268 @@
+#%%
+"""
+Concurrent object-store ingest for the 70k-image pipeline.
+
+Replaces the notebook's head_object + download_file + temp folder + rmtree
+per frame with one pooled get_object per frame, read straight into memory
+and decoded with cv2.imdecode. Downloads run on a thread pool with a bounded
+number of objects in flight; decoded frames are handed to the detector on
+the calling thread, so the model is only ever used from one thread.
+
+Any client with the boto3 get_object(Bucket=, Key=) signature works:
+- make_s3_client() for S3 or an S3-compatible endpoint (MinIO, moto server)
+- LocalObjectStore for a plain folder laid out as <root>/<bucket>/<key>
+"""
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from stage_timer import TIMER, stage
+
+# ----------------------------
+# Configuration
+# ----------------------------
+CSV_PATH = "image_segmentation_grey.csv"
+CSV_OUTPUT = "boat_detection_results.csv"
+BUCKET_NAME = ""
+FOLDER_PREFIX = ""
+ENDPOINT_URL = None  # e.g. "http://localhost:9000" for MinIO
+LOCAL_STORE_ROOT = None  # set to a folder to use LocalObjectStore instead of S3
+SEGMENT = 'day'
+MAX_WORKERS = 16  # concurrent downloads
+MAX_IN_FLIGHT = 64  # downloaded-but-not-yet-detected frames held in memory
+BACKEND = 'yolo'
+BACKEND_PARAMS = {'weights': 'yolo11m.pt', 'imgsz': 1920}
+EXPORT_FOLDER = None  # e.g. "./annotated_boats" to write pseudo-labels (pseudo_label_export.py)
+EXPORT_FORMATS = ('yolo',)
+
+TIMESTAMP_PATTERN = r'_(\d{8}T\d{6}\.\d{3}Z)\.'
+
+
+# ----------------------------
+# Clients
+# ----------------------------
+def make_s3_client(endpoint_url=ENDPOINT_URL, max_pool_connections=MAX_WORKERS, **client_kwargs):
+    """boto3 S3 client with a connection pool sized for the download threads."""
+    import boto3
+    from botocore.config import Config
+
+    config = Config(max_pool_connections=max_pool_connections,
+                    retries={'max_attempts': 5, 'mode': 'adaptive'})
+    return boto3.client('s3', endpoint_url=endpoint_url, config=config, **client_kwargs)
+
+
+class LocalObjectStore:
+    """Filesystem-backed fake of the S3 client: objects live at <root>/<bucket>/<key>."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def get_object(self, Bucket, Key):
+        path = self.root / Bucket / Key
+        with open(path, 'rb') as f:
+            data = f.read()
+        return {'Body': _BytesBody(data), 'ContentLength': len(data)}
+
+    def put_object(self, Bucket, Key, Body):
+        path = self.root / Bucket / Key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(Body)
+        return {}
+
+
+class _BytesBody:
+    """Minimal StreamingBody stand-in (read() only)."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def read(self, *args):
+        return self._data
+
+
+# ----------------------------
+# Fetch + decode
+# ----------------------------
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    """Decode encoded image bytes to a BGR array (None if undecodable)."""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+
+def fetch_image(client, bucket, key):
+    """One round trip: get_object -> bytes -> decoded image."""
+    with stage("fetch"):
+        data = client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    with stage("decode"):
+        img = decode_image(data)
+    if img is None:
+        raise ValueError(f"could not decode {key} ({len(data)} bytes)")
+    return img
+
+
+def iter_images(client, bucket, keys, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Yield (key, image, error) as downloads complete.
+
+    At most max_in_flight objects are requested or held at once, so memory
+    stays bounded no matter how long keys is. image is None when error is set.
+    """
+    keys = iter(keys)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def submit_next():
+            key = next(keys, None)
+            if key is None:
+                return False
+            pending[executor.submit(fetch_image, client, bucket, key)] = key
+            return True
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    yield key, future.result(), None
+                except Exception as e:
+                    yield key, None, e
+                submit_next()
+
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+def parse_timestamp_from_filename(filename):
+    """AXIS..._20230901T210530.000Z.jpg -> '2023-09-01 21:05:30'"""
+    match = re.search(TIMESTAMP_PATTERN, filename)
+    if not match:
+        return None
+    dt = datetime.strptime(match.group(1), '%Y%m%dT%H%M%S.%fZ')
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def result_row(file_name, segment, boat_count):
+    """One row of the output csv."""
+    return {
+        'filename': file_name,
+        'timestamp': parse_timestamp_from_filename(file_name),
+        'segment': segment,
+        'boat_count': boat_count,
+    }
+
+
+def run_ingest(client, bucket, folder_prefix, file_list, detect, segment=SEGMENT,
+               max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT, exporter=None):
+    """
+    Fetch every file concurrently and run detect(img) on each as it arrives.
+
+    With a pseudo_label_export.PseudoLabelExporter, files it has already
+    exported are skipped (resume) and every new result is submitted to it.
+    Skipped files still get their row, with the boat count from the
+    exporter's journal, so the results cover the whole file list.
+
+    Returns:
+        (results, failed_files) where results are dicts with
+        filename / timestamp / segment / boat_count
+    """
+    results = []
+    if exporter is not None:
+        todo = []
+        for name in file_list:
+            if exporter.is_done(name):
+                results.append(result_row(name, segment, exporter.boat_count(name)))
+            else:
+                todo.append(name)
+        if len(todo) < len(file_list):
+            print(f"⏭  {len(file_list) - len(todo)} files already exported, resuming with {len(todo)}")
+        file_list = todo
+
+    keys = (f"{folder_prefix}{name}" for name in file_list)
+    resumed = len(results)
+    failed_files = []
+    start = time.perf_counter()
+
+    for key, img, error in tqdm(iter_images(client, bucket, keys, max_workers, max_in_flight),
+                                total=len(file_list), desc="Processing images", unit="img"):
+        file_name = key[len(folder_prefix):]
+        if error is not None:
+            print(f"\n✗ Failed {file_name}: {error}")
+            failed_files.append(file_name)
+            continue
+
+        with stage("detect_total"):
+            boxes = detect(img)
+        if exporter is not None:
+            exporter.submit(file_name, img.shape[1], img.shape[0], boxes)
+        results.append(result_row(file_name, segment, len(boxes)))
+
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        processed = len(results) - resumed
+        print(f"⏱  {processed} images in {elapsed:.1f}s ({processed / elapsed:.1f} img/s)")
+    return results, failed_files
+
+
+def load_file_list(csv_path, segment_col='segment', segment_val=SEGMENT):
+    """Filenames from the segmentation csv, filtered to one segment if the column exists."""
+    df = pd.read_csv(csv_path)
+    name_col = next((c for c in ('filename', 'image', 'image_name', 'file') if c in df.columns), df.columns[0])
+    if segment_col in df.columns:
+        df = df[df[segment_col] == segment_val]
+    return df[name_col].tolist()
+
+
+def main():
+    from detectors import get_backend
+
+    if LOCAL_STORE_ROOT:
+        client = LocalObjectStore(LOCAL_STORE_ROOT)
+        print(f"✓ Using local object store at {LOCAL_STORE_ROOT}")
+    else:
+        client = make_s3_client()
+        print("✓ S3 client initialized")
+
+    detect = get_backend(BACKEND, **BACKEND_PARAMS)
+    with stage("list"):
+        file_list = load_file_list(CSV_PATH)
+    if not file_list:
+        print("❌ No files to process!")
+        return
+
+    print(f"\n📋 Processing {len(file_list)} images with {MAX_WORKERS} download workers")
+    if EXPORT_FOLDER:
+        from pseudo_label_export import PseudoLabelExporter
+
+        with PseudoLabelExporter(EXPORT_FOLDER, formats=EXPORT_FORMATS) as exporter:
+            results, failed_files = run_ingest(client, BUCKET_NAME, FOLDER_PREFIX, file_list, detect,
+                                               exporter=exporter)
+        print(f"🏷  Pseudo-labels for {exporter.stats['images']} images in {EXPORT_FOLDER}")
+    else:
+        results, failed_files = run_ingest(client, BUCKET_NAME, FOLDER_PREFIX, file_list, detect)
+
+    with stage("write"):
+        # Resumed files are in results too (from the export journal), so the csv is rewritten whole
+        df = pd.DataFrame(results)
+        df.to_csv(CSV_OUTPUT, index=False)
+    print(f"📄 Output CSV: {CSV_OUTPUT}")
+    print(f"⏱  Stage timings: {TIMER.dump_json()}")
+    print(f"✓ Successful: {len(results)}")
+    print(f"✗ Failed: {len(failed_files)}")
+    for f in failed_files[:10]:
+        print(f"   - {f}")
+    if len(failed_files) > 10:
+        print(f"   ... and {len(failed_files) - 10} more")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#%%
+"""
+Per-stage timers and counters shared by the pipelines.
+
+Usage, from any script or module:
+
+    from stage_timer import TIMER, stage
+
+    with stage("decode"):
+        img = cv2.imread(path)
+    ...
+    TIMER.dump_json()   # ./timings/<script>_<start time>.json
+
+Stage names used across the repo: list, decode, color, crop, detect, nms,
+render, write (plus fetch / hash / preprocess / detect_total where relevant).
+Every stage keeps count / total / min / max, a fixed log-spaced histogram
+(so runs and worker processes can be merged exactly) and a window of the
+most recent durations for live percentiles (the Gradio Analytics panel).
+
+Worker processes each have their own TIMER. Return drain() alongside a
+result and TIMER.merge() it in the parent (see gaussian_parallel.py). Use
+the module-level drain() rather than TIMER.drain() in task functions:
+joblib pickles functions defined in __main__ by value, together with the
+globals they use, so a TIMER referenced there is a copy of the parent's.
+
+Profiling: wrap a run in profiled() and set STAGE_PROFILE=out.prof to get a
+cProfile dump (pstats / snakeviz). py-spy needs no hook, e.g.
+`py-spy record -o profile.svg -- python gaussian_parallel.py`. The stage
+blocks are plain Python frames, so they show up in its flame graph.
+"""
+import bisect
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# ----------------------------
+# Configuration
+# ----------------------------
+TIMINGS_DIR = "./timings/"
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+RECENT = 512  # durations kept per stage for live percentiles
+
+
+def _bucket_labels():
+    labels = [f"<={b:g}" for b in BUCKETS_MS]
+    return labels + [f">{BUCKETS_MS[-1]:g}"]
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class StageTimer:
+    """Thread-safe stage timings and counters for one run."""
+
+    def __init__(self, run_name=None, recent=RECENT):
+        self.run_name = run_name or os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "run"
+        self.started = time.time()
+        self.recent = recent
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def __getstate__(self):
+        # Locks don't pickle; each process gets its own
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = {'count': 0, 'total_s': 0.0, 'min_s': float('inf'), 'max_s': 0.0,
+                     'histogram': [0] * (len(BUCKETS_MS) + 1), 'recent': deque(maxlen=self.recent)}
+            self.stages[name] = stats
+        return stats
+
+    # ----------------------------
+    # Recording
+    # ----------------------------
+    def add(self, name, seconds):
+        """Record one duration for a stage."""
+        with self._lock:
+            stats = self._stats(name)
+            stats['count'] += 1
+            stats['total_s'] += seconds
+            stats['min_s'] = min(stats['min_s'], seconds)
+            stats['max_s'] = max(stats['max_s'], seconds)
+            stats['histogram'][bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+            stats['recent'].append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one call of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator form of stage()."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def incr(self, name, n=1):
+        """Bump a counter (frames, boxes, cache hits, ...)."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # ----------------------------
+    # Aggregation across processes
+    # ----------------------------
+    def export_state(self):
+        """Plain picklable snapshot of the stages and counters."""
+        with self._lock:
+            stages = {name: dict(s, histogram=list(s['histogram']), recent=list(s['recent']))
+                      for name, s in self.stages.items()}
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def drain(self):
+        """export_state() and reset, for workers handing their timings back per task."""
+        state = self.export_state()
+        self.reset()
+        return state
+
+    def merge(self, state):
+        """Add another timer's export_state() / drain() into this one."""
+        if not state:
+            return
+        with self._lock:
+            for name, other in state['stages'].items():
+                stats = self._stats(name)
+                stats['count'] += other['count']
+                stats['total_s'] += other['total_s']
+                stats['min_s'] = min(stats['min_s'], other['min_s'])
+                stats['max_s'] = max(stats['max_s'], other['max_s'])
+                stats['histogram'] = [a + b for a, b in zip(stats['histogram'], other['histogram'])]
+                stats['recent'].extend(other['recent'])
+            for name, n in state['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    # ----------------------------
+    # Reporting
+    # ----------------------------
+    def summary(self):
+        """Per-stage totals, mean / min / max / recent percentiles (ms) and histograms."""
+        labels = _bucket_labels()
+        with self._lock:
+            stages = {}
+            for name, s in self.stages.items():
+                recent = list(s['recent'])
+                p50, p90, p99 = (_percentile(recent, q) for q in (0.5, 0.9, 0.99))
+                stages[name] = {
+                    'count': s['count'],
+                    'total_s': round(s['total_s'], 6),
+                    'mean_ms': round(s['total_s'] / s['count'] * 1000, 3) if s['count'] else None,
+                    'min_ms': round(s['min_s'] * 1000, 3) if s['count'] else None,
+                    'max_ms': round(s['max_s'] * 1000, 3),
+                    'p50_ms': round(p50 * 1000, 3) if p50 is not None else None,
+                    'p90_ms': round(p90 * 1000, 3) if p90 is not None else None,
+                    'p99_ms': round(p99 * 1000, 3) if p99 is not None else None,
+                    'histogram_ms': dict(zip(labels, s['histogram'])),
+                }
+            counters = dict(self.counters)
+        return {
+            'run': self.run_name,
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'wall_s': round(time.time() - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+        }
+
+    def table(self):
+        """Markdown table of the stages, slowest total first."""
+        stages = self.summary()['stages']
+        if not stages:
+            return "No timings recorded yet."
+        lines = ["| stage | calls | total s | mean ms | p50 ms | p90 ms | max ms |",
+                 "|---|---:|---:|---:|---:|---:|---:|"]
+        for name, s in sorted(stages.items(), key=lambda kv: -kv[1]['total_s']):
+            lines.append(f"| {name} | {s['count']} | {s['total_s']:.2f} | {s['mean_ms']:.1f} | "
+                         f"{s['p50_ms']:.1f} | {s['p90_ms']:.1f} | {s['max_ms']:.1f} |")
+        return "\n".join(lines)
+
+    def dump_json(self, path=None, timings_dir=TIMINGS_DIR):
+        """Write summary() to path (default timings_dir/<run>_<start>.json) and return the path."""
+        if path is None:
+            os.makedirs(timings_dir, exist_ok=True)
+            stamp = datetime.fromtimestamp(self.started).strftime('%Y%m%dT%H%M%S')
+            path = os.path.join(timings_dir, f"{self.run_name}_{stamp}.json")
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+
+# Process-wide default timer used by the scripts and shared modules
+TIMER = StageTimer()
+
+
+def stage(name):
+    """TIMER.stage(name)"""
+    return TIMER.stage(name)
+
+
+def incr(name, n=1):
+    """TIMER.incr(name, n)"""
+    TIMER.incr(name, n)
+
+
+def drain():
+    """TIMER.drain() of the process this runs in"""
+    return TIMER.drain()
+
+
+@contextmanager
+def profiled(path=None):
+    """
+    cProfile the enclosed block and dump the stats to path (or $STAGE_PROFILE).
+    Does nothing when neither is set.
+    """
+    path = path or os.environ.get("STAGE_PROFILE")
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"🧪 cProfile stats written to {path}")
@@ -0,0 +1,246 @@
+#%%
+"""
+Learned per-camera water mask, replacing the fixed TOP_PERCENT / BOTTOM_PERCENT
+crops.
+
+Build step (run once per camera): downscale a sample of frames to MASK_WIDTH
+and accumulate two per-pixel statistics:
+- edge frequency: fraction of frames with a Canny edge at the pixel. Land,
+  piers, moorings and the shoreline have edges in the same place in almost
+  every frame; water ripples don't.
+- texture variability: temporal std of the local high-pass (frame minus its
+  blur). Water keeps changing between frames; sky, land and structures don't.
+
+water = rarely an edge AND textured over time, cleaned up with morphology,
+restricted to the largest connected regions and hole-filled (so a boat that
+was moored for the whole sample stays inside the mask). The result is
+stored as MASK_DIR/<camera>.png (white = water) so it can be inspected or
+touched up by hand.
+
+Detectors then process only the tight bounding box of the mask, with
+non-water pixels flattened, and drop detections whose centre is off-water.
+"""
+import os
+import random
+import re
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+# ----------------------------
+# Configuration
+# ----------------------------
+IMAGE_DIR = "../images/CCSS/"
+MASK_DIR = "./masks/"
+SEGMENT_CSV = "./image_segmentation.csv"  # build from daytime frames when available
+N_FRAMES = 400  # frames sampled to build a mask
+MASK_WIDTH = 480  # mask resolution; scaled to each frame at use
+EDGE_FREQ_MAX = 0.35  # pixels with edges in more frames than this are static structure
+TEXTURE_STD_MIN = 1.5  # min temporal std of the high-pass response for water
+MIN_REGION_FRACTION = 0.02  # drop water components smaller than this fraction of the frame
+MARGIN_PX = 4  # dilate the final mask (mask pixels) so boats at the edge aren't clipped
+MIN_WATER_FRACTION = 0.01  # masks with less water than this are failed builds, never used
+RANDOM_SEED = 42
+
+CAMERA_PATTERN = r'^(.*)_\d{8}T\d{6}'
+
+_loaded_masks = {}
+
+
+def camera_id(filename):
+    """AXISQ6074EPTZACCC8EACA584_20230901T210530.000Z.jpg -> 'AXISQ6074EPTZACCC8EACA584'"""
+    name = os.path.basename(filename)
+    match = re.match(CAMERA_PATTERN, name)
+    return match.group(1) if match else os.path.splitext(name)[0]
+
+
+# ----------------------------
+# Build
+# ----------------------------
+def accumulate_statistics(image_paths, mask_width=MASK_WIDTH):
+    """Return (edge_frequency, texture_std, n_frames) over the given frames at mask_width."""
+    edge_count = tex_sum = tex_sq = None
+    n = 0
+    for path in tqdm(image_paths, desc="Accumulating", ncols=80):
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        scale = mask_width / img.shape[1]
+        small = cv2.resize(img, (mask_width, int(img.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        if edge_count is not None and small.shape != edge_count.shape:
+            continue  # different camera resolution / PTZ preset
+
+        edges = cv2.Canny(small, 50, 150) > 0
+        high_pass = np.abs(small.astype(np.float32) - cv2.GaussianBlur(small, (0, 0), 3).astype(np.float32))
+
+        if edge_count is None:
+            edge_count = np.zeros(small.shape, np.float32)
+            tex_sum = np.zeros(small.shape, np.float32)
+            tex_sq = np.zeros(small.shape, np.float32)
+        edge_count += edges
+        tex_sum += high_pass
+        tex_sq += high_pass * high_pass
+        n += 1
+
+    if n == 0:
+        return None, None, 0
+    tex_mean = tex_sum / n
+    texture_std = np.sqrt(np.maximum(tex_sq / n - tex_mean * tex_mean, 0))
+    return edge_count / n, texture_std, n
+
+
+def water_mask_from_statistics(edge_freq, texture_std, edge_freq_max=EDGE_FREQ_MAX,
+                               texture_std_min=TEXTURE_STD_MIN, min_region_fraction=MIN_REGION_FRACTION,
+                               margin_px=MARGIN_PX):
+    """Turn the per-pixel statistics into a cleaned uint8 water mask (255 = water)."""
+    water = ((edge_freq <= edge_freq_max) & (texture_std >= texture_std_min)).astype(np.uint8) * 255
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    water = cv2.morphologyEx(water, cv2.MORPH_OPEN, kernel)
+    water = cv2.morphologyEx(water, cv2.MORPH_CLOSE, kernel, iterations=2)
+
+    # Keep only sizeable regions
+    n_labels, labels, stats, _ = cv2.connectedComponentsWithStats(water, connectivity=8)
+    min_area = min_region_fraction * water.size
+    keep = np.zeros(n_labels, dtype=bool)
+    keep[1:] = stats[1:, cv2.CC_STAT_AREA] >= min_area
+    water = keep[labels].astype(np.uint8) * 255
+
+    # Fill holes (boats moored for the whole sample, buoys)
+    contours, _ = cv2.findContours(water, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    filled = np.zeros_like(water)
+    cv2.drawContours(filled, contours, -1, 255, thickness=cv2.FILLED)
+
+    if margin_px > 0:
+        filled = cv2.dilate(filled, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * margin_px + 1,) * 2))
+    return filled
+
+
+def select_frames(image_dir=IMAGE_DIR, segment_csv=SEGMENT_CSV, n_frames=N_FRAMES, seed=RANDOM_SEED):
+    """Group frames by camera and sample up to n_frames per camera, daytime only if the csv is there."""
+    files = [f for f in os.listdir(image_dir) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    if segment_csv and os.path.exists(segment_csv):
+        import pandas as pd
+        seg = pd.read_csv(segment_csv)
+        name_col = 'filename' if 'filename' in seg.columns else 'image'
+        day = set(seg.loc[seg['segment'] == 'day', name_col])
+        files = [f for f in files if f in day] or files
+
+    by_camera = {}
+    for f in sorted(files):
+        by_camera.setdefault(camera_id(f), []).append(os.path.join(image_dir, f))
+
+    rng = random.Random(seed)
+    return {cam: rng.sample(paths, min(n_frames, len(paths))) for cam, paths in by_camera.items()}
+
+
+def build_masks(image_dir=IMAGE_DIR, mask_dir=MASK_DIR):
+    os.makedirs(mask_dir, exist_ok=True)
+    for cam, paths in select_frames(image_dir).items():
+        edge_freq, texture_std, n = accumulate_statistics(paths)
+        if n == 0:
+            print(f"⚠️  {cam}: no readable frames")
+            continue
+        mask = water_mask_from_statistics(edge_freq, texture_std)
+        fraction = np.count_nonzero(mask) / mask.size
+        if fraction < MIN_WATER_FRACTION:
+            # An empty mask would make every masked detector drop every detection for this camera
+            print(f"⚠️  {cam}: only {fraction:.2%} of the frame looks like water in {n} frames, mask not saved "
+                  f"(check the frames, EDGE_FREQ_MAX and TEXTURE_STD_MIN)")
+            continue
+        out_path = os.path.join(mask_dir, f"{cam}.png")
+        cv2.imwrite(out_path, mask)
+
+        x, y, w, h = cv2.boundingRect(mask)
+        print(f"✅ {cam}: mask from {n} frames -> {out_path}")
+        print(f"   water {fraction:.1%} of frame, "
+              f"ROI {w * h / mask.size:.1%} of frame")
+
+
+# ----------------------------
+# Apply
+# ----------------------------
+class StaticMask:
+    """A water mask plus its tight bounding box, rescaled per frame size on demand."""
+
+    def __init__(self, mask):
+        self.mask = mask
+        self._by_shape = {}
+
+    @classmethod
+    def load(cls, path):
+        mask = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            raise FileNotFoundError(path)
+        return cls(mask)
+
+    @property
+    def water_fraction(self):
+        return np.count_nonzero(self.mask > 127) / self.mask.size
+
+    @property
+    def digest(self):
+        """Short content hash, for cache keys."""
+        import hashlib
+        return hashlib.blake2b(self.mask.tobytes(), digest_size=8).hexdigest()
+
+    def for_shape(self, height, width):
+        """Return (full-size bool mask, (x0, y0, x1, y1) bounding box) for a frame size."""
+        key = (height, width)
+        if key not in self._by_shape:
+            full = cv2.resize(self.mask, (width, height), interpolation=cv2.INTER_NEAREST) > 127
+            ys, xs = np.nonzero(full)
+            if len(xs) == 0:
+                bbox = (0, 0, width, height)
+            else:
+                bbox = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+            self._by_shape[key] = (full, bbox)
+        return self._by_shape[key]
+
+    def crop(self, img, fill=None):
+        """
+        Crop img to the mask's bounding box and flatten non-water pixels.
+
+        fill=None uses the median of the water pixels, which avoids creating
+        fake edges for LoG / threshold detectors at the mask border.
+
+        Returns:
+            (roi, roi_mask, (x0, y0)) - add (x0, y0) to ROI coordinates to get frame coordinates
+        """
+        full, (x0, y0, x1, y1) = self.for_shape(*img.shape[:2])
+        roi = img[y0:y1, x0:x1].copy()
+        roi_mask = full[y0:y1, x0:x1]
+        if fill is None:
+            fill = np.median(roi[roi_mask], axis=0) if roi_mask.any() else 0
+        roi[~roi_mask] = fill
+        return roi, roi_mask, (x0, y0)
+
+    def contains(self, box, height, width):
+        """True if the centre of an xyxy box (frame coordinates) is on water."""
+        full, _ = self.for_shape(height, width)
+        x1, y1, x2, y2 = box['xyxy']
+        cx = min(max(int((x1 + x2) / 2), 0), width - 1)
+        cy = min(max(int((y1 + y2) / 2), 0), height - 1)
+        return bool(full[cy, cx])
+
+
+def load_mask(path, min_water_fraction=MIN_WATER_FRACTION):
+    """StaticMask from a mask file, or None if it is (nearly) empty and would mask out everything."""
+    mask = StaticMask.load(path)
+    if mask.water_fraction < min_water_fraction:
+        print(f"⚠️  {path} marks only {mask.water_fraction:.2%} of the frame as water, ignoring it")
+        return None
+    return mask
+
+
+def load_camera_mask(filename, mask_dir=MASK_DIR):
+    """StaticMask for the camera a frame came from, or None if no usable mask was built."""
+    path = os.path.join(mask_dir, f"{camera_id(filename)}.png")
+    if path not in _loaded_masks:
+        _loaded_masks[path] = load_mask(path) if os.path.exists(path) else None
+    return _loaded_masks[path]
+
+
+if __name__ == "__main__":
+    build_masks()
@@ -0,0 +1,219 @@
+#%%
+"""
+Reproducible stratified sample of the detections store for manual review.
+
+Streams the detections (xlsx in read-only mode, or csv) once, keeps a
+seeded reservoir per stratum, and writes the review workbook in write-only
+mode. Memory and write cost scale with SAMPLE_SIZE x number of strata,
+not with the size of the archive.
+
+Read-only mode does not expose hyperlinks, so the "View Image" link is
+rebuilt from OUTPUT_IMG_DIR and the <stem>_detected.jpg naming used by
+gaussian_parallel.py.
+"""
+import csv
+import os
+import random
+import re
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# ----------------------------
+# Parameters
+# ----------------------------
+INPUT_FILE = "./boat_detections_parallel.xlsx"  # .xlsx or .csv
+OUTPUT_SAMPLE_XLSX = "./boat_detections_sample_stratified.xlsx"
+SEGMENT_CSV = "./image_segmentation.csv"  # only needed for STRATIFY_BY = "segment"
+OUTPUT_IMG_DIR = "./output_parallel/"
+SAMPLE_SIZE = 100
+RANDOM_SEED = 42
+STRATIFY_BY = "hour"  # 'segment', 'hour', 'boat_count' or None
+BOAT_COUNT_BINS = [0, 1, 2, 5, 10]  # lower edges; last bin is open ended
+
+TIMESTAMP_PATTERN = r'_\d{8}T(\d{2})\d{4}'
+LINK_FONT = Font(color="0000FF", underline="single")
+
+
+# ----------------------------
+# Streaming readers
+# ----------------------------
+def _named_columns(cells):
+    """(positions, names) of the header cells that have a name (skips e.g. a pandas index column)."""
+    named = [(i, h) for i, h in enumerate(cells) if h is not None and h != ""]
+    return [i for i, _ in named], [h for _, h in named]
+
+
+def iter_detection_rows(path):
+    """Yield (header, row_iterator) for an xlsx or csv detections file; unnamed columns are dropped."""
+    if path.lower().endswith(".csv"):
+        f = open(path, newline="")
+        reader = csv.reader(f)
+        positions, header = _named_columns(next(reader))
+
+        def rows():
+            with f:
+                for row in reader:
+                    yield [row[i] if i < len(row) else "" for i in positions]
+        return header, rows()
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb.active
+    row_iter = ws.iter_rows(values_only=True)
+    positions, header = _named_columns(next(row_iter))
+
+    def rows():
+        try:
+            for row in row_iter:
+                yield [row[i] if i < len(row) else None for i in positions]
+        finally:
+            wb.close()
+    return header, rows()
+
+
+def load_segments(csv_path):
+    """Return {image filename: segment} from the day/night segmentation csv."""
+    segments = {}
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f)
+        name_col = 'filename' if 'filename' in reader.fieldnames else 'image'
+        for row in reader:
+            segments[row[name_col]] = row.get('segment', '')
+    return segments
+
+
+# ----------------------------
+# Strata
+# ----------------------------
+def boat_count_bin(value, bins=BOAT_COUNT_BINS):
+    """Label a boat count with its bin, e.g. '2-4' or '10+'."""
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return "unknown"
+    for lo, hi in zip(bins, bins[1:]):
+        if lo <= count < hi:
+            return str(lo) if hi - lo == 1 else f"{lo}-{hi - 1}"
+    return f"{bins[-1]}+"
+
+
+def make_stratum_fn(stratify_by, header, segments=None):
+    """Return a function row -> stratum key for the chosen stratification."""
+    if stratify_by is None:
+        return lambda row: "all"
+
+    image_idx = header.index('image') if 'image' in header else header.index('filename')
+    if stratify_by == "hour":
+        def hour_of(row):
+            match = re.search(TIMESTAMP_PATTERN, str(row[image_idx]))
+            return f"{match.group(1)}h" if match else "unknown"
+        return hour_of
+    if stratify_by == "segment":
+        return lambda row: segments.get(row[image_idx], "unknown")
+    if stratify_by == "boat_count":
+        count_idx = header.index('boat_count')
+        return lambda row: boat_count_bin(row[count_idx])
+    raise ValueError(f"Unknown STRATIFY_BY '{stratify_by}'")
+
+
+# ----------------------------
+# Sampling
+# ----------------------------
+def stratified_reservoir_sample(rows, stratum_of, sample_size, seed=RANDOM_SEED):
+    """
+    Single pass proportional stratified sample.
+
+    Each stratum keeps a reservoir of up to sample_size rows (Algorithm R),
+    then the sample is allocated across strata in proportion to how many
+    rows each stratum had (largest remainder). Same input + seed gives the
+    same sample.
+
+    Returns:
+        (sampled rows sorted by original row index, {stratum: (seen, taken)})
+    """
+    rng = random.Random(seed)
+    reservoirs = {}
+    seen = {}
+
+    for i, row in enumerate(rows):
+        key = stratum_of(row)
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        reservoir = reservoirs.setdefault(key, [])
+        if n < sample_size:
+            reservoir.append((i, row))
+        else:
+            j = rng.randint(0, n)
+            if j < sample_size:
+                reservoir[j] = (i, row)
+
+    total = sum(seen.values())
+    if total == 0:
+        return [], {}
+    sample_size = min(sample_size, total)
+
+    quotas = {k: sample_size * n / total for k, n in seen.items()}
+    alloc = {k: int(q) for k, q in quotas.items()}
+    leftover = sample_size - sum(alloc.values())
+    for k in sorted(quotas, key=lambda k: (alloc[k] - quotas[k], str(k)))[:leftover]:
+        alloc[k] += 1
+
+    sampled = []
+    summary = {}
+    for key in sorted(reservoirs, key=str):
+        reservoir = reservoirs[key]
+        rng.shuffle(reservoir)
+        taken = reservoir[:alloc[key]]
+        sampled.extend(taken)
+        summary[key] = (seen[key], len(taken))
+
+    sampled.sort(key=lambda item: item[0])
+    return [row for _, row in sampled], summary
+
+
+# ----------------------------
+# Write-only output
+# ----------------------------
+def write_sample_workbook(header, rows, output_path, img_dir=OUTPUT_IMG_DIR, title="Sheet1_sample"):
+    """Write the sampled rows with clickable 'View Image' links in write-only mode."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+    ws.append(header)
+
+    link_idx = header.index('detected_image') if 'detected_image' in header else None
+    image_idx = header.index('image') if 'image' in header else None
+
+    for row in rows:
+        out = list(row)
+        if link_idx is not None:
+            target = out[link_idx]
+            if (not target or target == "View Image") and image_idx is not None:
+                stem = os.path.splitext(str(out[image_idx]))[0]
+                target = os.path.abspath(os.path.join(img_dir, f"{stem}_detected.jpg"))
+            if target:
+                cell = WriteOnlyCell(ws, value="View Image")
+                cell.hyperlink = target
+                cell.font = LINK_FONT
+                out[link_idx] = cell
+        ws.append(out)
+
+    wb.save(output_path)
+
+
+def main():
+    header, rows = iter_detection_rows(INPUT_FILE)
+    segments = load_segments(SEGMENT_CSV) if STRATIFY_BY == "segment" else None
+    stratum_of = make_stratum_fn(STRATIFY_BY, header, segments)
+
+    sample, summary = stratified_reservoir_sample(rows, stratum_of, SAMPLE_SIZE, RANDOM_SEED)
+    write_sample_workbook(header, sample, OUTPUT_SAMPLE_XLSX)
+
+    print(f"Stratified by: {STRATIFY_BY}")
+    for key, (n_seen, n_taken) in summary.items():
+        print(f"   {key}: {n_taken} / {n_seen}")
+    print(f"Saved sample of {len(sample)} rows to: {OUTPUT_SAMPLE_XLSX}")
+
+
+if __name__ == "__main__":
+    main()
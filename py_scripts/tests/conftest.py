@@ -0,0 +1,18 @@
+"""Shared setup for the py_scripts tests: modules are imported by bare name, as the scripts do."""
+import sys
+from pathlib import Path
+
+import pytest
+
+PY_SCRIPTS = Path(__file__).resolve().parents[1]
+REPO_ROOT = PY_SCRIPTS.parent
+DATA_DIR = REPO_ROOT / "data"
+
+sys.path.insert(0, str(PY_SCRIPTS))
+
+
+@pytest.fixture
+def data_dir():
+    if not DATA_DIR.is_dir():
+        pytest.skip("labeled datasets not checked out")
+    return DATA_DIR
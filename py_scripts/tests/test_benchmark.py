@@ -0,0 +1,67 @@
+import json
+import os
+import types
+
+import numpy as np
+import pytest
+
+import benchmark
+from benchmark import compare_results, patched, record, synthetic_frame, time_calls, write_frames
+
+
+def test_patched_restores_globals_even_on_error():
+    module = types.SimpleNamespace(A=1, B="x")
+    with pytest.raises(RuntimeError):
+        with patched(module, A=2, B="y"):
+            assert (module.A, module.B) == (2, "y")
+            raise RuntimeError
+    assert (module.A, module.B) == (1, "x")
+
+
+def test_synthetic_frames_are_deterministic():
+    day, day_boxes = synthetic_frame(108, 192, seed=3)
+    again, again_boxes = synthetic_frame(108, 192, seed=3)
+    assert np.array_equal(day, again) and day_boxes == again_boxes
+    assert not np.array_equal(day, synthetic_frame(108, 192, seed=4)[0])
+
+    night, boxes = synthetic_frame(108, 192, [[0.5, 0.5, 0.1, 0.1]], night=True)
+    assert night.shape == (108, 192, 3) and night.dtype == np.uint8
+    assert len(boxes) == 1 and night.mean() < day.mean()
+
+
+def test_process_single_leaves_gaussian_parallel_unchanged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import gaussian_parallel
+
+    settings = ('IMAGE_DIR', 'OUTPUT_IMG_DIR', 'USE_STATIC_MASK', 'USE_CACHE', 'cache')
+    before = {k: getattr(gaussian_parallel, k) for k in settings}
+    frame_dir, output_dir = tmp_path / "frames", tmp_path / "out"
+    frame_dir.mkdir()
+    output_dir.mkdir()
+    names = write_frames(str(frame_dir), 2, 0.1)
+
+    results = []
+    benchmark.bench_process_single(results, str(frame_dir), names, 0.1, str(output_dir))
+    assert results[0]['name'] == "process_single_image"
+    assert len(list(output_dir.iterdir())) == 2
+    assert {k: getattr(gaussian_parallel, k) for k in settings} == before
+    assert sorted(os.listdir(tmp_path)) == ["frames", "out"]  # no default cache / output folders
+
+
+def test_time_calls_and_record():
+    calls = []
+    durations = time_calls(calls.append, repeat=3, warmup=2)
+    assert calls == [0, 1, 0, 1, 2] and len(durations) == 3
+    result = record([], "noop", {'n': 1}, [0.001, 0.003, 0.002], items=10)
+    assert result['median_ms'] == 2.0 and result['items_per_s'] == 5000.0
+
+
+def test_compare_results_flags_slowdowns(tmp_path):
+    def save(name, median):
+        path = tmp_path / name
+        path.write_text(json.dumps({'results': [{'name': 'x', 'params': {}, 'median_ms': median}]}))
+        return path
+
+    old = save("old.json", 10.0)
+    assert compare_results(old, save("same.json", 10.5))['ratio'].tolist() == [1.05]
+    assert compare_results(old, save("slow.json", 20.0))['ratio'].tolist() == [2.0]
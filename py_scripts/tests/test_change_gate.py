@@ -0,0 +1,70 @@
+import numpy as np
+
+from change_gate import ChangeGate, camera_hour_key
+
+NAME = "AXISQ6074EPTZACCC8EACA584_20230901T210530.000Z.jpg"
+
+
+def water(seed, brightness=100):
+    rng = np.random.default_rng(seed)
+    return np.clip(brightness + rng.normal(0, 2, (300, 480, 3)), 0, 255).astype(np.uint8)
+
+
+def counting_detector():
+    calls = []
+
+    def detect(img):
+        calls.append(1)
+        return [{'xyxy': [0, 0, 1, 1], 'conf': float(len(calls))}]
+    return detect, calls
+
+
+def test_camera_hour_key():
+    assert camera_hour_key(f"/some/dir/{NAME}") == ("AXISQ6074EPTZACCC8EACA584", 21)
+    assert camera_hour_key("other.jpg") == ("other.jpg", None)
+
+
+def test_static_frames_reuse_result():
+    gate = ChangeGate()
+    detect, calls = counting_detector()
+    first, ran, _ = gate.detect(detect, water(0), NAME)
+    assert ran
+    for seed in range(1, 5):
+        boxes, ran, changed = gate.detect(detect, water(seed), NAME)
+        assert not ran and boxes == first and changed <= gate.changed_fraction
+    assert len(calls) == 1
+    assert gate.report()['skipped'] == 4
+
+
+def test_exposure_shift_alone_is_not_a_change():
+    gate = ChangeGate()
+    detect, calls = counting_detector()
+    gate.detect(detect, water(0, 100), NAME)
+    _, ran, _ = gate.detect(detect, water(1, 130), NAME)
+    assert not ran
+
+
+def test_new_boat_triggers_detector():
+    gate = ChangeGate()
+    detect, calls = counting_detector()
+    gate.detect(detect, water(0), NAME)
+    frame = water(1)
+    frame[140:170, 200:260] = 255
+    _, ran, changed = gate.detect(detect, frame, NAME)
+    assert ran and changed > gate.changed_fraction
+    assert len(calls) == 2
+
+
+def test_forced_rerun_after_max_skips():
+    gate = ChangeGate(max_consecutive_skips=2)
+    detect, calls = counting_detector()
+    ran = [gate.detect(detect, water(seed), NAME)[1] for seed in range(6)]
+    assert ran == [True, False, False, True, False, False]
+
+
+def test_cameras_are_independent():
+    gate = ChangeGate()
+    detect, calls = counting_detector()
+    gate.detect(detect, water(0), NAME)
+    _, ran, _ = gate.detect(detect, water(1), NAME.replace("AXIS", "OTHER"))
+    assert ran
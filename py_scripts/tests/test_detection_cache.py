@@ -0,0 +1,59 @@
+import os
+import pickle
+import time
+
+import numpy as np
+
+from detection_cache import DetectionCache, cached_detector, hash_array, hash_params
+
+
+def test_hash_array_sees_shape_dtype_and_content():
+    a = np.zeros((4, 6), np.uint8)
+    assert hash_array(a) == hash_array(a.copy())
+    assert hash_array(a) != hash_array(a.reshape(6, 4))
+    assert hash_array(a) != hash_array(a.astype(np.uint16))
+    b = a.copy()
+    b[0, 0] = 1
+    assert hash_array(a) != hash_array(b)
+
+
+def test_params_order_does_not_change_key():
+    assert hash_params({'a': 1, 'b': 2}) == hash_params({'b': 2, 'a': 1})
+    assert DetectionCache.make_key("img", "model", {'t': 0.3}) != DetectionCache.make_key("img", "model", {'t': 0.4})
+
+
+def test_get_or_compute_hits_after_first_call(tmp_path):
+    cache = DetectionCache(str(tmp_path))
+    calls = []
+    detect = cached_detector(lambda img: calls.append(1) or [{'xyxy': [1, 2, 3, 4], 'conf': 0.9}], cache, "m")
+    img = np.ones((8, 8, 3), np.uint8)
+
+    assert detect(img) == detect(img) == [{'xyxy': [1, 2, 3, 4], 'conf': 0.9}]
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A second cache on the same folder (another process) sees the entry
+    assert DetectionCache(str(tmp_path)).get(cache.make_key(hash_array(img), "m")) is not None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DetectionCache(str(tmp_path), max_bytes=10_000)
+    for i in range(5):
+        cache.put(f"{i:02d}key", "x" * 1000)
+        os.utime(cache._path(f"{i:02d}key"), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get("00key")  # refresh the oldest entry
+
+    for i in range(5, 12):
+        cache.put(f"{i:02d}key", "x" * 1000)
+
+    assert sum(size for _, _, size in cache._scan()) <= 10_000
+    assert cache.get("00key") is not None
+    assert cache.get("01key") is None
+
+
+def test_pickles_without_lock(tmp_path):
+    cache = DetectionCache(str(tmp_path))
+    cache.put("abkey", [1])
+    clone = pickle.loads(pickle.dumps(cache))
+    assert clone.get("abkey") == [1]
+    clone.put("cdkey", [2])
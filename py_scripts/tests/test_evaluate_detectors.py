@@ -0,0 +1,79 @@
+import re
+
+import numpy as np
+import pytest
+
+from evaluate_detectors import (ROBOFLOW_STEM_PATTERN, average_precision, find_image_for_label, find_label_files,
+                                match_detections, read_yolo_boxes)
+
+# Real stems, one per naming form in each dataset
+STEMS = [
+    # labeled_dataset_1 / labeled_dataset_2: mostly copies with a _0 / _1 suffix
+    ("AXISQ6074EPTZACCC8EACA584_20240109T165001_000Z_0_jpg.rf.fe71665c01431ee425fc3f2350fbdf87",
+     "AXISQ6074EPTZACCC8EACA584_20240109T165001.000Z.jpg"),
+    ("AXISQ6074EPTZACCC8EACA584_20240102T135001_000Z_1_jpg.rf.afa81f2803613c549a556f083c5b6067",
+     "AXISQ6074EPTZACCC8EACA584_20240102T135001.000Z.jpg"),
+    # labeled_dataset_3 / 2 train: plain Roboflow renames
+    ("AXISQ6074EPTZACCC8EACA584_20240429T034001_000Z_jpg.rf.68b0c40e71602314ef6956932c51c90b",
+     "AXISQ6074EPTZACCC8EACA584_20240429T034001.000Z.jpg"),
+]
+DATASET_SIZES = {"labeled_dataset_1": 200, "labeled_dataset_2": 200, "labeled_dataset_3": 249, "2 train": 249}
+
+
+@pytest.mark.parametrize("stem, ccss_name", STEMS)
+def test_roboflow_stem_maps_to_ccss_frame(tmp_path, stem, ccss_name):
+    labels = tmp_path / "dataset" / "test" / "labels"
+    labels.mkdir(parents=True)
+    label_path = labels / f"{stem}.txt"
+    label_path.write_text("0 0.5 0.5 0.1 0.1\n")
+    image_dir = tmp_path / "CCSS"
+    image_dir.mkdir()
+    (image_dir / ccss_name).write_bytes(b"")
+
+    assert find_image_for_label(label_path, image_dir) == image_dir / ccss_name
+
+
+@pytest.mark.parametrize("dataset", sorted(DATASET_SIZES))
+def test_every_dataset_stem_matches(data_dir, dataset):
+    label_files = find_label_files(data_dir / dataset)
+    assert len(label_files) == DATASET_SIZES[dataset]
+    unmatched = [p.stem for p in label_files if not re.match(ROBOFLOW_STEM_PATTERN, p.stem)]
+    assert unmatched == []
+
+
+@pytest.mark.parametrize("layout", ["labels/train", "train/labels"])
+def test_find_label_files_both_layouts(tmp_path, layout):
+    folder = tmp_path / layout
+    folder.mkdir(parents=True)
+    (folder / "a.txt").write_text("")
+    (tmp_path / "README.roboflow.txt").write_text("not a label")
+
+    assert [p.name for p in find_label_files(tmp_path)] == ["a.txt"]
+
+
+def test_sibling_image_wins_over_ccss(tmp_path):
+    stem = STEMS[0][0]
+    (tmp_path / "labels" / "test").mkdir(parents=True)
+    (tmp_path / "images" / "test").mkdir(parents=True)
+    label_path = tmp_path / "labels" / "test" / f"{stem}.txt"
+    label_path.write_text("")
+    (tmp_path / "images" / "test" / f"{stem}.jpg").write_bytes(b"")
+
+    assert find_image_for_label(label_path, None) == tmp_path / "images" / "test" / f"{stem}.jpg"
+
+
+def test_read_yolo_boxes(tmp_path):
+    label_path = tmp_path / "a.txt"
+    label_path.write_text("0 0.5 0.5 0.2 0.1\n\n")
+    np.testing.assert_allclose(read_yolo_boxes(label_path, 100, 200), [[40, 90, 60, 110]])
+
+
+def test_match_and_average_precision():
+    gt = np.float32([[0, 0, 10, 10], [20, 20, 30, 30]])
+    pred = np.float32([[0, 0, 10, 10], [0, 0, 10, 10], [50, 50, 60, 60]])
+    scores = np.float32([0.9, 0.8, 0.7])
+
+    tp = match_detections(pred, scores, gt)
+    assert tp.tolist() == [True, False, False]
+    assert average_precision(scores, tp, len(gt)) == pytest.approx(0.5)
+    assert np.isnan(average_precision(scores, tp, 0))
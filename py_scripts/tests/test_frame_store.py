@@ -0,0 +1,89 @@
+import pickle
+
+import cv2
+import numpy as np
+import pytest
+from skimage import color
+
+import frame_store
+from frame_store import build_store, open_store, store_dir_for, worker_store
+
+NAMES = [f"AXIS_20230901T21{i:02d}30.000Z.jpg" for i in range(3)]
+
+
+@pytest.fixture
+def frames(tmp_path):
+    rng = np.random.default_rng(0)
+    image_dir = tmp_path / "frames"
+    image_dir.mkdir()
+    for name in NAMES:
+        cv2.imwrite(str(image_dir / name), rng.integers(0, 255, (50, 40, 3), dtype=np.uint8))
+    return image_dir
+
+
+def test_build_and_read(frames, tmp_path):
+    store = build_store(NAMES + ["missing.jpg"], str(frames), str(tmp_path / "store"), 0.2, 0.2, n_jobs=1)
+    assert len(store) == 3 and "missing.jpg" not in store
+
+    img = cv2.imread(str(frames / NAMES[1]))
+    expected = np.round(color.rgb2gray(img[..., ::-1]) * 255).astype(np.uint8)[10:40]
+    assert np.array_equal(store.roi(NAMES[1]), expected)
+    assert store.offset(NAMES[1]) == (0, 10)
+    assert store.source_shape(NAMES[1]) == (50, 40)
+
+    as_float = store.roi_float(NAMES[1])
+    assert as_float.dtype == np.float32
+    assert np.allclose(as_float, expected / 255.0, atol=1e-6)
+
+
+def test_open_store_checks_settings(frames, tmp_path, capsys):
+    build_store(NAMES, str(frames), str(tmp_path / "store"), 0.2, 0.2, n_jobs=1)
+    assert open_store(str(tmp_path / "store"), 0.2, 0.2) is not None
+    capsys.readouterr()
+    assert open_store(str(tmp_path / "store"), 0.25, 0.2) is None
+    assert "built with crop 0.2/0.2" in capsys.readouterr().out
+    assert open_store(str(tmp_path / "nothing"), 0.2, 0.2) is None
+
+
+def test_each_configuration_has_its_own_folder(frames, tmp_path):
+    configs = [(0.2, 0.2, 'skimage'), (0.25, 0.2, 'skimage'), (0.0, 0.0, 'cv2')]
+    dirs = {store_dir_for(top, bottom, gray_mode=mode, store_root=str(tmp_path)) for top, bottom, mode in configs}
+    assert len(dirs) == 3
+
+    for top, bottom, mode in configs:
+        store_dir = store_dir_for(top, bottom, gray_mode=mode, store_root=str(tmp_path))
+        build_store(NAMES, str(frames), store_dir, top, bottom, gray_mode=mode, n_jobs=1)
+    for top, bottom, mode in configs:
+        store_dir = store_dir_for(top, bottom, gray_mode=mode, store_root=str(tmp_path))
+        assert open_store(store_dir, top, bottom, gray_mode=mode) is not None
+
+
+def test_worker_store_opens_once_per_process(frames, tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_store, "_opened_stores", {})
+    build_store(NAMES, str(frames), str(tmp_path / "store"), 0.2, 0.2, n_jobs=1)
+    first = worker_store(str(tmp_path / "store"), 0.2, 0.2)
+    assert first is not None
+    assert worker_store(str(tmp_path / "store"), 0.2, 0.2) is first
+    assert worker_store(str(tmp_path / "store"), 0.25, 0.2) is None
+
+
+def test_pickles_without_data(frames, tmp_path):
+    store = build_store(NAMES, str(frames), str(tmp_path / "store"), 0.2, 0.2, n_jobs=1)
+    clone = pickle.loads(pickle.dumps(store))
+    assert np.array_equal(clone.roi(NAMES[0]), store.roi(NAMES[0]))
+
+
+def test_detect_lights_reads_cv2_store(frames, tmp_path, monkeypatch):
+    import detect_lights
+
+    img = np.zeros((60, 60), np.uint8)
+    cv2.circle(img, (30, 30), 6, 255, -1)
+    cv2.imwrite(str(frames / NAMES[0]), img)
+    store = build_store(NAMES[:1], str(frames), str(tmp_path / "store"), 0.0, 0.0, gray_mode='cv2', n_jobs=1)
+    monkeypatch.setattr(detect_lights, "USE_STATIC_MASK", False)
+
+    monkeypatch.setattr(detect_lights, "store", None)
+    from_file = detect_lights.find_spherical_blobs(str(frames / NAMES[0]))
+    monkeypatch.setattr(detect_lights, "store", store)
+    from_store = detect_lights.find_spherical_blobs(str(frames / NAMES[0]))
+    assert len(from_file) == len(from_store) == 1
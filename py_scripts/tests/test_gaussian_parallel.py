@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import PY_SCRIPTS
+from detection_cache import DetectionCache
+from frame_store import build_store
+
+NAME = "AXIS_20230901T210530.000Z.jpg"
+
+
+@pytest.fixture
+def gaussian_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import gaussian_parallel
+
+    frames, output = tmp_path / "frames", tmp_path / "output"
+    frames.mkdir()
+    output.mkdir()
+    img = np.random.default_rng(0).integers(0, 60, (80, 100, 3), dtype=np.uint8)
+    cv2.circle(img, (50, 40), 4, (255, 255, 255), -1)
+    cv2.imwrite(str(frames / NAME), img)
+
+    monkeypatch.setattr(gaussian_parallel, "IMAGE_DIR", str(frames))
+    monkeypatch.setattr(gaussian_parallel, "OUTPUT_IMG_DIR", str(output))
+    monkeypatch.setattr(gaussian_parallel, "USE_STATIC_MASK", False)
+    monkeypatch.setattr(gaussian_parallel, "cache", DetectionCache(str(tmp_path / "cache")))
+    return gaussian_parallel
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("should not be called on a cache hit")
+
+
+def test_cache_hit_skips_decode_and_render(gaussian_parallel, monkeypatch):
+    first = gaussian_parallel.process_single_image(NAME)
+    assert first['detected_image'] and os.path.exists(first['detected_image'])
+
+    monkeypatch.setattr(gaussian_parallel.io, "imread", fail)
+    monkeypatch.setattr(gaussian_parallel.plt, "savefig", fail)
+    again = gaussian_parallel.process_single_image(NAME)
+    assert {k: again[k] for k in ("boat_count", "boat_coordinates", "detected_image")} == \
+        {k: first[k] for k in ("boat_count", "boat_coordinates", "detected_image")}
+    assert "decode" not in again['_timings']['stages'] and "render" not in again['_timings']['stages']
+
+
+def test_cache_hit_rerenders_missing_output(gaussian_parallel):
+    first = gaussian_parallel.process_single_image(NAME)
+    os.remove(first['detected_image'])
+    again = gaussian_parallel.process_single_image(NAME)
+    assert os.path.exists(again['detected_image'])
+    assert "detect" not in again['_timings']['stages']
+
+
+def test_store_frames_are_keyed_without_reading_the_jpeg(gaussian_parallel, tmp_path, monkeypatch):
+    build_store([NAME], gaussian_parallel.IMAGE_DIR, str(tmp_path / "store"), 0.2, 0.2, n_jobs=1)
+    monkeypatch.setattr(gaussian_parallel, "hash_file", fail)
+    monkeypatch.setattr(gaussian_parallel.io, "imread", fail)
+    result = gaussian_parallel.process_single_image(NAME, str(tmp_path / "store"))
+    assert result['detected_image'] is not None, result['boat_coordinates']
+
+
+def test_import_creates_no_folders(tmp_path):
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONPATH=str(PY_SCRIPTS))
+    run = subprocess.run([sys.executable, "-c", "import gaussian_parallel"], cwd=tmp_path, env=env,
+                         capture_output=True, text=True, timeout=120)
+    assert run.returncode == 0, run.stderr
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_is_opened_on_first_use(gaussian_parallel, tmp_path, monkeypatch):
+    monkeypatch.setattr(gaussian_parallel, "cache", None)
+    monkeypatch.setattr(gaussian_parallel, "CACHE_DIR", str(tmp_path / "lazy_cache"))
+    assert not (tmp_path / "lazy_cache").exists()
+    gaussian_parallel.process_single_image(NAME)
+    assert (tmp_path / "lazy_cache").is_dir() and gaussian_parallel.cache is not None
+
+    monkeypatch.setattr(gaussian_parallel, "cache", None)
+    monkeypatch.setattr(gaussian_parallel, "USE_CACHE", False)
+    assert gaussian_parallel.open_cache() is None
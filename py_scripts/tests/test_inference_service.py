@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from inference_service import BatchInferenceService
+
+
+def test_results_match_inputs_and_batch():
+    sizes = []
+
+    def predict_batch(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    with BatchInferenceService(predict_batch, max_batch_size=4, max_latency_ms=50) as service:
+        futures = [service.submit(i) for i in range(10)]
+        assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(10)]
+    assert max(sizes) <= 4
+    assert service.stats['items'] == 10
+
+
+def test_predict_errors_reach_every_caller():
+    def predict_batch(items):
+        raise ValueError("model failed")
+
+    with BatchInferenceService(predict_batch, max_latency_ms=1) as service:
+        future = service.submit(1)
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+
+
+def test_submit_after_close_raises():
+    service = BatchInferenceService(lambda items: items)
+    service.close()
+    with pytest.raises(RuntimeError):
+        service.submit(1)
+
+
+def test_submit_racing_close_is_resolved():
+    service = BatchInferenceService(lambda items: items, max_latency_ms=1)
+    real_put = service._queue.put
+
+    def slow_put(request, *args, **kwargs):
+        if isinstance(request, tuple):
+            time.sleep(0.2)  # submit() passed its closed check, close() runs meanwhile
+        return real_put(request, *args, **kwargs)
+
+    service._queue.put = slow_put
+    submitted = []
+    submitter = threading.Thread(target=lambda: submitted.append(service.submit(7)))
+    submitter.start()
+    time.sleep(0.05)
+    service.close()
+    submitter.join(timeout=5)
+
+    assert submitted[0].result(timeout=1) == 7
+
+
+def test_many_submitters_racing_close():
+    for _ in range(20):
+        service = BatchInferenceService(lambda items: items, max_latency_ms=1)
+        futures, start = [], threading.Event()
+        lock = threading.Lock()
+
+        def producer():
+            start.wait()
+            while True:
+                try:
+                    future = service.submit(1)
+                except RuntimeError:
+                    return
+                with lock:
+                    futures.append(future)
+
+        threads = [threading.Thread(target=producer) for _ in range(4)]
+        for t in threads:
+            t.start()
+        start.set()
+        time.sleep(0.005)
+        service.close()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert not any(t.is_alive() for t in threads)
+        assert futures and all(f.done() for f in futures)
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+import label_pack
+from evaluate_detectors import read_yolo_boxes
+from label_pack import list_label_files, load_label_pack
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo(monkeypatch):
+    monkeypatch.setattr(label_pack, "_loaded_packs", {})
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "dataset"
+    (root / "train" / "labels").mkdir(parents=True)
+    (root / "labels" / "test").mkdir(parents=True)
+    (root / "train" / "labels" / "a.txt").write_text("0 0.5 0.5 0.2 0.1\n0 0.25 0.75 0.1 0.1\n")
+    (root / "train" / "labels" / "empty.txt").write_text("")
+    (root / "labels" / "test" / "b.txt").write_text("1 0.1 0.2 0.05 0.04\nbroken line\n")
+    (root / "README.roboflow.txt").write_text("not labels")
+    return root
+
+
+def test_lists_both_layouts(dataset):
+    files = [p.relative_to(dataset).as_posix() for p in list_label_files(dataset)]
+    assert files == ["labels/test/b.txt", "train/labels/a.txt", "train/labels/empty.txt"]
+
+
+def test_pack_matches_parsing(dataset, tmp_path):
+    pack = load_label_pack(dataset, tmp_path / "cache")
+    assert pack.counts().tolist() == [1, 2, 0]
+    assert pack.classes("labels/test/b.txt").tolist() == [1]
+    for path in list_label_files(dataset):
+        assert path in pack
+        assert np.allclose(pack.xyxy(path, 640, 480), read_yolo_boxes(path, 640, 480))
+    assert "train/labels/missing.txt" not in pack
+
+
+def test_reloads_from_disk_and_rebuilds_on_edit(dataset, tmp_path):
+    cache = tmp_path / "cache"
+    first = load_label_pack(dataset, cache)
+    label_pack._loaded_packs.clear()  # as in a new process
+    again = load_label_pack(dataset, cache)
+    assert again is not first and again.signature == first.signature
+    assert np.array_equal(again.labels, first.labels)
+
+    edited = dataset / "train" / "labels" / "empty.txt"
+    edited.write_text("0 0.5 0.5 0.1 0.1\n")
+    os.utime(edited, ns=(1, 1))
+    rebuilt = load_label_pack(dataset, cache)
+    assert rebuilt.signature != first.signature
+    assert rebuilt.counts().tolist() == [1, 2, 1]
+    assert len(os.listdir(cache)) == 1
+
+
+def test_corrupt_cache_is_rebuilt(dataset, tmp_path):
+    cache = tmp_path / "cache"
+    load_label_pack(dataset, cache)
+    [path] = cache.iterdir()
+    path.write_bytes(b"garbage")
+    label_pack._loaded_packs.clear()
+    assert load_label_pack(dataset, cache).counts().tolist() == [1, 2, 0]
+
+
+@pytest.mark.parametrize("dataset_name", ["labeled_dataset_1", "labeled_dataset_3"])
+def test_real_dataset_counts(data_dir, dataset_name, tmp_path):
+    pack = load_label_pack(data_dir / dataset_name, tmp_path / "cache")
+    for i, path in enumerate(list_label_files(data_dir / dataset_name)):
+        assert pack.rows(i).shape[0] == len(read_yolo_boxes(path, 1, 1))
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from skimage.feature import blob_log
+
+from log_sweep import blobs_to_xyxy, sweep_crops, sweep_image
+
+
+def spots(height=120, width=160, seed=0):
+    """Dark water with a few bright blobs of different sizes."""
+    rng = np.random.default_rng(seed)
+    img = rng.normal(0.1, 0.01, (height, width))
+    yy, xx = np.mgrid[:height, :width]
+    for y, x, s in [(30, 40, 3), (80, 100, 6), (60, 20, 2), (95, 140, 4)]:
+        img += 0.8 * np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / (2 * s ** 2))
+    return img
+
+
+@pytest.mark.parametrize("sigma_range", [(2, 10, 5), (1, 8, 8), (3, 12, 4)])
+def test_matches_blob_log(sigma_range):
+    gray = spots()
+    thresholds = [0.05, 0.1, 0.3]
+    results = sweep_image(gray, [sigma_range], thresholds, overlap=0.5)
+    min_sigma, max_sigma, num_sigma = sigma_range
+    for threshold in thresholds:
+        expected = blob_log(gray, min_sigma=min_sigma, max_sigma=max_sigma, num_sigma=num_sigma,
+                            threshold=threshold, overlap=0.5, exclude_border=False)
+        got = results[sigma_range + (threshold,)]
+        assert sorted(map(tuple, got)) == sorted(map(tuple, expected))
+
+
+def test_blobs_to_xyxy_offsets_into_frame():
+    xyxy = blobs_to_xyxy(np.array([[10.0, 20.0, 2.0]]), (5, 30))
+    assert xyxy.tolist() == [[22.0, 37.0, 28.0, 43.0]]
+    assert blobs_to_xyxy(np.empty((0, 3)), (0, 0)).shape == (0, 4)
+
+
+def test_crops_are_swept_separately(tmp_path):
+    path = tmp_path / "frame.jpg"
+    cv2.imwrite(str(path), (np.clip(spots(), 0, 1) * 255).astype(np.uint8))
+    results, shape = sweep_crops(Path(path), crops=[(0.2, 0.2), (0.25, 0.2)],
+                                 sigma_ranges=[(2, 10, 5)], thresholds=[0.1])
+    assert shape == (120, 160)
+    assert set(results) == {(0.2, 0.2, 2, 10, 5, 0.1), (0.25, 0.2, 2, 10, 5, 0.1)}
+    assert results[(0.2, 0.2, 2, 10, 5, 0.1)][1] == (0, 24)
+    assert results[(0.25, 0.2, 2, 10, 5, 0.1)][1] == (0, 30)
+
+
+def test_unreadable_frame(tmp_path):
+    assert sweep_crops(tmp_path / "missing.jpg") == (None, None)
+
+
+def test_crops_read_from_their_own_store(tmp_path):
+    from frame_store import build_store
+
+    path = tmp_path / "frame.jpg"
+    cv2.imwrite(str(path), (np.clip(spots(), 0, 1) * 255).astype(np.uint8))
+    store = build_store([path.name], str(tmp_path), str(tmp_path / "store"), 0.25, 0.2, n_jobs=1)
+    (tmp_path / "frame.jpg").unlink()  # only the store can serve it now
+
+    results, shape = sweep_crops(Path(path), crops=[(0.25, 0.2)], sigma_ranges=[(2, 10, 5)],
+                                 thresholds=[0.1], stores=[store])
+    assert shape == (120, 160) and results[(0.25, 0.2, 2, 10, 5, 0.1)][1] == (0, 30)
+    assert sweep_crops(Path(path), crops=[(0.2, 0.2)], stores=[store]) == (None, None)
@@ -0,0 +1,85 @@
+import json
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+
+from pseudo_label_export import PseudoLabelExporter, read_journal, write_coco_json
+from s3_ingest import LocalObjectStore, run_ingest
+
+NAMES = [f"AXIS_20230901T21{i:02d}30.000Z.jpg" for i in range(4)]
+BOX = {'xyxy': [10, 20, 30, 60], 'conf': 0.9}
+
+
+def test_writes_labels_and_journal(tmp_path):
+    with PseudoLabelExporter(tmp_path, formats=('yolo', 'voc', 'coco'), batch_size=2) as exporter:
+        exporter.submit(f"frames/{NAMES[0]}", 100, 200, [BOX])
+        exporter.submit(NAMES[1], 100, 200, [])
+
+    stem = NAMES[0][:-4]
+    assert (tmp_path / "labels" / f"{stem}.txt").read_text() == "0 0.200000 0.200000 0.200000 0.200000\n"
+    assert (tmp_path / "labels" / f"{stem}.xml").exists()
+    assert [r['file_name'] for r in read_journal(tmp_path / "journal-0.jsonl")] == NAMES[:2]
+    coco = json.loads((tmp_path / "annotations.json").read_text())
+    assert len(coco['images']) == 2 and coco['annotations'][0]['bbox'] == [10.0, 20.0, 20.0, 40.0]
+
+
+def test_resume_by_base_name_or_key(tmp_path):
+    with PseudoLabelExporter(tmp_path) as exporter:
+        exporter.submit(f"frames/{NAMES[0]}", 100, 200, [BOX, BOX])
+
+    exporter = PseudoLabelExporter(tmp_path)
+    assert exporter.resumed == 1
+    assert exporter.is_done(NAMES[0]) and exporter.is_done(f"frames/{NAMES[0]}")
+    assert not exporter.is_done(NAMES[1])
+    assert exporter.boat_count(f"frames/{NAMES[0]}") == 2
+    exporter.close()
+
+
+def test_torn_journal_line_is_redone(tmp_path):
+    with PseudoLabelExporter(tmp_path) as exporter:
+        exporter.submit(NAMES[0], 100, 200, [BOX])
+    with open(tmp_path / "journal-0.jsonl", 'a') as f:
+        f.write('{"file_name": "%s", "wid' % NAMES[1])  # crash mid-write
+
+    with PseudoLabelExporter(tmp_path) as exporter:
+        assert not exporter.is_done(NAMES[1])
+        exporter.submit(NAMES[1], 100, 200, [])
+    assert [r['file_name'] for r in read_journal(tmp_path / "journal-0.jsonl")] == NAMES[:2]
+
+
+def test_shards_are_deduplicated_in_coco(tmp_path):
+    for shard in ("a", "b"):
+        with PseudoLabelExporter(tmp_path, shard=shard) as exporter:
+            exporter.submit(NAMES[0], 100, 200, [BOX])
+    _, n_images, n_annotations = write_coco_json(tmp_path)
+    assert (n_images, n_annotations) == (1, 1)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        PseudoLabelExporter("unused", formats=('yolo', 'csv'))
+
+
+def test_resumed_ingest_keeps_every_row(tmp_path):
+    client = LocalObjectStore(tmp_path / "bucket")
+    for name in NAMES:
+        client.put_object(Bucket="b", Key=f"frames/{name}",
+                          Body=cv2.imencode(".jpg", np.zeros((20, 30, 3), np.uint8))[1].tobytes())
+    calls = []
+
+    def detect(img):
+        calls.append(1)
+        return [BOX]
+
+    with PseudoLabelExporter(tmp_path / "export") as exporter:
+        run_ingest(client, "b", "frames/", NAMES[:2], detect, exporter=exporter)
+    with PseudoLabelExporter(tmp_path / "export") as exporter:
+        results, failed = run_ingest(client, "b", "frames/", NAMES, detect, exporter=exporter)
+
+    assert len(calls) == 4  # two per run, nothing detected twice
+    assert not failed
+    df = pd.DataFrame(results).sort_values('filename')
+    assert df['filename'].tolist() == NAMES
+    assert df['boat_count'].tolist() == [1, 1, 1, 1]
@@ -0,0 +1,63 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from s3_ingest import LocalObjectStore, iter_images, load_file_list, parse_timestamp_from_filename, run_ingest
+
+NAMES = [f"AXIS_20230901T21{i:02d}30.000Z.jpg" for i in range(6)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    client = LocalObjectStore(tmp_path)
+    for i, name in enumerate(NAMES):
+        img = np.full((20, 30, 3), i * 10, np.uint8)
+        client.put_object(Bucket="bucket", Key=f"frames/{name}", Body=cv2.imencode(".jpg", img)[1].tobytes())
+    client.put_object(Bucket="bucket", Key="frames/broken.jpg", Body=b"not a jpeg")
+    return client
+
+
+def test_parse_timestamp():
+    assert parse_timestamp_from_filename(NAMES[1]) == "2023-09-01 21:01:30"
+    assert parse_timestamp_from_filename("no_time.jpg") is None
+
+
+def test_iter_images_bounds_in_flight(store):
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    class CountingStore:
+        def get_object(self, Bucket, Key):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            return store.get_object(Bucket, Key)
+
+    results = []
+    for key, img, error in iter_images(CountingStore(), "bucket", (f"frames/{n}" for n in NAMES),
+                                       max_workers=4, max_in_flight=2):
+        results.append((key, img.shape))
+        with lock:
+            in_flight[0] -= 1
+
+    assert sorted(key for key, _ in results) == sorted(f"frames/{n}" for n in NAMES)
+    assert all(shape == (20, 30, 3) for _, shape in results)
+    assert peak[0] <= 2
+
+
+def test_run_ingest_reports_failures(store):
+    results, failed = run_ingest(store, "bucket", "frames/", NAMES + ["broken.jpg", "missing.jpg"],
+                                 lambda img: [{'xyxy': [0, 0, 1, 1], 'conf': 0.5}], max_workers=2)
+
+    assert sorted(r['filename'] for r in results) == sorted(NAMES)
+    assert all(r['boat_count'] == 1 and r['timestamp'].startswith("2023-09-01") for r in results)
+    assert sorted(failed) == ["broken.jpg", "missing.jpg"]
+
+
+def test_load_file_list_filters_segment(tmp_path):
+    csv_path = tmp_path / "segments.csv"
+    csv_path.write_text("filename,segment\na.jpg,day\nb.jpg,night\nc.jpg,day\n")
+    assert load_file_list(csv_path) == ["a.jpg", "c.jpg"]
+    assert load_file_list(csv_path, segment_val="night") == ["b.jpg"]
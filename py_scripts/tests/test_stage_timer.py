@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from conftest import PY_SCRIPTS
+from stage_timer import StageTimer
+
+
+def test_drain_and_merge():
+    worker, parent = StageTimer(), StageTimer()
+    worker.add("detect", 0.002)
+    worker.add("detect", 0.004)
+    worker.incr("boxes", 3)
+    parent.merge(worker.drain())
+    parent.merge(worker.drain())  # drained: nothing left to add
+
+    assert not worker.stages
+    stats = parent.summary()['stages']['detect']
+    assert stats['count'] == 2 and stats['min_ms'] == 2.0 and stats['max_ms'] == 4.0
+    assert sum(stats['histogram_ms'].values()) == 2
+    assert parent.counters == {'boxes': 3}
+
+
+def test_gaussian_parallel_workers_report_their_stages(tmp_path):
+    """Run gaussian_parallel.py as __main__, so joblib pickles process_single_image by value."""
+    image_dir = tmp_path / "images" / "CCSS"
+    image_dir.mkdir(parents=True)
+    work = tmp_path / "work"
+    work.mkdir()
+    names = [f"AXIS_20230901T21{i:02d}30.000Z.jpg" for i in range(3)]
+    rng = np.random.default_rng(0)
+    for name in names:
+        img = rng.integers(0, 60, (60, 80, 3), dtype=np.uint8)
+        cv2.circle(img, (40, 30), 4, (255, 255, 255), -1)
+        cv2.imwrite(str(image_dir / name), img)
+    pd.DataFrame({'image': names, 'grey': True}).to_csv(work / "image_segmentation_grey.csv", index=False)
+
+    env = dict(os.environ, MPLBACKEND="Agg")
+    env.pop("STAGE_PROFILE", None)
+    run = subprocess.run([sys.executable, str(PY_SCRIPTS / "gaussian_parallel.py")], cwd=work, env=env,
+                         capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, run.stderr
+
+    [timings] = (work / "timings").glob("gaussian_parallel_*.json")
+    stages = json.loads(timings.read_text())['stages']
+    for name in ("decode", "color", "crop", "detect", "render"):
+        assert stages[name]['count'] == len(names), name
+    assert stages['list']['count'] == 1
+
+
+def test_detect_lights_dumps_its_stages(tmp_path):
+    image_dir = tmp_path / "images" / "CCSS"
+    image_dir.mkdir(parents=True)
+    work = tmp_path / "work"
+    work.mkdir()
+    names = [f"AXIS_20230901T21{i:02d}30.000Z.jpg" for i in range(2)]
+    for name in names:
+        img = np.zeros((60, 80, 3), dtype=np.uint8)
+        cv2.circle(img, (40, 30), 4, (255, 255, 255), -1)
+        cv2.imwrite(str(image_dir / name), img)
+    pd.DataFrame({'image': names, 'grey': True}).to_csv(work / "image_segmentation_grey.csv", index=False)
+
+    run = subprocess.run([sys.executable, str(PY_SCRIPTS / "detect_lights.py")], cwd=work,
+                         capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, run.stderr
+
+    [timings] = (work / "timings").glob("detect_lights_*.json")
+    stages = json.loads(timings.read_text())['stages']
+    for name in ("decode", "detect"):
+        assert stages[name]['count'] == len(names), name
+    assert stages['list']['count'] == stages['write']['count'] == 1
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+
+import static_mask
+from static_mask import StaticMask, camera_id, load_camera_mask, load_mask, water_mask_from_statistics
+
+NAME = "AXISQ6074EPTZACCC8EACA584_20230901T210530.000Z.jpg"
+
+
+def harbour_statistics():
+    """Land (always edgy, static) on top, water (no fixed edges, textured) below."""
+    edge_freq = np.zeros((120, 160), np.float32)
+    texture_std = np.full((120, 160), 4.0, np.float32)
+    edge_freq[:50] = 0.9
+    texture_std[:50] = 0.2
+    return edge_freq, texture_std
+
+
+def test_camera_id():
+    assert camera_id(f"/frames/{NAME}") == "AXISQ6074EPTZACCC8EACA584"
+    assert camera_id("other.jpg") == "other"
+
+
+def test_water_mask_from_statistics():
+    mask = water_mask_from_statistics(*harbour_statistics(), margin_px=0)
+    assert mask.dtype == np.uint8
+    assert not mask[:45].any()
+    assert mask[55:].all()
+
+
+def test_crop_and_contains():
+    mask = StaticMask(water_mask_from_statistics(*harbour_statistics(), margin_px=0))
+    img = np.zeros((240, 320, 3), np.uint8)
+    img[100:] = 50
+    roi, roi_mask, (x0, y0) = mask.crop(img)
+    assert (x0, y0) == (0, 100)
+    assert roi.shape[:2] == roi_mask.shape == (140, 320)
+    assert mask.contains({'xyxy': [10, 200, 20, 210], 'conf': 1.0}, 240, 320)
+    assert not mask.contains({'xyxy': [10, 10, 20, 20], 'conf': 1.0}, 240, 320)
+
+
+def test_empty_mask_loads_as_no_mask(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_mask, "_loaded_masks", {})
+    cv2.imwrite(str(tmp_path / "AXISQ6074EPTZACCC8EACA584.png"), np.zeros((120, 160), np.uint8))
+    assert load_mask(tmp_path / "AXISQ6074EPTZACCC8EACA584.png") is None
+    assert load_camera_mask(NAME, str(tmp_path)) is None
+
+    cv2.imwrite(str(tmp_path / "good.png"), water_mask_from_statistics(*harbour_statistics()))
+    assert load_mask(tmp_path / "good.png").water_fraction > 0.5
+
+
+def test_build_masks_refuses_empty_mask(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no segment csv
+    flat = np.full((60, 80), 128, np.uint8)  # no texture anywhere -> no water
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / NAME.replace("2105", f"21{i:02d}")), flat)
+    static_mask.build_masks(str(tmp_path), str(tmp_path / "masks"))
+    assert not list((tmp_path / "masks").iterdir())
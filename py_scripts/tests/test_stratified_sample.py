@@ -0,0 +1,77 @@
+from collections import Counter
+
+import pytest
+from openpyxl import load_workbook
+
+from stratified_sample import (boat_count_bin, iter_detection_rows, make_stratum_fn, stratified_reservoir_sample,
+                               write_sample_workbook)
+
+
+def test_allocation_is_proportional_and_exact():
+    rows = [("a", i) for i in range(600)] + [("b", i) for i in range(300)] + [("c", i) for i in range(100)]
+    sample, summary = stratified_reservoir_sample(rows, lambda row: row[0], 50, seed=1)
+
+    assert len(sample) == 50
+    assert Counter(row[0] for row in sample) == {"a": 30, "b": 15, "c": 5}
+    assert summary == {"a": (600, 30), "b": (300, 15), "c": (100, 5)}
+
+
+def test_largest_remainder_fills_the_sample():
+    rows = [("a", i) for i in range(5)] + [("b", i) for i in range(5)] + [("c", i) for i in range(5)]
+    sample, summary = stratified_reservoir_sample(rows, lambda row: row[0], 10, seed=1)
+
+    assert len(sample) == 10
+    assert sorted(taken for _, taken in summary.values()) == [3, 3, 4]
+
+
+def test_same_seed_same_sample_in_original_order():
+    rows = [(i % 7, i) for i in range(1000)]
+    first, _ = stratified_reservoir_sample(iter(rows), lambda row: row[0], 40, seed=42)
+    second, _ = stratified_reservoir_sample(iter(rows), lambda row: row[0], 40, seed=42)
+    other, _ = stratified_reservoir_sample(iter(rows), lambda row: row[0], 40, seed=7)
+
+    assert first == second
+    assert first != other
+    assert [row[1] for row in first] == sorted(row[1] for row in first)
+
+
+def test_sample_larger_than_input():
+    sample, summary = stratified_reservoir_sample([("a", 1), ("b", 2)], lambda row: row[0], 10)
+    assert sorted(sample) == [("a", 1), ("b", 2)]
+    assert stratified_reservoir_sample([], lambda row: row, 10) == ([], {})
+
+
+@pytest.mark.parametrize("value, label", [(0, "0"), (1, "1"), (3, "2-4"), (7, "5-9"), (12, "10+"), ("x", "unknown")])
+def test_boat_count_bin(value, label):
+    assert boat_count_bin(value) == label
+
+
+def test_csv_to_workbook_roundtrip(tmp_path):
+    src = tmp_path / "detections.csv"
+    src.write_text("image,boat_count,detected_image\n"
+                   "AXIS_20230901T210530.000Z.jpg,2,\n"
+                   "AXIS_20230901T220530.000Z.jpg,0,\n")
+    header, rows = iter_detection_rows(str(src))
+    stratum_of = make_stratum_fn("hour", header)
+    sample, summary = stratified_reservoir_sample(rows, stratum_of, 2)
+    assert set(summary) == {"21h", "22h"}
+
+    out = tmp_path / "sample.xlsx"
+    write_sample_workbook(header, sample, str(out), img_dir=str(tmp_path))
+    ws = load_workbook(out).active
+    assert [c.value for c in ws[1]] == header
+    link = ws.cell(row=2, column=3)
+    assert link.value == "View Image"
+    assert link.hyperlink.target.endswith("AXIS_20230901T210530.000Z_detected.jpg")
+
+
+def test_unnamed_index_column_is_dropped_by_position(tmp_path):
+    import pandas as pd
+
+    df = pd.DataFrame({'image': ["a.jpg", "b.jpg"], 'boat_count': [3, 0]})
+    df.to_csv(tmp_path / "indexed.csv")  # leading unnamed index column
+    df.to_excel(tmp_path / "indexed.xlsx")
+    for name in ("indexed.csv", "indexed.xlsx"):
+        header, rows = iter_detection_rows(str(tmp_path / name))
+        assert header == ["image", "boat_count"]
+        assert [[str(v) for v in row] for row in rows] == [["a.jpg", "3"], ["b.jpg", "0"]]
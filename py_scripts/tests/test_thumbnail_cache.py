@@ -0,0 +1,96 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from thumbnail_cache import ThumbnailCache, make_thumbnail
+
+
+def noise(seed, height=200, width=300):
+    return np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_make_thumbnail_never_upscales():
+    assert make_thumbnail(noise(0), 100).shape == (66, 100, 3)
+    assert make_thumbnail(noise(0), 1000).shape == (200, 300, 3)
+
+
+def test_put_writes_stable_path(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_side=100)
+    path = cache.put("/frames/a.jpg", noise(0))
+    assert path == cache.path_for("/frames/a.jpg") and os.path.exists(path)
+    assert cv2.imread(path).shape == (66, 100, 3)
+    assert cache.path_for("/other/a.jpg") != path
+
+
+def test_eviction_drops_oldest(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=10 ** 9)
+    paths = [cache.put(f"{i}.jpg", noise(i)) for i in range(4)]
+    for i, path in enumerate(paths):
+        age(path, 100 - i)
+    cache.max_bytes = sum(os.path.getsize(p) for p in paths[1:]) + 1
+    cache.put("new.jpg", noise(9))
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(cache.path_for("new.jpg"))
+
+
+def test_pinned_thumbnails_survive_eviction(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=10 ** 9)
+    pinned = [cache.put(f"{i}.jpg", noise(i), pin=True) for i in range(3)]
+    loose = cache.put("loose.jpg", noise(5))
+    for i, path in enumerate(pinned + [loose]):
+        age(path, 100 - i)
+    cache.max_bytes = 1
+    cache.put("new.jpg", noise(9))
+    assert all(os.path.exists(p) for p in pinned)
+    assert not os.path.exists(loose)
+
+    cache.unpin(pinned)
+    cache.put("newer.jpg", noise(10))
+    assert not any(os.path.exists(p) for p in pinned)
+
+
+def test_pins_are_counted(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=10 ** 9)
+    path = cache.put("a.jpg", noise(0), pin=True)
+    cache.put("a.jpg", noise(0), pin=True)
+    cache.unpin([path])
+    cache.max_bytes = 1
+    cache.put("b.jpg", noise(1))
+    assert os.path.exists(path)
+
+
+def test_pinned_bytes_dont_trigger_rescans(tmp_path, monkeypatch):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=10 ** 9)
+    pinned = [cache.put(f"{i}.jpg", noise(i), pin=True) for i in range(3)]
+    loose = cache.put("loose.jpg", noise(5))
+    # Pinned thumbnails alone are over the bound, the loose one is well within it
+    cache.max_bytes = os.path.getsize(loose) * 3
+
+    def rescan():
+        raise AssertionError("put() rescanned the folder")
+    monkeypatch.setattr(cache, "_scan", rescan)
+    monkeypatch.setattr(os, "scandir", rescan)
+    cache.put("new.jpg", noise(9))
+    assert all(os.path.exists(p) for p in pinned + [loose, cache.path_for("new.jpg")])
+
+    cache.unpin(pinned)
+    cache.put("newer.jpg", noise(10))
+    assert not any(os.path.exists(p) for p in pinned)
+    assert os.path.exists(cache.path_for("newer.jpg"))
+
+
+def test_index_is_loaded_from_the_folder(tmp_path):
+    first = ThumbnailCache(str(tmp_path), max_bytes=10 ** 9)
+    paths = [first.put(f"{i}.jpg", noise(i)) for i in range(3)]
+    for i, path in enumerate(paths):
+        age(path, 100 - i)
+    cache = ThumbnailCache(str(tmp_path), max_bytes=sum(os.path.getsize(p) for p in paths) + 1)
+    cache.put("new.jpg", noise(9))
+    assert not os.path.exists(paths[0]) and os.path.exists(paths[2])
@@ -0,0 +1,111 @@
+import math
+import random
+
+import pytest
+
+from track_index import (TrackLinker, box_centres, link_frames, parse_coordinates, parse_frame_name,
+                         read_detection_table, summarize_tracks)
+
+CAM = "AXISQ6074EPTZACCC8EACA584"
+
+
+def frame(minute, camera=CAM):
+    return f"{camera}_20230901T21{minute:02d}00.000Z.jpg"
+
+
+def test_parsing():
+    camera, t = parse_frame_name(f"/x/{frame(5)}")
+    assert camera == CAM and t == parse_frame_name(frame(0))[1] + 300
+    assert parse_frame_name("other.jpg") == ("other.jpg", None)
+    assert parse_coordinates("(1.5, 2.0); (3, -4e1)") == [(1.5, 2.0), (3.0, -40.0)]
+    assert parse_coordinates(float('nan')) == [] and parse_coordinates("Error: boom") == []
+    assert box_centres([[0, 0, 10, 20, 0.9]]) == [(5.0, 10.0)]
+
+
+def test_moored_boat_is_one_track():
+    frames = [(frame(m), [(100 + m, 200)]) for m in range(0, 30, 5)]
+    detections, tracks = link_frames(frames)
+    assert detections['track_id'].nunique() == 1
+    assert tracks.iloc[0]['dwell_s'] == 25 * 60 and tracks.iloc[0]['n_frames'] == 6
+    assert summarize_tracks(tracks)['distinct_vessels'] == 1
+
+
+def test_gap_and_distance_split_tracks():
+    _, tracks = link_frames([(frame(0), [(100, 100)]), (frame(20), [(100, 100)])], max_gap_s=15 * 60)
+    assert len(tracks) == 2
+    _, tracks = link_frames([(frame(0), [(100, 100)]), (frame(1), [(200, 100)])])
+    assert len(tracks) == 2
+
+
+def test_cameras_and_order():
+    frames = [(frame(5), [(10, 10)]), (frame(0), [(12, 10)]), (frame(0, "OTHER"), [(10, 10)]), ("x.jpg", [(1, 1)])]
+    detections, tracks = link_frames(frames)
+    assert len(detections) == 3
+    assert sorted(tracks['n_frames']) == [1, 2]
+    assert tracks['track_id'].is_unique
+
+
+def test_closest_pairs_match_first():
+    linker = TrackLinker(max_distance=25)
+    a, b = linker.add_frame(0, [(0, 0), (20, 0)])
+    assert linker.add_frame(60, [(18, 0), (2, 0)]) == [b, a]
+    assert linker.add_frame(120, [(10, 0)]) in ([a], [b])
+    assert len(linker.tracks) == 2
+
+
+def brute_force(frames, max_distance, max_gap_s):
+    """Greedy matching against every live track, no grid."""
+    tracks, out = {}, []
+    for t, points in frames:
+        live = {k: v for k, v in tracks.items() if t - v[2] <= max_gap_s}
+        pairs = sorted((math.hypot(x - tx, y - ty), i, k)
+                       for i, (x, y) in enumerate(points) for k, (tx, ty, _) in live.items()
+                       if math.hypot(x - tx, y - ty) <= max_distance)
+        assigned, used = [None] * len(points), set()
+        for _, i, k in pairs:
+            if assigned[i] is None and k not in used:
+                assigned[i] = k
+                used.add(k)
+        for i, (x, y) in enumerate(points):
+            if assigned[i] is None:
+                assigned[i] = len(tracks)
+            tracks[assigned[i]] = (x, y, t)
+        out.append(assigned)
+    return out
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_grid_matches_brute_force(seed):
+    rng = random.Random(seed)
+    frames = [(t * 60, [(rng.uniform(0, 300), rng.uniform(0, 200)) for _ in range(rng.randint(0, 12))])
+              for t in range(40) if rng.random() > 0.2]
+    linker = TrackLinker(max_distance=25, max_gap_s=180)
+    assert [linker.add_frame(t, points) for t, points in frames] == brute_force(frames, 25, 180)
+
+
+def test_read_detection_table(tmp_path):
+    path = tmp_path / "detections.csv"
+    path.write_text(f"image,boat_count,boat_coordinates\n{frame(0)},1,\"(1.0, 2.0)\"\n{frame(1)},0,\n")
+    assert read_detection_table(str(path)) == [(frame(0), [(1.0, 2.0)]), (frame(1), [])]
+    (tmp_path / "counts.csv").write_text("image,boat_count\na.jpg,1\n")
+    with pytest.raises(ValueError):
+        read_detection_table(str(tmp_path / "counts.csv"))
+
+
+def test_untimed_frames_link_in_list_order():
+    frames = [("upload_b.jpg", [(100, 100)]), ("upload_a.jpg", [(102, 100)]), ("upload_c.jpg", [(300, 100)]),
+              (frame(0), [(10, 10)])]
+    detections, tracks = link_frames(frames)
+    assert len(detections) == 1
+
+    detections, tracks = link_frames(frames, untimed_step_s=60)
+    assert list(detections['image']) == ["AXISQ6074EPTZACCC8EACA584_20230901T210000.000Z.jpg",
+                                         "upload_b.jpg", "upload_a.jpg", "upload_c.jpg"]
+    untimed = tracks[tracks['camera'].isna()]
+    assert sorted(untimed['n_frames']) == [1, 2]
+    assert untimed['dwell_s'].isna().all() and untimed['first_seen'].isna().all()
+
+    summary = summarize_tracks(tracks)
+    assert summary['distinct_vessels'] == 3 and summary['median_dwell_min'] == 0.0
+    summary = summarize_tracks(untimed)
+    assert summary['distinct_vessels'] == 2 and summary['median_dwell_min'] is None
@@ -0,0 +1,96 @@
+import csv
+
+import cv2
+import numpy as np
+import pytest
+
+import watch_folder
+from watch_folder import FrameProcessor, StoreWriter, load_store_names, run, watch_polling
+
+NAMES = [f"AXISQ6074EPTZACCC8EACA584_20230901T21{i:02d}30.000Z.jpg" for i in range(3)]
+
+
+def write_frame(folder, name, seed=0):
+    img = np.random.default_rng(seed).integers(0, 40, (60, 80, 3), dtype=np.uint8)
+    cv2.imwrite(str(folder / name), img)
+
+
+def test_polling_yields_settled_images_once(tmp_path):
+    (tmp_path / ".hidden.jpg").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_bytes(b"x")
+    (tmp_path / "seen.jpg").write_bytes(b"x")
+    seen = {"seen.jpg"}
+    arrivals = watch_polling(tmp_path, seen, poll_interval=0)
+
+    def poll(n):
+        names = [name for name in (next(arrivals) for _ in range(n)) if name]
+        seen.update(names)  # as run() does
+        return names
+
+    write_frame(tmp_path, NAMES[0])
+    assert poll(4) == [NAMES[0]]
+    write_frame(tmp_path, NAMES[1])
+    assert poll(4) == [NAMES[1]]
+    assert poll(4) == []
+
+
+def test_store_writer_appends_under_one_header(tmp_path):
+    path = tmp_path / "store.csv"
+    for name in NAMES[:2]:
+        writer = StoreWriter(path)
+        writer.append({'image': name, 'boat_count': 1})
+        writer.close()
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['image'] for row in rows] == NAMES[:2]
+    assert load_store_names(path) == set(NAMES[:2])
+    assert load_store_names(tmp_path / "missing.csv") == set()
+
+
+def test_frame_processor_row(tmp_path):
+    write_frame(tmp_path, NAMES[0])
+    row = FrameProcessor(use_change_gate=False).process(str(tmp_path / NAMES[0]))
+    assert row['image'] == NAMES[0]
+    assert row['timestamp_utc'].startswith("2023-09-01T21:00:30")
+    assert row['segment'] in ('day', 'night') and row['detector_ran']
+    assert row['boat_count'] == len([c for c in row['boat_coordinates'].split("; ") if c])
+
+
+class FakeProcessor:
+    def process(self, img_path):
+        return {'image': img_path.rsplit("/", 1)[-1], 'boat_count': 0, 'detector_ran': True, 'segment': 'day'}
+
+
+def test_run_resumes_from_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch_folder, "FrameProcessor", FakeProcessor)
+    monkeypatch.chdir(tmp_path)  # run() dumps its stage timings to ./timings/
+    frames, store = tmp_path / "frames", tmp_path / "store.csv"
+    frames.mkdir()
+    for i, name in enumerate(NAMES[:2]):
+        write_frame(frames, name, i)
+
+    assert run(frames, store, process_existing=True, use_inotify=False, poll_interval=0, max_frames=2) == 2
+    write_frame(frames, NAMES[2], 2)
+    assert run(frames, store, process_existing=True, use_inotify=False, poll_interval=0, max_frames=1) == 1
+    assert load_store_names(store) == set(NAMES)
+    with open(store, newline='') as f:
+        assert len(list(csv.DictReader(f))) == 3
+    assert len(list((tmp_path / "timings").glob("*.json"))) == 1
+
+
+def test_frame_processor_decodes_once(tmp_path, monkeypatch):
+    import grey_detect
+    from PIL import Image
+
+    write_frame(tmp_path, NAMES[0])
+    reads = []
+    imread = cv2.imread
+    monkeypatch.setattr(cv2, "imread", lambda *args: reads.append(args) or imread(*args))
+    monkeypatch.setattr(Image, "open", lambda *args: pytest.fail("decoded with PIL as well"))
+
+    row = FrameProcessor(use_change_gate=False).process(str(tmp_path / NAMES[0]))
+    assert len(reads) == 1
+    # Same tag as the file-based check on the dark, colourless test frame
+    monkeypatch.undo()
+    assert row['grey'] == grey_detect.is_grey_image(str(tmp_path / NAMES[0])) is True
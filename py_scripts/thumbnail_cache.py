@@ -0,0 +1,131 @@
+#%%
+"""
+Size-bounded on-disk cache of downscaled JPEG thumbnails.
+
+Used by the Gradio batch detector so the gallery holds file paths to small
+JPEGs instead of full-resolution annotated frames in RAM. Thumbnails are at
+most MAX_SIDE px on the long side. When the unpinned thumbnails grow past
+max_bytes the least recently written ones are deleted. Pinned thumbnails
+don't count towards the bound and are never deleted: the app pins the
+thumbnails its current gallery shows, so eviction never removes an image the
+user is still paging through (a run bigger than max_bytes therefore
+overshoots the bound until it is unpinned). The sizes are kept in an
+in-memory index (loaded from the folder once, oldest mtime first), so a put()
+never rescans the folder. Writes are atomic (tmp file + os.replace), the same
+as detection_cache.py.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import Counter, OrderedDict
+
+import cv2
+
+# ----------------------------
+# Defaults
+# ----------------------------
+THUMB_DIR = "./.thumbnails"
+MAX_SIDE = 480
+JPEG_QUALITY = 80
+MAX_THUMB_BYTES = 256 * 1024 * 1024
+
+
+def make_thumbnail(image, max_side=MAX_SIDE):
+    """Downscale so the long side is at most max_side (never upscales)."""
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+class ThumbnailCache:
+    """Write thumbnails under cache_dir and keep the unpinned ones below max_bytes."""
+
+    def __init__(self, cache_dir=THUMB_DIR, max_bytes=MAX_THUMB_BYTES, max_side=MAX_SIDE, quality=JPEG_QUALITY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._pinned = Counter()
+        self._pinned_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # path -> size, least recently written first
+        self._sizes = OrderedDict((path, size) for path, _, size in sorted(self._scan(), key=lambda e: e[1]))
+        self._bytes = sum(self._sizes.values())
+
+    def path_for(self, name):
+        """Stable thumbnail path for a source name (e.g. the original image path)."""
+        digest = hashlib.blake2b(str(name).encode(), digest_size=8).hexdigest()
+        stem = os.path.splitext(os.path.basename(str(name)))[0][:60]
+        return os.path.join(self.cache_dir, f"{stem}_{digest}.jpg")
+
+    def put(self, name, image, rgb=True, pin=False):
+        """
+        Store a thumbnail of image (RGB by default, as Gradio uses) and return
+        its path. pin=True keeps it from eviction until unpin().
+        """
+        thumb = make_thumbnail(image, self.max_side)
+        if rgb and thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_RGB2BGR)
+        ok, encoded = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError(f"could not encode thumbnail for {name}")
+
+        path = self.path_for(name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old_size = self._sizes.pop(path, 0)
+            self._sizes[path] = len(encoded)
+            self._bytes += len(encoded) - old_size
+            if path in self._pinned:
+                self._pinned_bytes += len(encoded) - old_size
+            if pin:
+                if path not in self._pinned:
+                    self._pinned_bytes += len(encoded)
+                self._pinned[path] += 1
+            if self._bytes - self._pinned_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def unpin(self, paths):
+        """Release pins taken by put(..., pin=True); the thumbnails become evictable again."""
+        with self._lock:
+            for path in paths:
+                if self._pinned[path] > 1:
+                    self._pinned[path] -= 1
+                elif self._pinned.pop(path, None) is not None:
+                    self._pinned_bytes -= self._sizes.get(path, 0)
+
+    def _scan(self):
+        """Yield (path, mtime, size) for every thumbnail."""
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.jpg'):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield entry.path, st.st_mtime, st.st_size
+
+    def _evict(self):
+        """Delete the oldest unpinned thumbnails until they take 90% of max_bytes."""
+        unpinned = self._bytes - self._pinned_bytes
+        target = self.max_bytes * 0.9
+        for path in [p for p in self._sizes if p not in self._pinned]:
+            if unpinned <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size = self._sizes.pop(path)
+            self._bytes -= size
+            unpinned -= size
@@ -0,0 +1,231 @@
+#%%
+"""
+Link per-frame detections into tracks to count distinct boats and dwell times.
+
+combined_boat_data.csv and the app's analytics sum boat_count over frames,
+so a boat moored for six hours is counted once per frame. This links
+detections of consecutive frames of the same camera into tracks:
+- frames are taken in time order per camera (timestamp from the filename);
+  frames without one are skipped, or linked in the order given
+  (link_frames(..., untimed_step_s=...), as the app does for uploads),
+- active tracks sit in a uniform grid keyed by cell = MAX_DISTANCE_PX, so a
+  detection only looks at tracks in the 3 x 3 cells around it, not at every
+  earlier detection,
+- candidate (detection, track) pairs within MAX_DISTANCE_PX are matched
+  greedily, closest first, one detection per track per frame; the rest start
+  new tracks,
+- a track not seen for more than MAX_GAP_S leaves the grid (expiry via a heap),
+  so the work per frame depends on the boats in view, not on the archive size.
+
+Input is any detection table with an image/filename column and a
+boat_coordinates column of "(x, y); (x, y)" centres, e.g. the xlsx written by
+gaussian_parallel.py / laplacian_gaussian.py or the watch_folder.py CSV.
+(combined_boat_data.csv only keeps counts, so it can't be tracked.)
+"""
+import heapq
+import math
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# ----------------------------
+# Configuration
+# ----------------------------
+INPUT_FILES = ["./boat_detections_parallel.xlsx"]
+TRACKS_CSV = "./boat_tracks.csv"
+MAX_DISTANCE_PX = 25.0  # max centre movement between frames of one track
+MAX_GAP_S = 15 * 60  # a track survives this long without a detection (missed frames)
+MIN_TRACK_FRAMES = 1  # tracks shorter than this are not counted as vessels
+UNTIMED_STEP_S = 5 * 60  # assumed spacing of frames without a filename timestamp (usual camera interval)
+
+FILENAME_PATTERN = r'^(.*)_(\d{8}T\d{6})'
+_COORD_PATTERN = re.compile(r'\(\s*([-\d.eE+]+)\s*,\s*([-\d.eE+]+)\s*\)')
+
+
+def parse_frame_name(filename):
+    """AXIS..._20230901T210530.000Z.jpg -> ('AXIS...', unix seconds); time is None if unparseable."""
+    name = os.path.basename(str(filename))
+    match = re.match(FILENAME_PATTERN, name)
+    if not match:
+        return name, None
+    dt = datetime.strptime(match.group(2), '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+    return match.group(1), dt.timestamp()
+
+
+def parse_coordinates(text):
+    """'(x, y); (x, y)' -> [(x, y), ...]; empty for NaN / error strings."""
+    if not isinstance(text, str) or text.startswith("Error"):
+        return []
+    return [(float(x), float(y)) for x, y in _COORD_PATTERN.findall(text)]
+
+
+def box_centres(boxes):
+    """[[x1, y1, x2, y2, ...], ...] -> [(x, y), ...]"""
+    return [((b[0] + b[2]) / 2, (b[1] + b[3]) / 2) for b in boxes]
+
+
+class TrackLinker:
+    """Incremental tracker for one camera; feed frames in time order with add_frame()."""
+
+    def __init__(self, max_distance=MAX_DISTANCE_PX, max_gap_s=MAX_GAP_S, first_id=0):
+        self.max_distance = max_distance
+        self.max_gap_s = max_gap_s
+        self.next_id = first_id
+        self.tracks = {}  # track id -> stats
+        self._grid = defaultdict(set)  # cell -> active track ids
+        self._expiry = []  # heap of (last seen, track id), stale entries skipped
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.max_distance)), int(math.floor(y / self.max_distance))
+
+    def _expire(self, t):
+        while self._expiry and t - self._expiry[0][0] > self.max_gap_s:
+            last_t, track_id = heapq.heappop(self._expiry)
+            track = self.tracks[track_id]
+            if track['active'] and track['last_t'] == last_t:
+                track['active'] = False
+                self._grid[track['cell']].discard(track_id)
+
+    def add_frame(self, t, points):
+        """Assign each (x, y) of a frame taken at t (seconds) to a track; returns the track ids."""
+        self._expire(t)
+        candidates = []
+        for i, (x, y) in enumerate(points):
+            cx, cy = self._cell(x, y)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for track_id in self._grid.get((cx + dx, cy + dy), ()):
+                        track = self.tracks[track_id]
+                        d = math.hypot(x - track['x'], y - track['y'])
+                        if d <= self.max_distance:
+                            candidates.append((d, i, track_id))
+
+        assigned = [None] * len(points)
+        used = set()
+        for d, i, track_id in sorted(candidates):
+            if assigned[i] is None and track_id not in used:
+                assigned[i] = track_id
+                used.add(track_id)
+
+        for i, (x, y) in enumerate(points):
+            track_id = assigned[i]
+            if track_id is None:
+                track_id = assigned[i] = self.next_id
+                self.next_id += 1
+                self.tracks[track_id] = {'first_t': t, 'n_frames': 0, 'sum_x': 0.0, 'sum_y': 0.0,
+                                         'active': True, 'cell': None}
+            track = self.tracks[track_id]
+            cell = self._cell(x, y)
+            if track['cell'] != cell:
+                if track['cell'] is not None:
+                    self._grid[track['cell']].discard(track_id)
+                self._grid[cell].add(track_id)
+            track.update(x=x, y=y, last_t=t, cell=cell)
+            track['n_frames'] += 1
+            track['sum_x'] += x
+            track['sum_y'] += y
+            heapq.heappush(self._expiry, (t, track_id))
+        return assigned
+
+
+def link_frames(frames, max_distance=MAX_DISTANCE_PX, max_gap_s=MAX_GAP_S, untimed_step_s=None):
+    """
+    Link detections of many frames (any order, any cameras) into tracks.
+
+    frames: iterable of (filename, [(x, y), ...]). Frames without a parseable
+    timestamp are skipped, unless untimed_step_s is given: then they are
+    linked as one more sequence (camera None) in the order given, as if
+    untimed_step_s apart. Their detections and tracks have no time, first /
+    last seen or dwell time.
+    Returns (detections DataFrame with a track_id per point, tracks DataFrame).
+    """
+    by_camera = defaultdict(list)
+    untimed = []
+    for filename, points in frames:
+        camera, t = parse_frame_name(filename)
+        name = os.path.basename(str(filename))
+        if t is not None:
+            by_camera[camera].append((t, name, points))
+        elif untimed_step_s is not None:
+            untimed.append((len(untimed) * untimed_step_s, name, points))
+
+    sequences = sorted(by_camera.items())
+    if untimed:
+        sequences.append((None, untimed))
+
+    detections, tracks = [], []
+    next_id = 0
+    for camera, camera_frames in sequences:
+        timed = camera is not None
+        linker = TrackLinker(max_distance, max_gap_s, first_id=next_id)
+        for t, name, points in sorted(camera_frames, key=lambda f: f[0]):
+            for (x, y), track_id in zip(points, linker.add_frame(t, points)):
+                detections.append({'image': name, 'camera': camera, 'time': t if timed else None,
+                                   'x': x, 'y': y, 'track_id': track_id})
+        for track_id, s in linker.tracks.items():
+            tracks.append({
+                'track_id': track_id,
+                'camera': camera,
+                'first_seen': datetime.fromtimestamp(s['first_t'], tz=timezone.utc).isoformat() if timed else None,
+                'last_seen': datetime.fromtimestamp(s['last_t'], tz=timezone.utc).isoformat() if timed else None,
+                'dwell_s': s['last_t'] - s['first_t'] if timed else None,
+                'n_frames': s['n_frames'],
+                'mean_x': round(s['sum_x'] / s['n_frames'], 1),
+                'mean_y': round(s['sum_y'] / s['n_frames'], 1),
+            })
+        next_id = linker.next_id
+
+    return pd.DataFrame(detections), pd.DataFrame(tracks)
+
+
+def summarize_tracks(tracks, min_frames=MIN_TRACK_FRAMES):
+    """
+    Distinct vessels and dwell statistics from link_frames() tracks. Dwell
+    times are None when every vessel comes from frames without a timestamp.
+    """
+    if tracks.empty:
+        return {'detections': 0, 'distinct_vessels': 0, 'median_dwell_min': 0.0, 'max_dwell_min': 0.0}
+    vessels = tracks[tracks['n_frames'] >= min_frames]
+    dwell_min = vessels['dwell_s'].dropna().astype(float) / 60
+    no_dwell = None if len(vessels) else 0.0
+    return {
+        'detections': int(tracks['n_frames'].sum()),
+        'distinct_vessels': len(vessels),
+        'median_dwell_min': round(float(dwell_min.median()), 1) if len(dwell_min) else no_dwell,
+        'max_dwell_min': round(float(dwell_min.max()), 1) if len(dwell_min) else no_dwell,
+    }
+
+
+def read_detection_table(path):
+    """Detections xlsx / csv -> [(filename, [(x, y), ...]), ...]"""
+    df = pd.read_excel(path) if path.endswith(('.xlsx', '.xls')) else pd.read_csv(path)
+    name_col = 'image' if 'image' in df.columns else 'filename'
+    if 'boat_coordinates' not in df.columns:
+        raise ValueError(f"{path} has no boat_coordinates column (counts alone can't be tracked)")
+    return [(name, parse_coordinates(coords)) for name, coords in zip(df[name_col], df['boat_coordinates'])]
+
+
+def main():
+    frames = []
+    for path in INPUT_FILES:
+        if not os.path.exists(path):
+            print(f"⚠️  {path} not found")
+            continue
+        frames.extend(read_detection_table(path))
+    if not frames:
+        return
+
+    detections, tracks = link_frames(frames)
+    tracks.to_csv(TRACKS_CSV, index=False)
+    summary = summarize_tracks(tracks)
+    print(f"✅ {len(frames)} frames, {summary['detections']} detections -> "
+          f"{summary['distinct_vessels']} distinct boats")
+    print(f"   Dwell time: median {summary['median_dwell_min']} min, max {summary['max_dwell_min']} min")
+    print(f"📄 Tracks saved to {TRACKS_CSV}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#%%
+"""
+Watch-folder daemon: process camera frames as they arrive.
+
+The other scripts (and app.py) work from a one-off directory listing, so a
+new frame is only counted on the next full rerun. This runs continuously:
+- new files in IMAGE_DIR are picked up with inotify (CLOSE_WRITE / MOVED_TO,
+  via the inotify_simple package). Without it, the folder is polled: its
+  mtime is checked every POLL_INTERVAL and it is only rescanned when that
+  changes, and a file is taken once its size is stable between two polls.
+- each frame goes through the same steps as the batch scripts: day/night
+  segment (day_night.determine_segment), grey tag (grey_detect.is_grey_array
+  on the same decoded frame, so each file is read once), the change gate,
+  then detection with the backend for its segment.
+- one row per frame is appended to DETECTION_STORE, flushed immediately.
+  It holds the count, coordinates and latency (file mtime -> row written).
+  Frames already in the store are skipped on restart.
+
+Stop with Ctrl+C; a latency summary and the stage timings are printed.
+"""
+import csv
+import os
+import sys
+import time
+
+import cv2
+
+from change_gate import ChangeGate
+from day_night import LOCATION, LUX_DATA_FILE, LUX_THRESHOLD, determine_segment, load_lux_data_csv, \
+    parse_timestamp_from_filename
+from detectors import get_backend
+from grey_detect import BRIGHTNESS_THRESH, COLOR_STD_THRESH, RESIZE_MAX, is_grey_array
+from stage_timer import TIMER, stage
+
+# ----------------------------
+# Configuration
+# ----------------------------
+IMAGE_DIR = "../images/CCSS/"
+DETECTION_STORE = "./boat_detections_live.csv"
+BACKENDS_BY_SEGMENT = {  # segment -> (backend, params), see detectors.py
+    'day': ('log', {}),
+    'night': ('contours', {}),
+}
+USE_CHANGE_GATE = True
+PROCESS_EXISTING = False  # also process files already in IMAGE_DIR at startup
+POLL_INTERVAL = 1.0  # seconds, polling fallback only
+REPORT_EVERY = 20  # print a latency summary every N frames
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+STORE_COLUMNS = ['image', 'timestamp_utc', 'segment', 'segment_method', 'grey', 'boat_count',
+                 'boat_coordinates', 'detector_ran', 'latency_ms', 'process_ms']
+
+
+# ----------------------------
+# Watching
+# ----------------------------
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTS) and not name.startswith('.')
+
+
+def watch_inotify(image_dir, poll_interval=POLL_INTERVAL):
+    """
+    Names of files closed after writing or moved into image_dir (None on idle
+    timeouts). The watch is registered before returning, so nothing that
+    arrives while the startup backlog is processed is missed.
+    """
+    from inotify_simple import INotify, flags
+
+    inotify = INotify()
+    inotify.add_watch(image_dir, flags.CLOSE_WRITE | flags.MOVED_TO)
+    return _inotify_events(inotify, poll_interval)
+
+
+def _inotify_events(inotify, poll_interval):
+    while True:
+        events = inotify.read(timeout=int(poll_interval * 1000))
+        if not events:
+            yield None
+        for event in events:
+            if _is_image(event.name):
+                yield event.name
+
+
+def watch_polling(image_dir, seen, poll_interval=POLL_INTERVAL):
+    """
+    Yield names of new files in image_dir (None on idle polls).
+
+    Only rescans when the directory mtime changed or files are still
+    settling; a file is yielded once its size is the same on two polls.
+    """
+    last_mtime = None
+    settling = {}  # name -> size at the previous poll
+    while True:
+        mtime = os.stat(image_dir).st_mtime_ns
+        if mtime != last_mtime or settling:
+            last_mtime = mtime
+            for entry in os.scandir(image_dir):
+                if entry.name in seen or not _is_image(entry.name):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except FileNotFoundError:
+                    continue
+                if size > 0 and settling.get(entry.name) == size:
+                    del settling[entry.name]
+                    yield entry.name
+                else:
+                    settling[entry.name] = size
+        yield None
+        time.sleep(poll_interval)
+
+
+def watch(image_dir, seen, use_inotify=True, poll_interval=POLL_INTERVAL):
+    """New file names from inotify if available, else from polling."""
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            import inotify_simple  # noqa: F401
+            print(f"👀 Watching {image_dir} with inotify")
+            return watch_inotify(image_dir, poll_interval)
+        except ImportError:
+            pass
+    print(f"👀 Watching {image_dir} by polling every {poll_interval}s (pip install inotify_simple for inotify)")
+    return watch_polling(image_dir, seen, poll_interval)
+
+
+# ----------------------------
+# Detection store
+# ----------------------------
+def load_store_names(store_path):
+    """Images already in the store (so a restart doesn't redo them)."""
+    if not os.path.exists(store_path):
+        return set()
+    with open(store_path, newline='') as f:
+        return {row['image'] for row in csv.DictReader(f)}
+
+
+class StoreWriter:
+    """Append-only CSV writer, flushed after every row."""
+
+    def __init__(self, store_path):
+        new = not os.path.exists(store_path) or os.path.getsize(store_path) == 0
+        self._file = open(store_path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=STORE_COLUMNS)
+        if new:
+            self._writer.writeheader()
+
+    def append(self, row):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# ----------------------------
+# Per-frame pipeline
+# ----------------------------
+class FrameProcessor:
+    """Segment, grey-tag, gate and detect one frame."""
+
+    def __init__(self, backends_by_segment=BACKENDS_BY_SEGMENT, use_change_gate=USE_CHANGE_GATE):
+        self.lux_data = load_lux_data_csv(LUX_DATA_FILE)
+        self.detectors = {segment: get_backend(name, **params)
+                          for segment, (name, params) in backends_by_segment.items()}
+        self.gate = ChangeGate() if use_change_gate else None
+
+    def process(self, img_path):
+        name = os.path.basename(img_path)
+        dt = parse_timestamp_from_filename(name)
+
+        with stage("segment"):
+            if dt is not None:
+                segment, method = determine_segment(dt, LOCATION, self.lux_data, LUX_THRESHOLD)
+            else:
+                segment, method = 'day', 'unknown_timestamp'
+        with stage("decode"):
+            img = cv2.imread(img_path)
+        if img is None:
+            raise ValueError(f"could not decode {name}")
+        with stage("grey"):
+            grey = is_grey_array(img, BRIGHTNESS_THRESH, COLOR_STD_THRESH, RESIZE_MAX)
+
+        detect = self.detectors.get(segment) or next(iter(self.detectors.values()))
+        with stage("detect_total"):
+            if self.gate is not None:
+                boxes, ran, _ = self.gate.detect(detect, img, name)
+            else:
+                boxes, ran = detect(img), True
+
+        coords = "; ".join(f"({(b['xyxy'][0] + b['xyxy'][2]) / 2:.1f}, {(b['xyxy'][1] + b['xyxy'][3]) / 2:.1f})"
+                           for b in boxes)
+        return {
+            'image': name,
+            'timestamp_utc': dt.isoformat() if dt is not None else None,
+            'segment': segment,
+            'segment_method': method,
+            'grey': grey,
+            'boat_count': len(boxes),
+            'boat_coordinates': coords,
+            'detector_ran': ran,
+        }
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))]
+    return f"p50 {pick(0.5):.0f} ms, p90 {pick(0.9):.0f} ms, max {ordered[-1]:.0f} ms"
+
+
+def run(image_dir=IMAGE_DIR, store_path=DETECTION_STORE, process_existing=PROCESS_EXISTING,
+        use_inotify=True, poll_interval=POLL_INTERVAL, max_frames=None):
+    """Process arriving frames until interrupted (or max_frames have been stored)."""
+    seen = load_store_names(store_path)
+    if not process_existing:
+        seen.update(f for f in os.listdir(image_dir) if _is_image(f))
+    processor = FrameProcessor()
+    store = StoreWriter(store_path)
+
+    # Start watching first, then take existing files not yet in the store, in capture order
+    arrivals = watch(image_dir, seen, use_inotify, poll_interval)
+    backlog = sorted(f for f in os.listdir(image_dir) if _is_image(f) and f not in seen)
+    latencies = []
+    n_frames = 0
+    try:
+        for name in _chain(backlog, arrivals):
+            if name is None or name in seen:
+                continue
+            seen.add(name)
+            img_path = os.path.join(image_dir, name)
+
+            start = time.perf_counter()
+            try:
+                row = processor.process(img_path)
+            except Exception as e:
+                print(f"✗ {name}: {e}")
+                continue
+            with stage("write"):
+                row['process_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                try:
+                    arrived = os.path.getmtime(img_path)
+                except FileNotFoundError:
+                    arrived = time.time()
+                row['latency_ms'] = round((time.time() - arrived) * 1000, 1)
+                store.append(row)
+            TIMER.add("end_to_end", row['latency_ms'] / 1000)
+
+            latencies.append(row['latency_ms'])
+            n_frames += 1
+            print(f"🛥  {name}: {row['boat_count']} boats ({row['segment']}, "
+                  f"{'detected' if row['detector_ran'] else 'gated'}) in {row['process_ms']:.0f} ms, "
+                  f"end-to-end {row['latency_ms']:.0f} ms")
+            if n_frames % REPORT_EVERY == 0:
+                print(f"⏱  last {len(latencies[-REPORT_EVERY:])} frames: {summarize(latencies[-REPORT_EVERY:])}")
+            if max_frames is not None and n_frames >= max_frames:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+    if latencies:
+        print(f"\n✅ {n_frames} frames appended to {store_path}, end-to-end latency {summarize(latencies)}")
+        print(TIMER.table())
+        print(f"⏱  Stage timings: {TIMER.dump_json()}")
+    return n_frames
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+if __name__ == "__main__":
+    run()
@@ -11,6 +11,8 @@ from utils.general import non_max_suppression, scale_boxes
 from utils.torch_utils import select_device
 from utils.augmentations import letterbox
 import glob
+import math
+import os
 import torch.serialization
 from models.yolo import DetectionModel
 from models.common import Conv, C3, BottleneckCSP, SPPF
@@ -25,6 +27,14 @@ from yolov5.utils import downloads
 downloads.attempt_download = lambda x, *a, **kw: x
 downloads.attempt_download_from_hub = lambda x, *a, **kw: x
 
+# Shared helpers live in ../py_scripts (the only copy), so the app needs the full checkout:
+# deploy the repo root, or put py_scripts on PYTHONPATH, not yolo_model/ alone
+sys.path.append(str(Path(__file__).resolve().parent.parent / "py_scripts"))
+from detection_cache import DetectionCache, hash_array, hash_weights
+from stage_timer import TIMER, stage
+from thumbnail_cache import ThumbnailCache, make_thumbnail
+from track_index import UNTIMED_STEP_S, box_centres, link_frames, parse_frame_name, summarize_tracks
+
 # Windows patch for local testing
 if sys.platform.startswith("win"):
     pathlib.PosixPath = pathlib.WindowsPath
@@ -52,73 +62,143 @@ torch.serialization.add_safe_globals([
 device = select_device("cpu")
 
 # Load YOLOv5
-model = attempt_load("weights/best.pt", device=device)
+WEIGHTS = "weights/best.pt"
+IMG_SIZE = 640
+CONF_THRES = 0.25
+IOU_THRES = 0.45
+model = attempt_load(WEIGHTS, device=device)
 model.eval()
 
+# Cache of boxes per (image content, weights, params) so unchanged images skip inference
+detection_cache = DetectionCache("cache/detections")
+MODEL_DIGEST = hash_weights(WEIGHTS)
+DETECT_PARAMS = {"img_size": IMG_SIZE, "conf_thres": CONF_THRES, "iou_thres": IOU_THRES}
+
+# Batch gallery: downscaled JPEGs in a size-bounded folder, shown a page at a time
+thumbnail_cache = ThumbnailCache("cache/thumbnails", max_bytes=256 * 1024 * 1024)
+GALLERY_PAGE_SIZE = 24
+GALLERY_UPDATE_EVERY = 8  # images between streamed gallery updates
+PREVIEW_MAX_SIDE = 1280  # the live "Detection Result" preview during a batch
+
 # Global variable to store detection results
 detection_history = []
+gallery_pins = []  # thumbnails the batch gallery shows; kept from eviction until the next batch
+
+def predict_boxes(image: np.ndarray):
+    """Run the model and return [[x1, y1, x2, y2, conf, cls], ...] in image pixels"""
+    orig_h, orig_w = image.shape[:2]
+    with stage("preprocess"):
+        img_resized = letterbox(image, new_shape=IMG_SIZE)[0]
+        img_tensor = torch.from_numpy(img_resized).to(device).float() / 255.0
+        img_tensor = img_tensor.permute(2, 0, 1).unsqueeze(0)
+
+    with torch.no_grad():
+        with stage("detect"):
+            pred = model(img_tensor)[0]
+        with stage("nms"):
+            pred = non_max_suppression(pred, CONF_THRES, IOU_THRES)[0]
+
+    if pred is None or not len(pred):
+        return []
+    pred[:, :4] = scale_boxes(img_tensor.shape[2:], pred[:, :4], (orig_h, orig_w)).round()
+    return pred[:, :6].tolist()
 
 def detect_image(image: np.ndarray):
+    """Draw detections on image; returns (image, [[x1, y1, x2, y2, conf, cls], ...])"""
     if image.dtype != np.uint8:
         image = np.clip(image, 0, 255).astype(np.uint8)
 
-    orig_h, orig_w = image.shape[:2]
-    img_resized = letterbox(image, new_shape=640)[0]
-    img_tensor = torch.from_numpy(img_resized).to(device).float() / 255.0
-    img_tensor = img_tensor.permute(2, 0, 1).unsqueeze(0)
+    with stage("hash"):
+        key = detection_cache.make_key(hash_array(image), MODEL_DIGEST, DETECT_PARAMS)
+    boxes = detection_cache.get_or_compute(key, lambda: predict_boxes(image))
 
-    with torch.no_grad():
-        pred = model(img_tensor)[0]
-        pred = non_max_suppression(pred, 0.25, 0.45)[0]
-
-    boat_count = 0
-    if pred is not None and len(pred):
-        boat_count = len(pred)
-        pred[:, :4] = scale_boxes(img_tensor.shape[2:], pred[:, :4], (orig_h, orig_w)).round()
-        for *xyxy, conf, cls in pred:
+    with stage("render"):
+        for *xyxy, conf, cls in boxes:
             xyxy = [int(x) for x in xyxy]
             cv2.rectangle(image, (xyxy[0], xyxy[1]), (xyxy[2], xyxy[3]), (0, 255, 0), 2)
             label = f"{int(cls)} {conf:.2f}"
             cv2.putText(image, label, (xyxy[0], xyxy[1] - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    TIMER.incr("images")
     
-    return image, boat_count
+    return image, boxes
+
+def gallery_page(items, page):
+    """Return (gallery value, clamped page, page label) for one page of (thumbnail path, caption) items"""
+    n_pages = max(1, math.ceil(len(items) / GALLERY_PAGE_SIZE))
+    page = min(max(page, 0), n_pages - 1)
+    start = page * GALLERY_PAGE_SIZE
+    # Thumbnails evicted from the bounded cache are skipped
+    visible = [(path, caption) for path, caption in items[start:start + GALLERY_PAGE_SIZE] if os.path.exists(path)]
+    return visible, page, f"Page {page + 1} / {n_pages} ({len(items)} images)"
 
 def detect_folder_images(folder_path="static"):
-    global detection_history
-    images_paths = sorted(glob.glob(f"{folder_path}/*.*"))
+    """
+    Detect every image in folder_path, streaming progress to the UI.
+
+    Only the latest frame is held in memory; each annotated frame is written
+    as a thumbnail to thumbnail_cache and the gallery shows the newest page,
+    refreshed every GALLERY_UPDATE_EVERY images. The item list is only sent
+    to the gallery state at those refreshes, not on every image, and its
+    thumbnails stay pinned in the cache until the next batch starts.
+
+    Yields (preview, gallery, status, stage latencies, gallery items, page, page label).
+    """
+    global detection_history, gallery_pins
+    with stage("list"):
+        images_paths = sorted(glob.glob(f"{folder_path}/*.*"))
     
     print(f"Found {len(images_paths)} images in {folder_path}")
     
     if not images_paths:
-        yield None, [], "Total number of boats detected: 0"
+        yield None, [], "Total number of boats detected: 0", TIMER.table(), [], 0, gallery_page([], 0)[2]
         return
     
-    gallery_results = []
-    processed_img = None
+    # The previous batch's gallery is replaced by this one, so its thumbnails may go
+    thumbnail_cache.unpin(gallery_pins)
+    gallery_pins = []
+    gallery_items = []
+    preview = None
     total_boats = 0
 
     for i, img_path in enumerate(images_paths):
         print(f"Processing {i+1}/{len(images_paths)}: {img_path}")
-        img = cv2.imread(img_path)
+        with stage("decode"):
+            img = cv2.imread(img_path)
         if img is None:
             continue
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        processed_img, boat_count = detect_image(img_rgb)
+        with stage("color"):
+            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        processed_img, boxes = detect_image(img_rgb)
+        boat_count = len(boxes)
         total_boats += boat_count
-        gallery_results.append(processed_img)
+
+        with stage("write"):
+            thumb_path = thumbnail_cache.put(img_path, processed_img, pin=True)
+        gallery_pins.append(thumb_path)
+        gallery_items.append((thumb_path, f"{Path(img_path).name}: {boat_count}"))
+        preview = make_thumbnail(processed_img, PREVIEW_MAX_SIDE)
+        del img, img_rgb, processed_img
         
         # Store detection info
         detection_history.append({
             'image_path': img_path,
-            'boat_count': boat_count
+            'boat_count': boat_count,
+            'centres': box_centres(boxes)
         })
         
-        yield processed_img, None, f"Processing... ({i+1}/{len(images_paths)})"
+        status = f"Processing... ({i+1}/{len(images_paths)})"
+        if (i + 1) % GALLERY_UPDATE_EVERY == 0:
+            gallery, page, label = gallery_page(gallery_items, len(gallery_items))
+            yield preview, gallery, status, TIMER.table(), gallery_items, page, label
+        else:
+            yield preview, gr.update(), status, TIMER.table(), gr.update(), gr.update(), gr.update()
 
-    # Final yield with complete gallery and total count
+    # Final yield with the last page and total count
     final_message = f"✅ Total number of boats detected: {total_boats}"
-    yield processed_img if gallery_results else None, gallery_results, final_message
+    print(f"Stage timings written to {TIMER.dump_json()}")
+    gallery, page, label = gallery_page(gallery_items, len(gallery_items))
+    yield preview, gallery, final_message, TIMER.table(), gallery_items, page, label
 def get_analytics():
     """Generate analytics from detection history"""
     if not detection_history:
@@ -128,6 +208,18 @@ def get_analytics():
     total_boats = sum(d['boat_count'] for d in detection_history)
     avg_boats = total_boats / total_images if total_images > 0 else 0
     images_with_boats = sum(1 for d in detection_history if d['boat_count'] > 0)
+
+    # Link boxes across consecutive frames so a moored boat counts once. Uploads
+    # without an AXIS timestamp in the name are linked in the order processed.
+    _, tracks = link_frames(((d['image_path'], d['centres']) for d in detection_history),
+                            untimed_step_s=UNTIMED_STEP_S)
+    track_summary = summarize_tracks(tracks)
+    n_untimed = sum(parse_frame_name(d['image_path'])[1] is None for d in detection_history)
+    untimed_note = f" ({n_untimed} images without a timestamp linked in upload order)" if n_untimed else ""
+    if track_summary['median_dwell_min'] is None:
+        dwell = "n/a (no image has a timestamp in its filename)"
+    else:
+        dwell = f"median {track_summary['median_dwell_min']} min, max {track_summary['max_dwell_min']} min"
     
     # Create summary text
     summary = f"""
@@ -138,6 +230,8 @@ def get_analytics():
     - **Average Boats per Image:** {avg_boats:.2f}
     - **Images with Boats:** {images_with_boats} ({images_with_boats/total_images*100:.1f}%)
     - **Images without Boats:** {total_images - images_with_boats}
+    - **Distinct Boats (tracked across frames):** {track_summary['distinct_vessels']}{untimed_note}
+    - **Dwell Time:** {dwell}
     """
     
     # Create detailed breakdown
@@ -161,6 +255,14 @@ with gr.Blocks(title="YOLOv5 Boat Detector") as demo:
         batch_btn = gr.Button("Start Detection", variant="primary")
         status_text = gr.Markdown("Total number of boats detected: 0")
         out_gallery = gr.Gallery(label="Detection Results", show_label=True, columns=4, height="auto")
+        gallery_state = gr.State([])
+        gallery_page_num = gr.State(0)
+        with gr.Row():
+            prev_page_btn = gr.Button("◀ Prev", size="sm", scale=0, min_width=100)
+            page_label = gr.Markdown(gallery_page([], 0)[2])
+            next_page_btn = gr.Button("Next ▶", size="sm", scale=0, min_width=100)
+        with gr.Accordion("⏱ Stage latencies", open=False):
+            stage_latencies = gr.Markdown(TIMER.table())
 
         inp_image.change(
             lambda img: (detect_image(img)[0], ""), 
@@ -170,7 +272,17 @@ with gr.Blocks(title="YOLOv5 Boat Detector") as demo:
         batch_btn.click(
             fn=detect_folder_images, 
             inputs=None, 
-            outputs=[out_image, out_gallery, status_text]
+            outputs=[out_image, out_gallery, status_text, stage_latencies, gallery_state, gallery_page_num, page_label]
+        )
+        prev_page_btn.click(
+            fn=lambda items, page: gallery_page(items, page - 1),
+            inputs=[gallery_state, gallery_page_num],
+            outputs=[out_gallery, gallery_page_num, page_label]
+        )
+        next_page_btn.click(
+            fn=lambda items, page: gallery_page(items, page + 1),
+            inputs=[gallery_state, gallery_page_num],
+            outputs=[out_gallery, gallery_page_num, page_label]
         )
     
     with gr.Tabs() as main_tabs:
@@ -200,13 +312,17 @@ with gr.Blocks(title="YOLOv5 Boat Detector") as demo:
             
             with gr.Row():
                 analytics_breakdown = gr.Markdown()
+
+            gr.Markdown("### ⏱ Stage Latencies")
+            with gr.Row():
+                analytics_stages = gr.Markdown()
             
             back_btn_results = gr.Button("← Back to Detection")
             
             refresh_analytics_btn.click(
-                fn=get_analytics,
+                fn=lambda: (*get_analytics(), TIMER.table()),
                 inputs=None,
-                outputs=[analytics_summary, analytics_breakdown]
+                outputs=[analytics_summary, analytics_breakdown, analytics_stages]
             )
 
     # Navigation logic
@@ -218,7 +334,8 @@ with gr.Blocks(title="YOLOv5 Boat Detector") as demo:
             gr.update(visible=True),
             gr.update(selected="graphs"),  # Select Results tab
             summary,
-            breakdown
+            breakdown,
+            TIMER.table()
         )
 
     def show_detection():
@@ -231,7 +348,8 @@ with gr.Blocks(title="YOLOv5 Boat Detector") as demo:
     analytics_btn.click(
         fn=show_analytics,
         inputs=None,
-        outputs=[detection_tab, results_tab, graphs_tab, main_tabs, analytics_summary, analytics_breakdown]
+        outputs=[detection_tab, results_tab, graphs_tab, main_tabs, analytics_summary, analytics_breakdown,
+                 analytics_stages]
     )
 
     back_btn_results.click(
@@ -246,4 +364,5 @@ with gr.Blocks(title="YOLOv5 Boat Detector") as demo:
         outputs=[detection_tab, results_tab, graphs_tab]
     )
 
-demo.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    demo.launch()